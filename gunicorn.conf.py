@@ -0,0 +1,24 @@
+"""
+Gunicorn settings: `gunicorn -c gunicorn.conf.py invoices.wsgi`.
+Each worker thread keeps its own database connection for DB_CONN_MAX_AGE seconds, so
+GUNICORN_WORKERS * GUNICORN_THREADS of every instance together must fit the database's
+max_connections, or PgBouncer's max_client_conn when it pools them.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = 30
+keepalive = 5
+# recycled workers bound memory growth, the jitter keeps them from restarting together
+max_requests = 10000
+max_requests_jitter = 1000
+
+def post_fork(server, worker):
+    # connections opened by a preloading master must not be shared by its workers
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
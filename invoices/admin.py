@@ -2,7 +2,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserCreationForm
+from django.db import transaction
 from .models import User, Account, Invoice
+from .services.currency_converter import convert_currency
+from .services.partitioning import invoice_key
+from .services.revenue_rollup import apply_invoice_change
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
@@ -31,8 +35,39 @@ class AccountAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 class InvoiceAdmin(admin.ModelAdmin):
+    """
+    Admin writes go through apply_invoice_change like the API's, so the rollups, the change log
+    and cached analytics follow them. Converted amounts are recomputed, not edited.
+    """
     list_display = ['id', 'account', 'original_amount', 'original_currency', 'status']
     list_filter = ['status', 'account']
+    readonly_fields = ['exchange_rate', 'converted_amount']
+    
+    def save_model(self, request, obj, form, change):
+        if not change or {'original_amount', 'original_currency'} & set(form.changed_data):
+            obj.converted_amount, obj.exchange_rate = convert_currency(obj.original_amount, obj.original_currency, 'USD')
+        
+        with transaction.atomic():
+            if not change:
+                obj.save()
+                apply_invoice_change(after=obj)
+                return
+            # obj already holds the edited partition key, so the stored row is found by primary key
+            previous = Invoice.objects.select_for_update().get(pk=obj.pk)
+            Invoice.objects.filter(**invoice_key(previous)).update(**{
+                field.attname: getattr(obj, field.attname)
+                for field in Invoice._meta.concrete_fields if not field.primary_key
+            })
+            apply_invoice_change(before=previous, after=obj)
+    
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Invoice.objects.filter(**invoice_key(obj)))
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for stored in queryset.select_for_update().order_by('pk'):
+                apply_invoice_change(before=stored)
+                Invoice.objects.filter(**invoice_key(stored)).delete()
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Account, AccountAdmin)
@@ -0,0 +1,108 @@
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from invoices.benchmarks.provider import USD_RATES, conversion_table
+from invoices.models import Account, ExchangeRateSnapshot, Invoice
+from invoices.services.rate_history import save_snapshot
+from invoices.services.revenue_rollup import rebuild_account_rollups
+from invoices.utils.pg_copy import copy_rows
+from typing import List, Sequence
+
+COPY_BATCH_SIZE = 10_000
+INVOICE_COLUMNS = ['account_id', 'original_amount', 'original_currency', 'exchange_rate', 'converted_amount', 'status', 'created_at']
+
+@dataclass
+class Dataset:
+    """Scratch accounts seeded for one benchmark run, each with one user"""
+    accounts: List[Account]
+    users: list
+    invoice_ids: List[int]
+    currencies: List[str]
+    snapshot_ids: List[int] = field(default_factory=list)
+    started_at: object = field(default_factory=timezone.now)
+
+    @property
+    def account(self) -> Account:
+        return self.accounts[0]
+
+    def access_token(self, index: int = 0) -> str:
+        return str(RefreshToken.for_user(self.users[index]).access_token)
+
+    def describe(self) -> dict:
+        return {
+            'accounts': len(self.accounts),
+            'invoices': Invoice.objects.filter(account__in=self.accounts).count(),
+            'currencies': self.currencies,
+        }
+
+    def delete(self):
+        """Remove the accounts, their invoices and rollups, the users and the rate tables stored during the run"""
+        get_user_model().objects.filter(pk__in=[user.pk for user in self.users]).delete()
+        Account.objects.filter(pk__in=[account.pk for account in self.accounts]).delete()
+        ExchangeRateSnapshot.objects.filter(
+            Q(pk__in=self.snapshot_ids) | Q(fetched_at__gte=self.started_at)
+        ).delete()
+
+def currency_weights(currencies: Sequence[str], skew: float) -> List[float]:
+    """Zipf weights: the i-th currency is (i + 1) ** skew times rarer than the first, 0 is uniform"""
+    return [1 / (rank + 1) ** skew for rank in range(len(currencies))]
+
+def generate_dataset(
+    accounts: int, invoices_per_account: int, currencies: Sequence[str],
+    skew: float = 1.0, days: int = 365, seed: int = 0,
+) -> Dataset:
+    """
+    Seed accounts with invoices drawn from a seeded generator, so the same arguments give the same data.
+    Amounts are log-normal, currencies follow `currency_weights`, created_at is spread over the last
+    `days` days and converted amounts use the stub provider's rates. Rollups are rebuilt afterwards;
+    the rows bypass the change log, `sync_columnar --rebuild` loads them into the columnar store.
+    """
+    unknown = set(currencies) - set(USD_RATES)
+    if unknown:
+        raise ValueError(f"The stub provider has no rates for {', '.join(sorted(unknown))}")
+
+    generator = random.Random(seed)
+    weights = currency_weights(currencies, skew)
+    to_usd = {currency: Decimal(str(conversion_table(currency)['USD'])) for currency in currencies}
+    now = timezone.now()
+    User = get_user_model()
+
+    dataset = Dataset(accounts=[], users=[], invoice_ids=[], currencies=list(currencies), started_at=now)
+    for index in range(accounts):
+        account = Account.objects.create(name=f'benchmark account {index}')
+        dataset.accounts.append(account)
+        dataset.users.append(User.objects.create_user(
+            username=f'benchmark-{account.pk}', password=None, name=f'benchmark user {index}', account=account,
+        ))
+
+        remaining = invoices_per_account
+        while remaining:
+            rows = []
+            for _ in range(min(remaining, COPY_BATCH_SIZE)):
+                currency = generator.choices(currencies, weights)[0]
+                amount = max(Decimal(str(round(generator.lognormvariate(4.5, 1.2), 2))), Decimal('0.01'))
+                rate = to_usd[currency].quantize(Decimal('0.0001'))
+                created_at = now - timedelta(seconds=generator.randrange(days * 86400))
+                rows.append([
+                    account.pk, amount, currency, rate, (amount * to_usd[currency]).quantize(Decimal('0.01')),
+                    'PAID' if generator.random() < 0.6 else 'PENDING', created_at.isoformat(),
+                ])
+            copy_rows(Invoice._meta.db_table, INVOICE_COLUMNS, rows)
+            remaining -= len(rows)
+
+        rebuild_account_rollups(account.pk)
+
+    dataset.invoice_ids = list(
+        Invoice.objects.filter(account=dataset.account).order_by('id').values_list('id', flat=True)
+    )
+    # point-in-time lookups need persisted tables older than the invoices
+    dataset.snapshot_ids = [
+        save_snapshot(currency, conversion_table(currency), fetched_at=now - timedelta(days=days + 1)).pk
+        for currency in currencies
+    ]
+    return dataset
@@ -0,0 +1,177 @@
+import itertools
+import json
+import requests
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import URLPattern
+from invoices.benchmarks.timing import summarize
+from typing import Callable, List, Sequence
+
+@dataclass
+class Scenario:
+    """
+    One kind of request to one route of invoices/urls.py.
+    `path` and `body` get the request's sequence number so successive requests can hit different invoices.
+    """
+    route: str
+    name: str
+    method: str
+    path: Callable[[int], str]
+    body: Callable[[int], object] = None
+    content_type: str = 'application/json'
+    expected_status: int = 200
+
+def build_scenarios(dataset, request_count: int) -> List[Scenario]:
+    """
+    Requests for every route, reads first and deletes last.
+    The last `request_count` invoices of the first account are deleted, the others are read and updated.
+    """
+    ids = dataset.invoice_ids[:-request_count] or dataset.invoice_ids
+    deletable = dataset.invoice_ids[-request_count:][::-1]
+    currencies = dataset.currencies
+
+    def invoice(i):
+        return {'original_amount': f'{10 + i % 990}.25', 'original_currency': currencies[i % len(currencies)], 'status': 'PENDING'}
+
+    return [
+        Scenario('invoices/', 'list page', 'GET', lambda i: '/invoices/?limit=100'),
+        Scenario('invoices/', 'list stream', 'GET', lambda i: '/invoices/?stream=ndjson'),
+        Scenario('invoices/<int:pk>/', 'detail', 'GET', lambda i: f'/invoices/{ids[i % len(ids)]}/'),
+        Scenario('invoices/<int:pk>/exchange-rate/', 'invoice exchange rate', 'GET', lambda i: f'/invoices/{ids[i % len(ids)]}/exchange-rate/'),
+        Scenario('invoices/summary/', 'summary historic', 'GET', lambda i: '/invoices/summary/?rate=historic'),
+        Scenario('invoices/summary/', 'summary current', 'GET', lambda i: '/invoices/summary/?rate=current'),
+        Scenario('invoices/average-size/', 'average size', 'GET', lambda i: f'/invoices/average-size/?currency={currencies[i % len(currencies)]}'),
+        Scenario('invoices/revenue-series/', 'revenue series daily', 'GET', lambda i: '/invoices/revenue-series/?granularity=day'),
+        Scenario('invoices/revenue-series/', 'revenue series monthly current', 'GET', lambda i: '/invoices/revenue-series/?granularity=month&rate=current'),
+        Scenario('exchange-rates/history/', 'rate history', 'GET', lambda i: f'/exchange-rates/history/?from={currencies[i % len(currencies)]}&to=USD'),
+        Scenario('metrics', 'metrics', 'GET', lambda i: '/metrics'),
+        Scenario('invoices/', 'create', 'POST', lambda i: '/invoices/', body=invoice, expected_status=201),
+        Scenario('invoices/bulk/', 'bulk create 100', 'POST', lambda i: '/invoices/bulk/', body=lambda i: [invoice(i * 100 + n) for n in range(100)], expected_status=201),
+        Scenario('invoices/<int:pk>/', 'update', 'PUT', lambda i: f'/invoices/{ids[i % len(ids)]}/', body=invoice),
+        Scenario('invoices/<int:pk>/', 'delete', 'DELETE', lambda i: f'/invoices/{deletable[i % len(deletable)]}/', expected_status=204),
+    ]
+
+def uncovered_routes(urlpatterns: Sequence, scenarios: Sequence[Scenario]) -> List[str]:
+    """Routes of the URLconf no scenario requests; included URLconfs such as the admin are not load tested"""
+    covered = {scenario.route for scenario in scenarios}
+    return [
+        str(pattern.pattern) for pattern in urlpatterns
+        if isinstance(pattern, URLPattern) and str(pattern.pattern) not in covered
+    ]
+
+class InProcessTransport:
+    """Requests through Django's test client: the full middleware and view stack without a server"""
+
+    def __init__(self, token: str):
+        self.client = Client(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def send(self, method: str, path: str, body, content_type: str) -> int:
+        data = json.dumps(body) if body is not None else ''
+        response = self.client.generic(method, path, data, content_type=content_type)
+        # streamed bodies are only produced when read
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        # the test client skips this; a WSGI server closes connections past CONN_MAX_AGE here
+        close_old_connections()
+        return response.status_code
+
+    def close(self):
+        # this thread's connections, the main thread's are left alone
+        connections.close_all()
+
+class HTTPTransport:
+    """Requests to a running server"""
+
+    def __init__(self, token: str, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def send(self, method: str, path: str, body, content_type: str) -> int:
+        data = json.dumps(body) if body is not None else None
+        response = self.session.request(
+            method, self.base_url + path, data=data, headers={'Content-Type': content_type},
+        )
+        return response.status_code
+
+    def close(self):
+        self.session.close()
+
+def run_scenario(scenario: Scenario, make_transport: Callable, request_count: int, concurrency: int) -> dict:
+    """Send `request_count` requests of a scenario from `concurrency` threads, each with its own transport"""
+    sequence = itertools.count()
+
+    def worker():
+        transport = make_transport()
+        timings, statuses = [], Counter()
+        try:
+            while True:
+                i = next(sequence)
+                if i >= request_count:
+                    break
+                body = scenario.body(i) if scenario.body else None
+                started = time.perf_counter()
+                status = transport.send(scenario.method, scenario.path(i), body, scenario.content_type)
+                timings.append(time.perf_counter() - started)
+                statuses[status] += 1
+        finally:
+            transport.close()
+        return timings, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = [future.result() for future in [executor.submit(worker) for _ in range(concurrency)]]
+    wall_seconds = time.perf_counter() - started
+
+    timings = [timing for worker_timings, _ in results for timing in worker_timings]
+    statuses = sum((worker_statuses for _, worker_statuses in results), Counter())
+    return {
+        **summarize(timings),
+        'route': scenario.route,
+        'method': scenario.method,
+        'concurrency': concurrency,
+        'throughput_rps': round(len(timings) / wall_seconds, 1),
+        'errors': sum(count for status, count in statuses.items() if status != scenario.expected_status),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+def compare_connection_reuse(scenarios: Sequence[Scenario], make_transport: Callable, request_count: int,
+                             concurrency: int, conn_max_age: int) -> dict:
+    """
+    Run scenarios with a new database connection per request (CONN_MAX_AGE=0), then with connections
+    kept for `conn_max_age` seconds. Only meaningful in process, where CONN_MAX_AGE can be changed.
+    """
+    db_settings = connections.settings[DEFAULT_DB_ALIAS]
+    configured = db_settings['CONN_MAX_AGE']
+    opened = Counter()
+    lock = threading.Lock()
+
+    def count_connection(sender, connection, **kwargs):
+        if connection.alias == DEFAULT_DB_ALIAS:
+            with lock:
+                opened['connections'] += 1
+
+    results = {}
+    connection_created.connect(count_connection)
+    try:
+        for scenario in scenarios:
+            runs = {}
+            for label, max_age in (('per_request', 0), ('persistent', conn_max_age)):
+                db_settings['CONN_MAX_AGE'] = max_age
+                before = opened['connections']
+                result = run_scenario(scenario, make_transport, request_count, concurrency)
+                result['connections_opened'] = opened['connections'] - before
+                runs[label] = result
+            runs['speedup'] = round(runs['persistent']['throughput_rps'] / max(runs['per_request']['throughput_rps'], 0.1), 2)
+            results[scenario.name] = runs
+    finally:
+        db_settings['CONN_MAX_AGE'] = configured
+        connection_created.disconnect(count_connection)
+    return results
@@ -0,0 +1,49 @@
+from rest_framework.utils.encoders import JSONEncoder
+from invoices.integrations.exchange_rate import get_rates_to
+from invoices.models import Invoice
+from invoices.serializers import InvoiceCreateSerializer, InvoiceSerializer, InvoiceRowEncoder
+from invoices.services.currency_converter import CurrencyConverter, convert_currency, convert_many
+from invoices.views.analytics import (
+    InvoiceRevenueAverageSizeAPIView,
+    InvoiceRevenueSeriesAPIView,
+    InvoiceRevenueSummaryAPIView,
+)
+
+def _computed(view_class, account_id, params):
+    """The uncached computation of an analytics view, raising instead of returning its error"""
+    def compute():
+        success, data, error = view_class().compute(account_id, params)
+        if not success:
+            raise RuntimeError(error)
+        return data
+    return compute
+
+def series_params(granularity: str, rate_type: str = 'historic') -> dict:
+    return {'granularity': granularity, 'rate_type': rate_type, 'from': None, 'to': None}
+
+def micro_benchmarks(dataset, sample_size: int) -> dict:
+    """{name: callable} of the hot functions behind the endpoints, run against the dataset's first account"""
+    account_id = dataset.account.pk
+    currencies = dataset.currencies
+    invoices = Invoice.objects.filter(account_id=account_id).order_by('created_at', 'id')[:sample_size]
+    sample = list(invoices)
+    rows = list(invoices.values_list(*InvoiceRowEncoder.columns))
+    amounts = [invoice.original_amount for invoice in sample]
+    from_currencies = [invoice.original_currency for invoice in sample]
+    rates = get_rates_to(currencies, 'USD')
+    payload = {'original_amount': '123.45', 'original_currency': currencies[-1], 'status': 'PENDING'}
+    encoder = JSONEncoder()
+
+    return {
+        'convert_currency': lambda: convert_currency(123.45, currencies[-1], 'USD'),
+        f'convert_many[{len(sample)}]': lambda: convert_many(amounts, from_currencies, 'USD'),
+        f'convert_with_rates[{len(sample)}]': lambda: CurrencyConverter().convert_with_rates(amounts, from_currencies, rates),
+        f'InvoiceSerializer[{len(sample)}]': lambda: encoder.encode(InvoiceSerializer(sample, many=True).data),
+        f'InvoiceRowEncoder[{len(sample)}]': lambda: encoder.encode(InvoiceRowEncoder().encode_many(rows)),
+        'InvoiceCreateSerializer.is_valid': lambda: InvoiceCreateSerializer(data=payload).is_valid(raise_exception=True),
+        'revenue summary historic': _computed(InvoiceRevenueSummaryAPIView, account_id, {'rate_type': 'historic'}),
+        'revenue summary current': _computed(InvoiceRevenueSummaryAPIView, account_id, {'rate_type': 'current'}),
+        'average size': _computed(InvoiceRevenueAverageSizeAPIView, account_id, {'target_currency': 'EUR'}),
+        'revenue series daily': _computed(InvoiceRevenueSeriesAPIView, account_id, series_params('day')),
+        'revenue series monthly current': _computed(InvoiceRevenueSeriesAPIView, account_id, series_params('month', 'current')),
+    }
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# units of each currency per USD; every table the stub serves is derived from this one
+USD_RATES = {
+    'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'JPY': 151.2, 'EGP': 48.5, 'CAD': 1.36,
+    'AUD': 1.52, 'CHF': 0.88, 'INR': 83.3, 'BRL': 5.05, 'MXN': 17.1, 'CNY': 7.23,
+}
+
+def conversion_table(base_currency: str) -> dict:
+    """{currency: rate} from a base currency, as the provider returns it"""
+    base = USD_RATES[base_currency]
+    return {currency: round(rate / base, 6) for currency, rate in USD_RATES.items()}
+
+class StubRateProvider:
+    """
+    Local HTTP server answering `<base_url>/<api key>/latest/<currency>` like the exchange rate
+    provider, with fixed rates and an optional artificial latency, so benchmarks are reproducible
+    and never call the real provider.
+    """
+
+    def __init__(self, port: int = 0, latency_ms: float = 0):
+        self.calls = 0
+        # handlers run on one thread per request
+        self._calls_lock = threading.Lock()
+        latency = latency_ms / 1000
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with provider._calls_lock:
+                    provider.calls += 1
+                if latency:
+                    time.sleep(latency)
+                base_currency = self.path.rstrip('/').rsplit('/', 1)[-1].upper()
+                if base_currency in USD_RATES:
+                    status, body = 200, {
+                        'result': 'success',
+                        'base_code': base_currency,
+                        'conversion_rates': conversion_table(base_currency),
+                    }
+                else:
+                    status, body = 404, {'result': 'error', 'error-type': 'unsupported-code'}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
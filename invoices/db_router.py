@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from invoices.utils.metrics import replica_reads
+from invoices.utils.redis_client import get_pipeline, get_redis_client
+import logging
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# database the reads of the current request go to, None for the primary
+_read_database: ContextVar[Optional[str]] = ContextVar('read_database', default=None)
+
+_health = {}
+_health_lock = threading.Lock()
+
+def get_replicas() -> list:
+    return list(getattr(settings, 'REPLICA_DATABASES', []))
+
+def _pin_key(account_id: int) -> str:
+    return f"db:primary_pin:{account_id}"
+
+def pin_to_primary(account_ids: Iterable[int]):
+    """
+    Send the accounts' replica-eligible reads to the primary for REPLICA_PIN_SECONDS, so users see
+    their own writes while the replicas catch up. Call after the writing transaction commits.
+    """
+    if not get_replicas():
+        return
+    ttl = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+    try:
+        pipeline = get_pipeline(transaction=False)
+        for account_id in account_ids:
+            pipeline.set(_pin_key(account_id), 1, ex=ttl)
+        pipeline.execute()
+    except Exception as e:
+        logger.error(f"Redis error pinning accounts {list(account_ids)} to the primary: {e}")
+
+def _check_replica(alias: str) -> bool:
+    """
+    A replica is healthy when it answers, streams WAL from the primary and replays within
+    REPLICA_MAX_LAG_SECONDS of it. The database user needs pg_read_all_stats to see the WAL receiver.
+    """
+    connection = connections.create_connection(alias)
+    try:
+        with connection.cursor() as cursor:
+            # an idle primary sends no WAL, so a streaming replica that replayed everything it received has
+            # no lag; a disconnected one has replayed everything it received too, however far behind it is
+            cursor.execute("""
+                SELECT EXISTS(SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'),
+                       CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+            """)
+            streaming, lag = cursor.fetchone()
+        if not streaming:
+            logger.warning(f"Replica {alias} is not streaming WAL from the primary, reading from the primary")
+            return False
+        if lag > getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5):
+            logger.warning(f"Replica {alias} is {lag:.1f}s behind, reading from the primary")
+            return False
+        return True
+    except Exception as e:
+        logger.warning(f"Replica {alias} failed its health check, reading from the primary: {e}")
+        return False
+    finally:
+        connection.close()
+
+def is_replica_healthy(alias: str) -> bool:
+    """Last health check of a replica, re-run at most every REPLICA_HEALTH_CHECK_INTERVAL seconds per process"""
+    interval = getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    with _health_lock:
+        healthy, checked_at = _health.get(alias, (True, None))
+        due = checked_at is None or time.monotonic() - checked_at >= interval
+        if due:
+            # other threads keep the previous result until this check is done
+            _health[alias] = (healthy, time.monotonic())
+    if due:
+        healthy = _check_replica(alias)
+        with _health_lock:
+            _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+def choose_read_database(account_id: int) -> str:
+    """
+    Database for an account's replica-eligible reads: a random healthy replica, or the primary
+    while the account is pinned after a write or when no replica is healthy.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+
+    try:
+        pinned = get_redis_client().exists(_pin_key(account_id))
+    except Exception as e:
+        logger.error(f"Redis error reading the primary pin of account {account_id}: {e}")
+        pinned = True
+    if pinned:
+        replica_reads.inc(database=DEFAULT_DB_ALIAS, reason='pinned')
+        return DEFAULT_DB_ALIAS
+
+    healthy = [alias for alias in replicas if is_replica_healthy(alias)]
+    if not healthy:
+        replica_reads.inc(database=DEFAULT_DB_ALIAS, reason='unhealthy')
+        return DEFAULT_DB_ALIAS
+
+    alias = random.choice(healthy)
+    replica_reads.inc(database=alias, reason='replica')
+    return alias
+
+@contextmanager
+def use_database(alias: str):
+    """Route the ORM reads made inside the block to `alias`"""
+    token = _read_database.set(None if alias == DEFAULT_DB_ALIAS else alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+@contextmanager
+def read_replica(account_id: int):
+    """Route the ORM reads made inside the block to choose_read_database(account_id)"""
+    with use_database(choose_read_database(account_id)):
+        yield
+
+class ReplicaRouter:
+    """
+    Reads made inside read_replica() go to the chosen replica, everything else to the primary.
+    Reads inside a transaction on the primary stay there so they see its writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_database.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
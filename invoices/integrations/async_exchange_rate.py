@@ -0,0 +1,234 @@
+import asyncio
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import logging
+import threading
+import time
+import weakref
+from typing import Dict, Iterable
+from invoices.integrations.exchange_rate import (
+    ExchangeRateAPI,
+    ProviderError,
+    RateSnapshot,
+    _ensure_invalidation_listener,
+    local_rate_cache,
+    provider_call,
+)
+from invoices.services.rate_history import get_snapshot_at, save_snapshot
+from invoices.utils.metrics import rate_cache_lookups
+from invoices.utils.redis_client import get_async_redis_client, get_pipeline
+
+logger = logging.getLogger(__name__)
+
+# pooled clients by event loop
+_http_clients = weakref.WeakKeyDictionary()
+_http_clients_lock = threading.Lock()
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Pooled keep-alive client of the running event loop, shared by every request it serves.
+    Its connections belong to the loop, so every loop gets its own client and the clients
+    of closed loops are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        client = _http_clients.get(loop)
+        if client is None:
+            for other in [other for other in list(_http_clients) if other.is_closed()]:
+                _http_clients.pop(other, None)
+            pool_size = getattr(settings, 'RATE_HTTP_POOL_SIZE', 10)
+            client = _http_clients[loop] = httpx.AsyncClient(
+                timeout=getattr(settings, 'RATE_HTTP_TIMEOUT', 10),
+                # httpx only retries failed connects, status retries are left to the circuit breaker
+                transport=httpx.AsyncHTTPTransport(
+                    retries=getattr(settings, 'RATE_HTTP_RETRIES', 2),
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                ),
+            )
+    return client
+
+class AsyncExchangeRateAPI(ExchangeRateAPI):
+    """
+    ExchangeRateAPI for async views.
+    Same caching, locking and stale-while-revalidate rules, with Redis and the provider
+    awaited instead of blocking the worker; rate history is written from a thread.
+    """
+
+    PROVIDER_ERRORS = (httpx.HTTPError, ProviderError)
+
+    def __init__(self):
+        super().__init__()
+        self.async_redis_client = get_async_redis_client()
+
+    async def _aget_cached_table(self, from_currency: str, to_currencies: list):
+        cache_key = self._get_cache_key(from_currency)
+        try:
+            values = await self.async_redis_client.hmget(cache_key, self._cached_table_fields(to_currencies))
+        except Exception as e:
+            logger.error(f"Redis error retrieving {cache_key}: {e}")
+            return None
+        return self._parse_cached_table(cache_key, to_currencies, values)
+
+    async def _aset_cached_rates(self, from_currency: str, rates: Dict[str, float], fetched_at: float, fetch_duration: float = 0):
+        try:
+            async with get_pipeline(self.async_redis_client, transaction=True) as pipeline:
+                self._queue_cached_rates(pipeline, from_currency, rates, fetched_at, fetch_duration)
+                await pipeline.execute()
+        except Exception as e:
+            logger.error(f"Redis error caching {self._get_cache_key(from_currency)}: {e}")
+
+    async def _afetch_rates(self, from_currency: str) -> Dict[str, float]:
+        url = f"{self.base_url}/{self.api_key}/latest/{from_currency}"
+        with provider_call(from_currency):
+            response = await get_async_http_client().get(url)
+            self._raise_for_status(response)
+            return self._parse_provider_response(response.json())
+
+    async def _aget_last_known_rates(self, from_currency: str, error: Exception) -> Dict[str, float]:
+        snapshot = await sync_to_async(get_snapshot_at)(from_currency)
+        return self._fallback_rates(from_currency, snapshot, error)
+
+    async def _arestore_from_history(self, from_currency: str) -> Dict[str, float]:
+        try:
+            snapshot = await sync_to_async(get_snapshot_at)(from_currency)
+        except Exception as e:
+            logger.error(f"Database error loading {from_currency} rate history: {e}")
+            return None
+
+        if not self._is_restorable(snapshot):
+            return None
+
+        await self._aset_cached_rates(from_currency, snapshot.rates, snapshot.fetched_at.timestamp())
+        logger.info(f"Restored {from_currency} exchange rates fetched at {snapshot.fetched_at} from history")
+        return snapshot.rates
+
+    async def _afetch_and_cache_rates(self, from_currency: str, from_history: bool = False) -> Dict[str, float]:
+        if from_history:
+            rates = await self._arestore_from_history(from_currency)
+            if rates is not None:
+                return rates
+
+        started = time.monotonic()
+        rates = await self._afetch_rates(from_currency)
+        await self._aset_cached_rates(from_currency, rates, time.time(), time.monotonic() - started)
+
+        try:
+            await sync_to_async(save_snapshot)(from_currency, rates)
+        except Exception as e:
+            logger.error(f"Database error saving {from_currency} rate history: {e}")
+
+        logger.info(f"Retrieved and cached {len(rates)} exchange rates for {from_currency}")
+        return rates
+
+    async def _arefresh_rates(self, from_currency: str, to_currencies: list, wait: bool, from_history: bool = False) -> Dict[str, float]:
+        """Async ExchangeRateAPI._refresh_rates, sharing its Redis lock with sync workers"""
+        lock = self.async_redis_client.lock(self._get_lock_key(from_currency), timeout=self.lock_timeout)
+        try:
+            acquired = await lock.acquire(blocking=False)
+        except Exception as e:
+            logger.error(f"Redis error locking {from_currency} refresh: {e}")
+            return await self._afetch_and_cache_rates(from_currency, from_history)
+
+        if acquired:
+            try:
+                return await self._afetch_and_cache_rates(from_currency, from_history)
+            finally:
+                try:
+                    await lock.release()
+                except Exception as e:
+                    logger.warning(f"Could not release {from_currency} refresh lock: {e}")
+
+        if not wait:
+            return None
+
+        deadline = time.monotonic() + self.refresh_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            cached = await self._aget_cached_table(from_currency, to_currencies)
+            if cached is not None:
+                return cached[0]
+
+        logger.warning(f"Timed out waiting for {from_currency} refresh, fetching directly")
+        return await self._afetch_and_cache_rates(from_currency, from_history)
+
+    async def aget_rate_snapshot(self, from_currency: str, to_currencies: Iterable[str]) -> RateSnapshot:
+        """
+        Async ExchangeRateAPI.get_rate_snapshot
+        """
+        try:
+            _ensure_invalidation_listener()
+            
+            from_currency = from_currency.upper()
+            exchange_rates, missing = self._get_local_rates(from_currency, to_currencies)
+            if not missing:
+                rate_cache_lookups.inc(layer='local', result='hit')
+                return RateSnapshot(exchange_rates, False)
+
+            is_stale = False
+            cached = await self._aget_cached_table(from_currency, missing)
+            if cached is None:
+                rate_cache_lookups.inc(layer='redis', result='miss')
+                try:
+                    rates = await self._arefresh_rates(from_currency, missing, wait=True, from_history=True)
+                    local_rate_cache.set_many(from_currency, rates)
+                except self.PROVIDER_ERRORS as e:
+                    rates, is_stale = await self._aget_last_known_rates(from_currency, e), True
+            else:
+                rates, fetched_at, fetch_duration = cached
+                fresh = self._is_fresh(fetched_at, fetch_duration)
+                rate_cache_lookups.inc(layer='redis', result='hit' if fresh else 'stale')
+                if fresh:
+                    local_rate_cache.set_many(from_currency, rates)
+                elif self.background_refresh:
+                    is_stale = fetched_at + self.cache_expiry < time.time()
+                    if not is_stale:
+                        local_rate_cache.set_many(from_currency, rates)
+                else:
+                    try:
+                        refreshed = await self._arefresh_rates(from_currency, missing, wait=False)
+                    except self.PROVIDER_ERRORS as e:
+                        logger.warning(f"Refreshing {from_currency} rates failed, serving the expired table: {e}")
+                        refreshed = None
+                    if refreshed is None:
+                        is_stale = True
+                    else:
+                        rates = refreshed
+                        local_rate_cache.set_many(from_currency, rates)
+
+            return self._complete_snapshot(from_currency, missing, rates, exchange_rates, is_stale)
+
+        except httpx.HTTPError as e:
+            logger.error(f"Request error fetching exchange rate: {e}")
+            raise Exception(f"Failed to fetch exchange rate: {e}")
+        except ValueError as e:
+            logger.error(f"Value error processing exchange rate: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error fetching exchange rate: {e}")
+            raise
+
+async def aget_rate_snapshot(from_currency: str, to_currencies: Iterable[str]) -> RateSnapshot:
+    """
+    Convenience coroutine to get many exchange rates of one base currency with their staleness
+    """
+    api = AsyncExchangeRateAPI()
+    return await api.aget_rate_snapshot(from_currency, to_currencies)
+
+async def aget_rate_snapshot_to(from_currencies: Iterable[str], to_currency: str) -> RateSnapshot:
+    """
+    Async get_rate_snapshot_to: rates from many currencies into one with their staleness,
+    using only the target's rate table.
+    """
+    from_currencies = [currency.upper() for currency in from_currencies]
+    inverse = await aget_rate_snapshot(to_currency, from_currencies)
+    return RateSnapshot(
+        {currency: 1.0 / inverse.rates[currency] for currency in from_currencies}, inverse.is_stale
+    )
+
+async def aget_rates_to(from_currencies: Iterable[str], to_currency: str) -> Dict[str, float]:
+    """
+    Async get_rates_to: rates from many currencies into one, using only the target's rate table.
+    Returns {from_currency: rate}
+    """
+    return (await aget_rate_snapshot_to(from_currencies, to_currency)).rates
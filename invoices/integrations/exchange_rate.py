@@ -1,81 +1,689 @@
 import requests
 from django.conf import settings
 import logging
-from invoices.utils.redis_client import get_redis_client
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Iterable
+from invoices.services.rate_history import get_snapshot_at, save_snapshot
+from invoices.utils.instrumentation import record_call
+from invoices.utils.metrics import provider_call_seconds, provider_calls_rejected, rate_cache_lookups, stale_rate_responses
+from invoices.utils.redis_client import get_pipeline, get_redis_client, hmget_many
 
 logger = logging.getLogger(__name__)
 
+RateSnapshot = namedtuple('RateSnapshot', ['rates', 'is_stale'])
+
+class LocalRateCache:
+    """
+    Per-worker LRU cache of exchange rates in front of Redis.
+    Entries expire after `ttl` seconds and the oldest are evicted past `max_size`.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, from_currency: str, to_currency: str) -> float:
+        key = (from_currency, to_currency)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set_many(self, from_currency: str, rates: Dict[str, float]):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for to_currency, rate in rates.items():
+                key = (from_currency, to_currency)
+                self._entries[key] = (rate, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, from_currency: str = None):
+        """Drop the rates of one base currency, or everything"""
+        with self._lock:
+            if from_currency is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == from_currency]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+def _local_cache_ttl() -> float:
+    """Local entries never outlive the Redis copy they were read from"""
+    cache_expiry = getattr(settings, 'CACHE_EXPIRY', 300)
+    return min(getattr(settings, 'RATE_LOCAL_CACHE_TTL', cache_expiry // 10), cache_expiry)
+
+local_rate_cache = LocalRateCache(
+    max_size=getattr(settings, 'RATE_LOCAL_CACHE_SIZE', 1024),
+    ttl=_local_cache_ttl(),
+)
+
+_invalidation_listener = None
+_invalidation_listener_lock = threading.Lock()
+
+def _listen_for_invalidations(channel: str):
+    """
+    Drop local rates as workers publish refreshed tables.
+    Polls with a timeout so an idle channel doesn't hit the client's socket timeout.
+    Everything is dropped after a reconnect, invalidations may have been missed meanwhile.
+    """
+    reconnecting = False
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(channel)
+            if reconnecting:
+                local_rate_cache.invalidate()
+                reconnecting = False
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    local_rate_cache.invalidate(message['data'] or None)
+        except Exception as e:
+            logger.error(f"Rate invalidation listener error on {channel}: {e}")
+            reconnecting = True
+            time.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception as e:
+                    logger.warning(f"Could not close rate invalidation subscription: {e}")
+
+def _ensure_invalidation_listener():
+    """Start the pub/sub listener thread of this worker once, if a channel is configured"""
+    global _invalidation_listener
+    channel = getattr(settings, 'RATE_INVALIDATION_CHANNEL', None)
+    if not channel or _invalidation_listener is not None:
+        return
+    with _invalidation_listener_lock:
+        if _invalidation_listener is None:
+            _invalidation_listener = threading.Thread(
+                target=_listen_for_invalidations,
+                args=(channel,),
+                name='rate-invalidation-listener',
+                daemon=True,
+            )
+            _invalidation_listener.start()
+
+def get_local_cache_stats() -> dict:
+    return local_rate_cache.stats()
+
+class ProviderError(Exception):
+    """The provider answered with an error, or its circuit is open"""
+
+class ProviderRequestError(ValueError):
+    """
+    The provider rejected the request itself, e.g. an unsupported currency.
+    Not a provider failure: it doesn't count against the circuit and is not served from history.
+    """
+
+# error-type values of 4xx replies that are failures of our account rather than of the request
+ACCOUNT_ERROR_TYPES = frozenset(['invalid-key', 'inactive-account', 'quota-reached'])
+
+class ProviderCircuitBreaker:
+    """
+    Per-worker circuit breaker around the rate provider.
+    Opens after `failure_threshold` consecutive failed calls, then fails fast for `reset_timeout`
+    seconds before letting a single trial call through.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() < self.opened_at + self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_rejected_request(self):
+        """The provider answered but refused the request, it says nothing about its health"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Opening exchange rate provider circuit after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() >= self.opened_at + self.reset_timeout else 'open'
+
+class ProviderCallStats:
+    """Latency and outcome of this worker's provider calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.last_seconds = seconds
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'avg_seconds': self.total_seconds / self.calls if self.calls else 0.0,
+                'max_seconds': self.max_seconds,
+                'last_seconds': self.last_seconds,
+            }
+
+provider_circuit = ProviderCircuitBreaker(
+    failure_threshold=getattr(settings, 'RATE_CIRCUIT_FAILURE_THRESHOLD', 5),
+    reset_timeout=getattr(settings, 'RATE_CIRCUIT_RESET_TIMEOUT', 30),
+)
+provider_call_stats = ProviderCallStats()
+
+def get_provider_stats() -> dict:
+    return {**provider_call_stats.stats(), 'circuit': provider_circuit.state()}
+
+@contextmanager
+def provider_call(from_currency: str):
+    """
+    Guard one provider call: fail fast while the circuit is open, otherwise time the call
+    and record its outcome. A ProviderRequestError is not counted as a failure.
+    """
+    if not provider_circuit.allow():
+        provider_call_stats.reject()
+        provider_calls_rejected.inc()
+        raise ProviderError(f"Exchange rate provider circuit is open, not fetching {from_currency}")
+
+    started = time.monotonic()
+    try:
+        with record_call('provider'):
+            yield
+    except ProviderRequestError:
+        seconds = time.monotonic() - started
+        provider_call_stats.observe(seconds, ok=True)
+        provider_call_seconds.observe(seconds, outcome='client_error')
+        provider_circuit.record_rejected_request()
+        raise
+    except Exception:
+        seconds = time.monotonic() - started
+        provider_call_stats.observe(seconds, ok=False)
+        provider_call_seconds.observe(seconds, outcome='error')
+        provider_circuit.record_failure()
+        raise
+    seconds = time.monotonic() - started
+    provider_call_stats.observe(seconds, ok=True)
+    provider_call_seconds.observe(seconds, outcome='ok')
+    provider_circuit.record_success()
+
+def provider_call_budget() -> float:
+    """
+    Longest a provider call can take: every attempt timing out plus the backoff between retries.
+    Retry-After headers are ignored so they can't stretch it.
+    """
+    timeout = getattr(settings, 'RATE_HTTP_TIMEOUT', 10)
+    retries = getattr(settings, 'RATE_HTTP_RETRIES', 2)
+    backoff = getattr(settings, 'RATE_HTTP_BACKOFF', 0.5)
+    return timeout * (retries + 1) + sum(backoff * 2 ** attempt for attempt in range(retries))
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session() -> requests.Session:
+    """
+    Process-wide keep-alive session for the provider, retrying failed GETs with exponential backoff
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                retry = Retry(
+                    total=getattr(settings, 'RATE_HTTP_RETRIES', 2),
+                    backoff_factor=getattr(settings, 'RATE_HTTP_BACKOFF', 0.5),
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET']),
+                    raise_on_status=False,
+                    respect_retry_after_header=False,
+                )
+                pool_size = getattr(settings, 'RATE_HTTP_POOL_SIZE', 10)
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
 class ExchangeRateAPI:
+    FETCHED_AT_FIELD = '_fetched_at'
+    FETCH_DURATION_FIELD = '_fetch_duration'
+    # failures of a refresh that fall back to the last-known table
+    PROVIDER_ERRORS = (requests.exceptions.RequestException, ProviderError)
+
     def __init__(self):
         self.api_key = settings.EXCHANGE_RATE_API_KEY
         self.base_url = settings.EXCHANGE_RATE_BASE_URL
         self.redis_client = get_redis_client()
         self.cache_expiry = getattr(settings, 'CACHE_EXPIRY', 300)
-    
-    def _get_cache_key(self, from_currency: str, to_currency: str) -> str:
-        """Generate Redis cache key for exchange rate"""
-        return f"exchange_rate:{from_currency.upper()}:{to_currency.upper()}"
-    
-    def _get_cached_rate(self, from_currency: str, to_currency: str) -> float:
-        """Get exchange rate from Redis cache"""
-        cache_key = self._get_cache_key(from_currency, to_currency)
+        self.stale_ttl = getattr(settings, 'RATE_STALE_TTL', self.cache_expiry)
+        # the lock must outlive the winner's fetch and the waiters must wait for it, or they all fetch
+        call_budget = provider_call_budget()
+        self.lock_timeout = math.ceil(max(
+            getattr(settings, 'RATE_REFRESH_LOCK_TIMEOUT', 15),
+            call_budget + getattr(settings, 'RATE_REFRESH_LOCK_MARGIN', 5),
+        ))
+        self.refresh_wait = max(getattr(settings, 'RATE_REFRESH_WAIT', 10), call_budget)
+        self.early_refresh_beta = getattr(settings, 'RATE_EARLY_REFRESH_BETA', 1.0)
+        self.background_refresh = getattr(settings, 'RATE_BACKGROUND_REFRESH', False)
+        self.http_timeout = getattr(settings, 'RATE_HTTP_TIMEOUT', 10)
+
+    def _get_cache_key(self, from_currency: str) -> str:
+        """Generate Redis cache key for the rate table of a base currency"""
+        return f"exchange_rates:{from_currency.upper()}"
+
+    def _get_lock_key(self, from_currency: str) -> str:
+        """Generate Redis key of the refresh lock of a base currency"""
+        return f"exchange_rates:lock:{from_currency.upper()}"
+
+    def _get_cached_table(self, from_currency: str, to_currencies: list):
+        """
+        Get the cached rates of the requested currencies from Redis.
+        Returns (rates, fetched_at, fetch_duration), or None if the table is not cached.
+        Currencies the table doesn't contain are left out of rates.
+        """
+        cache_key = self._get_cache_key(from_currency)
         try:
-            cached_rate = self.redis_client.get(cache_key)
-            if cached_rate:
-                return float(cached_rate)
-        except (ValueError, TypeError) as e:
-            logger.warning(f"Invalid cached value for {cache_key}: {e}")
+            values = self.redis_client.hmget(cache_key, self._cached_table_fields(to_currencies))
         except Exception as e:
             logger.error(f"Redis error retrieving {cache_key}: {e}")
-        
+            return None
+        return self._parse_cached_table(cache_key, to_currencies, values)
+
+    def get_cached_tables(self, from_currencies: Iterable[str], to_currencies: list) -> dict:
+        """
+        _get_cached_table of many base currencies in one Redis round trip.
+        Returns {from_currency: (rates, fetched_at, fetch_duration) or None}
+        """
+        from_currencies = [currency.upper() for currency in from_currencies]
+        fields = self._cached_table_fields(to_currencies)
+        try:
+            replies = hmget_many(
+                [(self._get_cache_key(currency), fields) for currency in from_currencies],
+                self.redis_client,
+            )
+        except Exception as e:
+            logger.error(f"Redis error retrieving rate tables of {from_currencies}: {e}")
+            return {currency: None for currency in from_currencies}
+        return {
+            currency: self._parse_cached_table(self._get_cache_key(currency), to_currencies, values)
+            for currency, values in zip(from_currencies, replies)
+        }
+
+    def _cached_table_fields(self, to_currencies: list) -> list:
+        return [self.FETCHED_AT_FIELD, self.FETCH_DURATION_FIELD] + to_currencies
+
+    def _parse_cached_table(self, cache_key: str, to_currencies: list, values: list):
+        """Turn the HMGET reply of _cached_table_fields into (rates, fetched_at, fetch_duration)"""
+        try:
+            fetched_at, fetch_duration, *cached_rates = values
+            if fetched_at is None:
+                return None
+            rates = {
+                currency: float(rate)
+                for currency, rate in zip(to_currencies, cached_rates)
+                if rate is not None
+            }
+            return rates, float(fetched_at), float(fetch_duration or 0)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid cached value for {cache_key}: {e}")
         return None
-    
-    def _set_cached_rate(self, from_currency: str, to_currency: str, rate: float):
-        """Set exchange rate in Redis cache with 5-minute expiry"""
-        cache_key = self._get_cache_key(from_currency, to_currency)
+
+    def _get_cached_rate(self, from_currency: str, to_currency: str) -> float:
+        """Get exchange rate from Redis cache"""
+        cached = self._get_cached_table(from_currency, [to_currency.upper()])
+        return cached[0].get(to_currency.upper()) if cached else None
+
+    def get_table_version(self, from_currency: str) -> str:
+        """
+        Fetch time of the cached rate table of a base currency, changes whenever the table is replaced.
+        Returns None if the table is not cached.
+        """
+        cache_key = self._get_cache_key(from_currency)
         try:
-            self.redis_client.setex(cache_key, self.cache_expiry, str(rate))
+            return self.redis_client.hget(cache_key, self.FETCHED_AT_FIELD)
         except Exception as e:
-            logger.error(f"Redis error caching {cache_key}: {e}")
-    
-    def get_exchange_rate(self, from_currency: str, to_currency: str) -> float:
+            logger.error(f"Redis error reading version of {cache_key}: {e}")
+            return None
+
+    def _set_cached_rates(self, from_currency: str, rates: Dict[str, float], fetched_at: float, fetch_duration: float = 0):
         """
-        Get exchange rate from one currency to another with Redis caching
-        Returns the exchange rate as float
+        Replace the cached rate table of a base currency, expiring as a whole.
+        The table is kept `stale_ttl` seconds past its expiry so it can be served while refreshing.
         """
+        cache_key = self._get_cache_key(from_currency)
         try:
-            from_currency = from_currency.upper()
-            to_currency = to_currency.upper()
-            
-            if from_currency == to_currency:
-                return 1.0
-            
-            exchange_rate = self._get_cached_rate(from_currency, to_currency)
-            if exchange_rate is not None:
-                return exchange_rate
-            
-            url = f"{self.base_url}/{self.api_key}/latest/{from_currency}"
-            response = requests.get(url, timeout=10)
+            pipeline = get_pipeline(self.redis_client, transaction=True)
+            self._queue_cached_rates(pipeline, from_currency, rates, fetched_at, fetch_duration)
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Redis error caching {cache_key}: {e}")
+
+    def _queue_cached_rates(self, pipeline, from_currency: str, rates: Dict[str, float], fetched_at: float, fetch_duration: float):
+        """Queue the commands replacing a cached rate table on a sync or async pipeline"""
+        cache_key = self._get_cache_key(from_currency)
+        mapping = {currency: str(rate) for currency, rate in rates.items()}
+        mapping[self.FETCHED_AT_FIELD] = str(fetched_at)
+        mapping[self.FETCH_DURATION_FIELD] = str(fetch_duration)
+        ttl = max(1, int(fetched_at + self.cache_expiry + self.stale_ttl - time.time()))
+        pipeline.delete(cache_key)
+        pipeline.hset(cache_key, mapping=mapping)
+        pipeline.expire(cache_key, ttl)
+        channel = getattr(settings, 'RATE_INVALIDATION_CHANNEL', None)
+        if channel:
+            pipeline.publish(channel, from_currency)
+
+    def _is_fresh(self, fetched_at: float, fetch_duration: float) -> bool:
+        """
+        Probabilistic early expiry: the closer the table is to expiring and the slower
+        it was to fetch, the likelier one caller refreshes it before the TTL runs out.
+        """
+        expires_at = fetched_at + self.cache_expiry
+        early_by = -fetch_duration * self.early_refresh_beta * math.log(1.0 - random.random())
+        return time.time() + early_by < expires_at
+
+    def _fetch_rates(self, from_currency: str) -> Dict[str, float]:
+        """Download the full conversion table of a base currency from the provider"""
+        url = f"{self.base_url}/{self.api_key}/latest/{from_currency}"
+        with provider_call(from_currency):
+            response = get_http_session().get(url, timeout=self.http_timeout)
+            self._raise_for_status(response)
+            return self._parse_provider_response(response.json())
+
+    def _raise_for_status(self, response):
+        """
+        429 and 5xx replies raise the HTTP client's error, a provider failure.
+        Other 4xx replies raise ProviderRequestError unless they are about our account.
+        Works on requests and httpx responses.
+        """
+        if response.status_code == 429 or response.status_code >= 500:
             response.raise_for_status()
+        if response.status_code >= 400:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            error_type = data.get('error-type') if isinstance(data, dict) else None
+            if error_type in ACCOUNT_ERROR_TYPES:
+                raise ProviderError(f"API error: {error_type}")
+            raise ProviderRequestError(f"API error: {error_type or f'HTTP {response.status_code}'}")
+
+    def _parse_provider_response(self, data: dict) -> Dict[str, float]:
+        if data.get('result') != 'success':
+            error_type = data.get('error-type', 'Unknown error')
+            if error_type in ('unsupported-code', 'malformed-request'):
+                raise ProviderRequestError(f"API error: {error_type}")
+            raise ProviderError(f"API error: {error_type}")
+
+        return {currency: float(rate) for currency, rate in data.get('conversion_rates', {}).items()}
+
+    def _is_restorable(self, snapshot) -> bool:
+        """Whether a persisted table is recent enough to be re-cached instead of calling the provider"""
+        max_age = self.cache_expiry + (self.stale_ttl if self.background_refresh else 0)
+        return snapshot is not None and snapshot.fetched_at.timestamp() + max_age > time.time()
+
+    def _restore_from_history(self, from_currency: str) -> Dict[str, float]:
+        """
+        Re-cache the latest persisted table of a base currency if it is still usable.
+        Returns None when there is no such table.
+        """
+        try:
+            snapshot = get_snapshot_at(from_currency)
+        except Exception as e:
+            logger.error(f"Database error loading {from_currency} rate history: {e}")
+            return None
+
+        if not self._is_restorable(snapshot):
+            return None
+
+        self._set_cached_rates(from_currency, snapshot.rates, snapshot.fetched_at.timestamp())
+        logger.info(f"Restored {from_currency} exchange rates fetched at {snapshot.fetched_at} from history")
+        return snapshot.rates
+
+    def _fetch_and_cache_rates(self, from_currency: str, from_history: bool = False) -> Dict[str, float]:
+        if from_history:
+            rates = self._restore_from_history(from_currency)
+            if rates is not None:
+                return rates
+
+        started = time.monotonic()
+        rates = self._fetch_rates(from_currency)
+        self._set_cached_rates(from_currency, rates, time.time(), time.monotonic() - started)
+
+        try:
+            save_snapshot(from_currency, rates)
+        except Exception as e:
+            logger.error(f"Database error saving {from_currency} rate history: {e}")
+
+        logger.info(f"Retrieved and cached {len(rates)} exchange rates for {from_currency}")
+        return rates
+
+    def _refresh_rates(self, from_currency: str, to_currencies: list, wait: bool, from_history: bool = False) -> Dict[str, float]:
+        """
+        Refresh the table of a base currency so only one worker calls the provider at a time.
+        Other callers wait for the winner's result when `wait` is set, otherwise get None
+        and keep using the stale table they already have.
+        With `from_history` a recent persisted table is re-cached instead of calling the provider.
+        """
+        lock = self.redis_client.lock(self._get_lock_key(from_currency), timeout=self.lock_timeout)
+        try:
+            acquired = lock.acquire(blocking=False)
+        except Exception as e:
+            logger.error(f"Redis error locking {from_currency} refresh: {e}")
+            return self._fetch_and_cache_rates(from_currency, from_history)
+
+        if acquired:
+            try:
+                return self._fetch_and_cache_rates(from_currency, from_history)
+            finally:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logger.warning(f"Could not release {from_currency} refresh lock: {e}")
+
+        if not wait:
+            return None
+
+        deadline = time.monotonic() + self.refresh_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            cached = self._get_cached_table(from_currency, to_currencies)
+            if cached is not None:
+                return cached[0]
+
+        logger.warning(f"Timed out waiting for {from_currency} refresh, fetching directly")
+        return self._fetch_and_cache_rates(from_currency, from_history)
+
+    def refresh_if_expiring(self, from_currency: str, lead_time: float) -> bool:
+        """
+        Refresh the table of a base currency if it expires within `lead_time` seconds.
+        Returns True if this call fetched a new table.
+        """
+        from_currency = from_currency.upper()
+        return self._refresh_if_expiring(from_currency, self._get_cached_table(from_currency, []), lead_time)
+
+    def refresh_expiring(self, from_currencies: Iterable[str], lead_time: float) -> list:
+        """
+        refresh_if_expiring for many base currencies, checked with one Redis round trip.
+        Returns the currencies whose table this call fetched; a failed refresh is logged and skipped.
+        """
+        refreshed = []
+        for from_currency, cached in self.get_cached_tables(from_currencies, []).items():
+            try:
+                if self._refresh_if_expiring(from_currency, cached, lead_time):
+                    refreshed.append(from_currency)
+            except Exception as e:
+                logger.error(f"Failed to refresh {from_currency} rates: {e}")
+        return refreshed
+
+    def _refresh_if_expiring(self, from_currency: str, cached, lead_time: float) -> bool:
+        if cached is not None and cached[1] + self.cache_expiry - lead_time > time.time():
+            return False
+        return self._refresh_rates(from_currency, [], wait=False, from_history=cached is None) is not None
+
+    def _fallback_rates(self, from_currency: str, snapshot, error: Exception) -> Dict[str, float]:
+        if snapshot is None:
+            raise error
+        logger.warning(
+            f"Exchange rate provider unavailable ({error}), serving {from_currency} rates fetched at {snapshot.fetched_at}"
+        )
+        return snapshot.rates
+
+    def _get_last_known_rates(self, from_currency: str, error: Exception) -> Dict[str, float]:
+        """
+        Latest persisted table of a base currency whatever its age, used when the provider is failing
+        and nothing is cached. Re-raises `error` if there is none.
+        """
+        return self._fallback_rates(from_currency, get_snapshot_at(from_currency), error)
+
+    def _get_local_rates(self, from_currency: str, to_currencies: Iterable[str]):
+        """
+        Returns ({to_currency: rate} served by the local cache, [to_currencies it doesn't hold])
+        """
+        to_currencies = list(dict.fromkeys(currency.upper() for currency in to_currencies))
+        exchange_rates = {currency: 1.0 for currency in to_currencies if currency == from_currency}
+        for currency in to_currencies:
+            if currency not in exchange_rates:
+                rate = local_rate_cache.get(from_currency, currency)
+                if rate is not None:
+                    exchange_rates[currency] = rate
+        return exchange_rates, [currency for currency in to_currencies if currency not in exchange_rates]
+
+    def _complete_snapshot(self, from_currency: str, missing: list, rates: Dict[str, float], exchange_rates: Dict[str, float], is_stale: bool) -> RateSnapshot:
+        """Fill the locally missing currencies from a base table"""
+        for currency in missing:
+            if currency not in rates:
+                raise ValueError(f"Currency {currency} not supported by API")
+            exchange_rates[currency] = rates[currency]
+
+        if is_stale:
+            logger.warning(f"Serving stale exchange rates for {from_currency}")
+            stale_rate_responses.inc()
+
+        return RateSnapshot(exchange_rates, is_stale)
+
+    def get_rate_snapshot(self, from_currency: str, to_currencies: Iterable[str]) -> RateSnapshot:
+        """
+        Get exchange rates from one currency to many, served from the local cache,
+        then Redis, then the provider.
+        Costs at most one provider call, the whole base table is cached.
+        With RATE_BACKGROUND_REFRESH the provider is only called when no table is cached at all,
+        expired tables are served as last-known rates with is_stale set.
+        When the provider fails or its circuit is open, the expired cached table or else the latest
+        persisted one is served with is_stale set.
+        """
+        try:
+            _ensure_invalidation_listener()
             
-            data = response.json()
-            
-            if data.get('result') != 'success':
-                raise Exception(f"API error: {data.get('error-type', 'Unknown error')}")
-            
-            rates = data.get('conversion_rates', {})
-            
-            if to_currency not in rates:
-                raise ValueError(f"Currency {to_currency} not supported by API")
-            
-            exchange_rate = rates[to_currency]
-            
-            self._set_cached_rate(from_currency, to_currency, exchange_rate)
-            
-            logger.info(f"Retrieved and cached exchange rate {from_currency}->{to_currency}: {exchange_rate}")
-            
-            return float(exchange_rate)
-            
+            from_currency = from_currency.upper()
+            exchange_rates, missing = self._get_local_rates(from_currency, to_currencies)
+            if not missing:
+                rate_cache_lookups.inc(layer='local', result='hit')
+                return RateSnapshot(exchange_rates, False)
+
+            is_stale = False
+            cached = self._get_cached_table(from_currency, missing)
+            if cached is None:
+                rate_cache_lookups.inc(layer='redis', result='miss')
+                # cold miss (e.g. Redis flushed): the persisted history is tried before the provider
+                try:
+                    rates = self._refresh_rates(from_currency, missing, wait=True, from_history=True)
+                    local_rate_cache.set_many(from_currency, rates)
+                except self.PROVIDER_ERRORS as e:
+                    rates, is_stale = self._get_last_known_rates(from_currency, e), True
+            else:
+                rates, fetched_at, fetch_duration = cached
+                fresh = self._is_fresh(fetched_at, fetch_duration)
+                rate_cache_lookups.inc(layer='redis', result='hit' if fresh else 'stale')
+                if fresh:
+                    local_rate_cache.set_many(from_currency, rates)
+                elif self.background_refresh:
+                    is_stale = fetched_at + self.cache_expiry < time.time()
+                    if not is_stale:
+                        local_rate_cache.set_many(from_currency, rates)
+                else:
+                    try:
+                        refreshed = self._refresh_rates(from_currency, missing, wait=False)
+                    except self.PROVIDER_ERRORS as e:
+                        logger.warning(f"Refreshing {from_currency} rates failed, serving the expired table: {e}")
+                        refreshed = None
+                    if refreshed is None:
+                        is_stale = True
+                    else:
+                        rates = refreshed
+                        local_rate_cache.set_many(from_currency, rates)
+
+            return self._complete_snapshot(from_currency, missing, rates, exchange_rates, is_stale)
+
         except requests.exceptions.RequestException as e:
             logger.error(f"Request error fetching exchange rate: {e}")
             raise Exception(f"Failed to fetch exchange rate: {e}")
@@ -86,9 +694,62 @@ class ExchangeRateAPI:
             logger.error(f"Unexpected error fetching exchange rate: {e}")
             raise
 
+    def get_rates(self, from_currency: str, to_currencies: Iterable[str]) -> Dict[str, float]:
+        """
+        Get exchange rates from one currency to many
+        Returns {to_currency: rate}
+        """
+        return self.get_rate_snapshot(from_currency, to_currencies).rates
+
+    def get_exchange_rate(self, from_currency: str, to_currency: str) -> float:
+        """
+        Get exchange rate from one currency to another with Redis caching
+        Returns the exchange rate as float
+        """
+        return self.get_rates(from_currency, [to_currency])[to_currency.upper()]
+
 def get_exchange_rate(from_currency: str, to_currency: str) -> float:
     """
     Convenience function to get exchange rate
     """
     api = ExchangeRateAPI()
-    return api.get_exchange_rate(from_currency, to_currency)
\ No newline at end of file
+    return api.get_exchange_rate(from_currency, to_currency)
+
+def get_rate_table_version(from_currency: str) -> str:
+    """
+    Convenience function to get the version of the cached rate table of a base currency
+    """
+    api = ExchangeRateAPI()
+    return api.get_table_version(from_currency)
+
+def get_rate_snapshot(from_currency: str, to_currencies: Iterable[str]) -> RateSnapshot:
+    """
+    Convenience function to get many exchange rates of one base currency with their staleness
+    """
+    api = ExchangeRateAPI()
+    return api.get_rate_snapshot(from_currency, to_currencies)
+
+def get_rates(from_currency: str, to_currencies: Iterable[str]) -> Dict[str, float]:
+    """
+    Convenience function to get many exchange rates of one base currency
+    """
+    api = ExchangeRateAPI()
+    return api.get_rates(from_currency, to_currencies)
+
+def get_rate_snapshot_to(from_currencies: Iterable[str], to_currency: str) -> RateSnapshot:
+    """
+    Get rates from many currencies into one with their staleness, using only the target's rate table.
+    Returns RateSnapshot({from_currency: rate}, is_stale)
+    """
+    from_currencies = [currency.upper() for currency in from_currencies]
+    inverse = get_rate_snapshot(to_currency, from_currencies)
+    return RateSnapshot(
+        {currency: 1.0 / inverse.rates[currency] for currency in from_currencies}, inverse.is_stale
+    )
+
+def get_rates_to(from_currencies: Iterable[str], to_currency: str) -> Dict[str, float]:
+    """
+    Get rates from many currencies into one, using only the target's rate table.
+    Returns {from_currency: rate}
+    """
+    return get_rate_snapshot_to(from_currencies, to_currency).rates
@@ -0,0 +1,85 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from invoices.models import Account, Invoice
+from invoices.serializers import InvoiceRowEncoder
+
+SEED_SQL = f"""
+    INSERT INTO {Invoice._meta.db_table}
+        (account_id, original_amount, original_currency, exchange_rate, converted_amount, status, created_at)
+    SELECT %s, amount, (ARRAY['USD', 'EUR', 'GBP', 'JPY', 'EGP'])[1 + n %% 5], 1, amount,
+           CASE WHEN n %% 3 = 0 THEN 'PAID' ELSE 'PENDING' END,
+           now() - make_interval(secs => n)
+    FROM (
+        SELECT n, round((random() * 1000)::numeric, 2) AS amount
+        FROM generate_series(%s, %s) AS n
+    ) AS seed
+"""
+
+class Command(BaseCommand):
+    help = 'Seed a scratch account and show plans and timings of the listing and rollup queries'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000], help='Account sizes to measure, in increasing order')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per query, best is reported')
+        parser.add_argument('--page-size', type=int, default=100, help='Rows per listing page')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch account and its invoices')
+    
+    def _best_of(self, repeat, queryset):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+    
+    def _seed(self, account_id, first, last):
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_SQL, [account_id, first, last])
+            # index-only scans need an up-to-date visibility map
+            cursor.execute(f'VACUUM ANALYZE {Invoice._meta.db_table}')
+    
+    def _queries(self, account_id, rows, page_size):
+        invoices = Invoice.objects.filter(account_id=account_id)
+        columns = InvoiceRowEncoder().columns
+        
+        created_at, pk = invoices.order_by('created_at', 'id').values_list('created_at', 'id')[rows // 2]
+        deep_page = invoices.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        )
+        
+        return {
+            'rollup rebuild': invoices.values('original_currency', 'status').annotate(
+                total_original_amount=Sum('original_amount'),
+                total_converted_amount=Sum('converted_amount'),
+                invoice_count=Count('*'),
+            ).order_by(),
+            'first page': invoices.order_by('created_at', 'id').values_list(*columns)[:page_size],
+            'middle page': deep_page.order_by('created_at', 'id').values_list(*columns)[:page_size],
+        }
+    
+    def handle(self, *args, **options):
+        account = Account.objects.create(name='benchmark_queries scratch account')
+        seeded = 0
+        
+        try:
+            for rows in sorted(options['rows']):
+                self.stdout.write(f'Seeding {rows - seeded} invoices...')
+                self._seed(account.id, seeded + 1, rows)
+                seeded = rows
+                
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{rows} invoices in one account'))
+                for name, queryset in self._queries(account.id, rows, options['page_size']).items():
+                    best = self._best_of(options['repeat'], queryset)
+                    self.stdout.write(self.style.MIGRATE_LABEL(f'{name}: {best * 1000:.1f} ms'))
+                    self.stdout.write(queryset.explain(analyze=True, buffers=True))
+        finally:
+            if not options['keep']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {Invoice._meta.db_table} WHERE account_id = %s', [account.id])
+                account.delete()
+        
+        self.stdout.write(
+            self.style.SUCCESS('Query benchmark finished')
+        )
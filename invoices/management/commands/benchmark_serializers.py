@@ -0,0 +1,49 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.utils.encoders import JSONEncoder
+from invoices.models import Invoice
+from invoices.serializers import InvoiceSerializer, InvoiceRowEncoder
+
+class Command(BaseCommand):
+    help = 'Compare InvoiceSerializer with the InvoiceRowEncoder fast path on an account'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('account', type=int, help='Account id whose invoices are listed')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per implementation, best is reported')
+    
+    def _best_of(self, repeat, fn):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings), output
+    
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.filter(account_id=options['account'])
+        count = invoices.count()
+        if not count:
+            raise CommandError(f'Account {options["account"]} has no invoices')
+        
+        encoder = JSONEncoder()
+        
+        def model_serializer():
+            return encoder.encode(InvoiceSerializer(invoices.all(), many=True).data)
+        
+        def fast_path():
+            row_encoder = InvoiceRowEncoder()
+            return encoder.encode(row_encoder.encode_many(invoices.values_list(*row_encoder.columns)))
+        
+        slow_time, slow_output = self._best_of(options['repeat'], model_serializer)
+        fast_time, fast_output = self._best_of(options['repeat'], fast_path)
+        
+        if json.loads(slow_output) != json.loads(fast_output):
+            raise CommandError('Fast path output differs from InvoiceSerializer')
+        
+        self.stdout.write(f'Invoices:         {count}')
+        self.stdout.write(f'InvoiceSerializer: {slow_time * 1000:.1f} ms')
+        self.stdout.write(f'InvoiceRowEncoder: {fast_time * 1000:.1f} ms')
+        self.stdout.write(
+            self.style.SUCCESS(f'Fast path is {slow_time / fast_time:.1f}x faster with identical output')
+        )
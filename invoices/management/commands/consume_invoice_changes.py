@@ -0,0 +1,58 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from invoices.services.outbox import consume, get_consumers, prune
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Deliver the invoice change outbox to the consumers of INVOICE_CHANGE_CONSUMERS'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--consumer', action='append',
+            help='Only run this consumer (repeatable), e.g. to give a slow consumer its own process'
+        )
+        parser.add_argument('--follow', action='store_true', help='Keep polling the outbox')
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'INVOICE_CHANGE_POLL_INTERVAL', 2),
+            help='Seconds between polls with --follow'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'INVOICE_CHANGE_BATCH_SIZE', 10000),
+            help='Changes handed to a consumer at once'
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Delete changes every consumer has handled and older than INVOICE_CHANGE_RETENTION_DAYS after each pass'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            consumers = get_consumers(options['consumer'])
+        except (ValueError, ImportError) as e:
+            raise CommandError(str(e))
+        if not consumers:
+            raise CommandError('No change consumers configured in INVOICE_CHANGE_CONSUMERS')
+        
+        while True:
+            for name, consumer in consumers.items():
+                # a failing consumer is retried next pass from its checkpoint, the others keep going
+                try:
+                    handled = consume(consumer, name, options['batch_size'])
+                except Exception as e:
+                    logger.error(f"Change consumer {name} failed: {e}")
+                    self.stdout.write(self.style.ERROR(f'{name}: {e}'))
+                    continue
+                if handled:
+                    self.stdout.write(f'{name}: {handled} changes')
+            
+            if options['prune']:
+                pruned = prune()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} changes')
+            
+            if not options['follow']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,272 @@
+import csv
+import os
+from collections import namedtuple
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from invoices.integrations.exchange_rate import get_rates_to
+from invoices.models import Account, ImportCheckpoint, Invoice
+from invoices.services.rate_history import get_rate_at
+from invoices.services.currency_converter import fits_decimal_field
+from invoices.services.revenue_rollup import apply_invoices_created
+from invoices.utils.pg_copy import copy_rows, reserve_ids
+
+ImportedInvoice = namedtuple(
+    'ImportedInvoice',
+    ['id', 'account_id', 'original_amount', 'original_currency', 'exchange_rate', 'converted_amount', 'status', 'created_at'],
+)
+
+CENTS = Decimal('0.01')
+RATE_PLACES = Decimal('0.0001')
+STATUSES = {choice for choice, _ in Invoice.STATUS_CHOICES}
+
+class RowLog:
+    """
+    CSV of input rows in their original columns followed by the row index and a note,
+    appended to across resumed runs. Opened on the first row written.
+    """
+
+    def __init__(self, path, note_column):
+        self.path = path
+        self.note_column = note_column
+        self._file = None
+        self._writer = None
+
+    def write(self, entries):
+        for index, row, note in entries:
+            if self._writer is None:
+                self._file = open(self.path, 'a', newline='')
+                # DictReader files the cells of overlong lines under None
+                fieldnames = [name for name in row if name is not None] + ['import_row', self.note_column]
+                self._writer = csv.DictWriter(self._file, fieldnames, restval='', extrasaction='ignore')
+                if self._file.tell() == 0:
+                    self._writer.writeheader()
+            self._writer.writerow({**row, 'import_row': index, self.note_column: note})
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+class Command(BaseCommand):
+    help = 'Import invoices from CSV or Parquet with PostgreSQL COPY, resumable from a checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='CSV or Parquet file with original_amount, original_currency, status, created_at and account_id columns')
+        parser.add_argument('--account', type=int, help='Import every row into this account instead of the account_id column')
+        parser.add_argument('--format', choices=['csv', 'parquet'], help='Input format, inferred from the extension by default')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows loaded per COPY and transaction')
+        parser.add_argument('--checkpoint', type=str, help='Checkpoint name, defaults to the file name')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first row')
+        parser.add_argument('--current-rate-fallback', action='store_true', help='Use current rates when no historic rate covers an invoice date')
+        parser.add_argument(
+            '--max-rate-age', type=float, default=getattr(settings, 'IMPORT_MAX_RATE_AGE_DAYS', 2),
+            help='Days a historic rate may predate the end of an invoice day before it no longer covers it'
+        )
+        parser.add_argument('--rejects', type=str, help='Write rejected rows and their error to this CSV file')
+        parser.add_argument('--fallbacks', type=str, help='Write the rows converted with --current-rate-fallback to this CSV file')
+
+    def _read_csv(self, path):
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f)
+
+    def _read_parquet(self, path, batch_size):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError('Parquet input requires pyarrow to be installed')
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+
+    def _get_rate(self, currency, created_at):
+        """
+        Rate to USD valid at the end of the invoice's day, cached per (currency, day).
+        Returns (rate, whether it is a current rate from --current-rate-fallback),
+        raises ValueError when no rate covers the day.
+        """
+        day = created_at.date()
+        key = (currency, day)
+        if key not in self._rates:
+            self._rates[key] = self._find_rate(currency, day)
+        rate, is_current, error = self._rates[key]
+        if error:
+            raise ValueError(error)
+        return rate, is_current
+
+    def _find_rate(self, currency, day):
+        """Returns (rate, is_current, error); a snapshot older than --max-rate-age doesn't cover the day"""
+        at = min(timezone.make_aware(datetime.combine(day, dt_time.max)), timezone.now())
+        rate, fetched_at = get_rate_at(currency, 'USD', at)
+        error = None
+        if rate is None:
+            error = f'No {currency}->USD rate recorded at {day}'
+        elif at - fetched_at > self.max_rate_age:
+            rate = None
+            error = f'Latest {currency}->USD rate recorded by {day} is from {fetched_at.date()}, older than --max-rate-age'
+
+        if rate is None and self.current_rate_fallback:
+            return get_rates_to([currency], 'USD')[currency], True, None
+        return rate, False, error
+
+    def _check_fits(self, field_name, value):
+        """COPY aborts the whole chunk on a numeric overflow, so such rows are rejected here"""
+        field = Invoice._meta.get_field(field_name)
+        if not fits_decimal_field(field, value):
+            raise ValueError(
+                f'{field_name} {value} does not fit {field.max_digits} digits with {field.decimal_places} decimal places'
+            )
+
+    def _parse_row(self, row):
+        """
+        Returns (ImportedInvoice, whether it was converted at a current rate),
+        raises ValueError with the reason a row is rejected
+        """
+        account_id = self.account_id or row.get('account_id')
+        try:
+            account_id = int(account_id)
+        except (TypeError, ValueError):
+            raise ValueError('account_id must be an integer')
+        if account_id not in self._accounts:
+            raise ValueError(f'Account {account_id} does not exist')
+
+        try:
+            original_amount = Decimal(str(row.get('original_amount'))).quantize(CENTS)
+        except InvalidOperation:
+            raise ValueError('original_amount must be a number')
+        if not original_amount.is_finite() or original_amount <= 0:
+            raise ValueError('Amount must be positive')
+        self._check_fits('original_amount', original_amount)
+
+        original_currency = str(row.get('original_currency') or '').strip().upper()
+        if len(original_currency) != 3:
+            raise ValueError('Currency must be a 3-letter code')
+
+        status = str(row.get('status') or 'PENDING').strip().upper()
+        if status not in STATUSES:
+            raise ValueError('Status must be either PENDING or PAID')
+
+        created_at = row.get('created_at')
+        if isinstance(created_at, str):
+            created_at = parse_datetime(created_at)
+        if not isinstance(created_at, datetime):
+            raise ValueError('created_at must be an ISO 8601 datetime')
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+
+        rate, is_current = self._get_rate(original_currency, created_at)
+        rate = Decimal(str(rate))
+
+        exchange_rate = rate.quantize(RATE_PLACES)
+        converted_amount = (original_amount * rate).quantize(CENTS)
+        self._check_fits('exchange_rate', exchange_rate)
+        self._check_fits('converted_amount', converted_amount)
+
+        invoice = ImportedInvoice(
+            id=None,
+            account_id=account_id,
+            original_amount=original_amount,
+            original_currency=original_currency,
+            exchange_rate=exchange_rate,
+            converted_amount=converted_amount,
+            status=status,
+            created_at=created_at,
+        )
+        return invoice, is_current
+
+    def _load_chunk(self, checkpoint_name, rows_done, chunk):
+        invoices = []
+        rejects = []
+        fallbacks = []
+        for offset, row in enumerate(chunk):
+            try:
+                invoice, is_current = self._parse_row(row)
+            except ValueError as e:
+                rejects.append((rows_done + offset, row, str(e)))
+                continue
+            invoices.append(invoice)
+            if is_current:
+                fallbacks.append((rows_done + offset, row, f'current rate {invoice.exchange_rate}'))
+
+        with transaction.atomic():
+            # ids are assigned up front so the change log can name the copied rows
+            if invoices:
+                ids = reserve_ids(Invoice._meta.db_table, len(invoices))
+                invoices = [invoice._replace(id=pk) for invoice, pk in zip(invoices, ids)]
+            copy_rows(
+                Invoice._meta.db_table,
+                [Invoice._meta.get_field(field).column for field in ImportedInvoice._fields],
+                [[value.isoformat() if isinstance(value, datetime) else value for value in invoice] for invoice in invoices],
+            )
+            apply_invoices_created(invoices)
+            ImportCheckpoint.objects.update_or_create(
+                name=checkpoint_name, defaults={'rows_done': rows_done + len(chunk)}
+            )
+
+        return len(invoices), rejects, fallbacks
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File "{path}" does not exist')
+
+        input_format = options['format'] or ('parquet' if path.endswith('.parquet') else 'csv')
+        chunk_size = options['chunk_size']
+        checkpoint_name = options['checkpoint'] or os.path.basename(path)
+
+        self.account_id = options['account']
+        self.current_rate_fallback = options['current_rate_fallback']
+        self.max_rate_age = timedelta(days=options['max_rate_age'])
+        self._accounts = set(Account.objects.values_list('id', flat=True))
+        self._rates = {}
+
+        if options['restart']:
+            ImportCheckpoint.objects.filter(name=checkpoint_name).delete()
+        checkpoint = ImportCheckpoint.objects.filter(name=checkpoint_name).first()
+        rows_done = checkpoint.rows_done if checkpoint else 0
+        if rows_done:
+            self.stdout.write(f'Resuming "{checkpoint_name}" after row {rows_done}')
+
+        rows = self._read_parquet(path, chunk_size) if input_format == 'parquet' else self._read_csv(path)
+        rows = islice(rows, rows_done, None)
+
+        rejects_log = RowLog(options['rejects'], 'import_error') if options['rejects'] else None
+        fallbacks_log = RowLog(options['fallbacks'], 'import_note') if options['fallbacks'] else None
+        imported = rejected = fallen_back = 0
+
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                loaded, rejects, fallbacks = self._load_chunk(checkpoint_name, rows_done, chunk)
+                rows_done += len(chunk)
+                imported += loaded
+                rejected += len(rejects)
+                fallen_back += len(fallbacks)
+
+                if rejects_log:
+                    rejects_log.write(rejects)
+                if fallbacks_log:
+                    fallbacks_log.write(fallbacks)
+                self.stdout.write(
+                    f'{rows_done} rows processed, {imported} imported ({fallen_back} at current rates), {rejected} rejected'
+                )
+        finally:
+            for log in (rejects_log, fallbacks_log):
+                if log:
+                    log.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Imported {imported} invoices from "{path}", {rejected} rows rejected')
+        )
+        if fallen_back:
+            self.stdout.write(self.style.WARNING(
+                f'{fallen_back} invoices were converted at current rates, no historic rate covered their day'
+                + (f', see "{options["fallbacks"]}"' if fallbacks_log else '')
+            ))
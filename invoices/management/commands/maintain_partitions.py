@@ -0,0 +1,53 @@
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from invoices.models import Invoice
+from invoices.services.partitioning import (
+    add_months, analyze, create_month_partitions, default_partition_months, detach_months_before, get_partitions, is_partitioned,
+)
+
+class Command(BaseCommand):
+    help = (
+        'Keep partitioned invoices healthy: create upcoming monthly partitions, move rows out of the '
+        'default partition, detach old months and analyze the parent table. Run daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=getattr(settings, 'INVOICE_PARTITION_MONTHS_AHEAD', 3),
+            help='Monthly partitions kept ready after the current month'
+        )
+        parser.add_argument(
+            '--detach-before', type=str,
+            help='Detach monthly partitions ending by this YYYY-MM, e.g. before archiving them'
+        )
+
+    def handle(self, *args, **options):
+        table = Invoice._meta.db_table
+        if not is_partitioned(table):
+            raise CommandError(f'{table} is not partitioned, see `manage.py partition_invoices`')
+
+        partitions = get_partitions(table)
+        if any(bound.startswith('FOR VALUES FROM') or bound == 'DEFAULT' for _, bound, _ in partitions):
+            today = date.today()
+            created = create_month_partitions(table, today, add_months(today, options['months_ahead']))
+            for month in default_partition_months(table):
+                created += create_month_partitions(table, month, month)
+            for name in created:
+                self.stdout.write(f'Created {name}')
+
+            if options['detach_before']:
+                try:
+                    year, month = options['detach_before'].split('-')
+                    before = date(int(year), int(month), 1)
+                except ValueError:
+                    raise CommandError('--detach-before must be YYYY-MM')
+                for name in detach_months_before(table, before):
+                    self.stdout.write(f'Detached {name}')
+        elif options['detach_before']:
+            raise CommandError('--detach-before only applies to range partitioning')
+
+        analyze(table)
+        for name, bound, rows in get_partitions(table):
+            self.stdout.write(f'{name}: {bound}, ~{max(rows, 0)} rows')
+        self.stdout.write(self.style.SUCCESS(f'Partitions of {table} maintained'))
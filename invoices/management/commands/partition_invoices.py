@@ -0,0 +1,71 @@
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from invoices.services.partitioning import PartitionMigration, add_months, get_strategy, is_partitioned, table_exists
+
+class Command(BaseCommand):
+    help = (
+        'Move invoices_invoice online into a table partitioned by account_id hash or created_at month. '
+        'Run once to set up and backfill, then with --cutover to swap the tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strategy', choices=['hash', 'range'],
+            help='hash on account_id or monthly range on created_at, defaults to INVOICE_PARTITIONING'
+        )
+        parser.add_argument(
+            '--partitions', type=int, default=getattr(settings, 'INVOICE_HASH_PARTITIONS', 16),
+            help='Number of hash partitions'
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows copied per transaction')
+        parser.add_argument('--cutover', action='store_true', help='Swap in the partitioned table once backfilled')
+        parser.add_argument('--abort', action='store_true', help='Drop the partitioned copy and its trigger')
+        parser.add_argument('--drop-old', action='store_true', help='Drop the unpartitioned table kept by --cutover')
+
+    def handle(self, *args, **options):
+        strategy = options['strategy'] or get_strategy()
+        if not strategy:
+            raise CommandError('Pass --strategy or set INVOICE_PARTITIONING')
+        try:
+            migration = PartitionMigration(strategy, options['partitions'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['abort']:
+            migration.abort()
+            self.stdout.write(self.style.SUCCESS(f'Dropped {migration.shadow}'))
+            return
+        if options['drop_old']:
+            migration.drop_old()
+            self.stdout.write(self.style.SUCCESS(f'Dropped {migration.old}'))
+            return
+        if is_partitioned(migration.table):
+            raise CommandError(f'{migration.table} is already partitioned, see `manage.py maintain_partitions`')
+
+        if not table_exists(migration.shadow):
+            first, _ = migration.created_at_months()
+            today = date.today()
+            migration.setup(first or today, add_months(today, getattr(settings, 'INVOICE_PARTITION_MONTHS_AHEAD', 3)))
+            self.stdout.write(f'Created {migration.shadow} partitioned by {strategy} on {migration.key}')
+
+        copied = 0
+        while True:
+            rows = migration.backfill_batch(options['batch_size'])
+            if not rows:
+                break
+            copied += rows
+            self.stdout.write(f'{copied} rows copied')
+
+        old_rows, new_rows = migration.verify()
+        if old_rows != new_rows:
+            raise CommandError(f'{migration.table} has {old_rows} rows but {migration.shadow} {new_rows}, run again')
+        self.stdout.write(f'{migration.shadow} holds all {new_rows} rows and mirrors new writes')
+
+        if options['cutover']:
+            migration.cutover()
+            self.stdout.write(self.style.SUCCESS(
+                f'{migration.table} is now partitioned by {strategy}, the old table is kept as {migration.old}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Backfilled, run again with --cutover to swap the tables'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from invoices.models import Account
+from invoices.services.revenue_rollup import rebuild_account_rollups
+
+class Command(BaseCommand):
+    help = 'Recompute revenue rollup rows from invoices'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, help='Only rebuild this account id')
+    
+    def handle(self, *args, **options):
+        account_ids = Account.objects.values_list('id', flat=True)
+        if options['account'] is not None:
+            account_ids = account_ids.filter(id=options['account'])
+        
+        for account_id in account_ids.iterator():
+            rows = rebuild_account_rollups(account_id)
+            self.stdout.write(f'Account {account_id}: {rows} rollup rows')
+        
+        self.stdout.write(
+            self.style.SUCCESS('Revenue rollups rebuilt')
+        )
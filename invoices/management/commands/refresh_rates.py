@@ -0,0 +1,63 @@
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from invoices.integrations.exchange_rate import ExchangeRateAPI
+from invoices.models import InvoiceRevenueRollup
+from invoices.services.rate_history import prune_snapshots
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Keep cached exchange rate tables fresh ahead of their expiry'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'RATE_REFRESH_INTERVAL', 60),
+            help='Seconds between refresh passes'
+        )
+        parser.add_argument('--once', action='store_true', help='Run a single refresh pass and exit')
+        parser.add_argument(
+            '--no-prune', dest='prune', action='store_false',
+            help='Leave the rate history alone instead of pruning it every RATE_HISTORY_PRUNE_INTERVAL seconds'
+        )
+    
+    def _get_base_currencies(self):
+        """
+        Tables to keep warm, most read first: the RATE_REFRESH_BASES conversion targets (USD is read
+        by every invoice write and revenue conversion), then the invoice currencies, which are only
+        read when analytics convert into them
+        """
+        targets = list(dict.fromkeys(getattr(settings, 'RATE_REFRESH_BASES', ['USD'])))
+        invoice_currencies = InvoiceRevenueRollup.objects.filter(invoice_count__gt=0).values_list(
+            'original_currency', flat=True
+        ).distinct()
+        return targets + sorted(set(invoice_currencies) - set(targets))
+    
+    def handle(self, *args, **options):
+        interval = options['interval']
+        # refresh tables that would otherwise expire before the next two passes
+        lead_time = interval * 2
+        prune_interval = getattr(settings, 'RATE_HISTORY_PRUNE_INTERVAL', 3600)
+        next_prune = time.monotonic()
+        
+        while True:
+            api = ExchangeRateAPI()
+            # the expiry of every base table is read in one Redis round trip
+            for currency in api.refresh_expiring(self._get_base_currencies(), lead_time):
+                self.stdout.write(f'Refreshed {currency} rates')
+            
+            if options['prune'] and time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + prune_interval
+                try:
+                    pruned = prune_snapshots()
+                except Exception as e:
+                    logger.error(f"Pruning rate history failed: {e}")
+                    self.stdout.write(self.style.ERROR(f'Pruning rate history failed: {e}'))
+                else:
+                    if pruned:
+                        self.stdout.write(f'Pruned {pruned} rate snapshots')
+            
+            if options['once']:
+                break
+            time.sleep(interval)
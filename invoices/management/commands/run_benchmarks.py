@@ -0,0 +1,193 @@
+import json
+import platform
+import subprocess
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from invoices import urls
+from invoices.benchmarks.data import generate_dataset
+from invoices.benchmarks.load import (
+    HTTPTransport, InProcessTransport, build_scenarios, compare_connection_reuse, run_scenario, uncovered_routes,
+)
+from invoices.benchmarks.micro import micro_benchmarks
+from invoices.benchmarks.provider import USD_RATES, StubRateProvider
+from invoices.benchmarks.timing import time_calls
+from invoices.integrations.exchange_rate import ExchangeRateAPI, local_rate_cache
+from invoices.utils.redis_client import get_redis_client
+
+# scenarios run with and without persistent database connections
+CONNECTION_SCENARIOS = ['detail', 'list page']
+
+# statistic compared against a baseline, per section
+COMPARED_STAT = {'micro': 'median_ms', 'load': 'p95_ms'}
+
+class Command(BaseCommand):
+    help = (
+        'Seed scratch accounts, then time the hot functions and load test every route of invoices/urls.py '
+        'against a local stub exchange rate provider. Writes the results as JSON; run it on a scratch '
+        'database and Redis, it replaces their cached rate tables while it runs.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=2, help='Scratch accounts to seed')
+        parser.add_argument('--invoices', type=int, default=50_000, help='Invoices per account')
+        parser.add_argument('--currencies', nargs='+', default=['USD', 'EUR', 'GBP', 'JPY', 'EGP', 'CAD'], help='Invoice currencies, most frequent first')
+        parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of the currency mix, 0 for uniform')
+        parser.add_argument('--days', type=int, default=365, help='Days the invoices are spread over')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the data generator')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed calls per micro-benchmark')
+        parser.add_argument('--sample', type=int, default=1000, help='Invoices converted and serialized per micro-benchmark call')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per load scenario')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients per load scenario')
+        parser.add_argument('--base-url', help='Load test a running server instead of going through the test client')
+        parser.add_argument('--provider-port', type=int, default=0, help='Port of the stub provider, for servers started with EXCHANGE_RATE_BASE_URL pointing at it')
+        parser.add_argument('--provider-latency-ms', type=float, default=0, help='Artificial latency of the stub provider')
+        parser.add_argument('--skip', choices=['micro', 'load', 'connections'], action='append', default=[], help='Sections not to run')
+        parser.add_argument('--conn-max-age', type=int, default=60, help='CONN_MAX_AGE of the persistent run of the connections section')
+        parser.add_argument('--output', help='Results file (default: benchmark-<commit>.json)')
+        parser.add_argument('--compare', help='Results file of a baseline run to report regressions against')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown reported as a regression')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch accounts and their invoices')
+    
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    
+    def _clear_rate_tables(self):
+        api = ExchangeRateAPI()
+        get_redis_client().delete(*[api._get_cache_key(currency) for currency in USD_RATES])
+        local_rate_cache.invalidate()
+    
+    def _run_micro(self, dataset, options):
+        results = {}
+        for name, benchmark in micro_benchmarks(dataset, options['sample']).items():
+            results[name] = time_calls(benchmark, options['repeat'])
+            self.stdout.write(f'{name}: median {results[name]["median_ms"]} ms, p95 {results[name]["p95_ms"]} ms')
+        return results
+    
+    def _run_load(self, dataset, scenarios, options):
+        token = dataset.access_token()
+        if options['base_url']:
+            make_transport = lambda: HTTPTransport(token, options['base_url'])
+        else:
+            make_transport = lambda: InProcessTransport(token)
+        
+        results = {}
+        for scenario in scenarios:
+            result = run_scenario(scenario, make_transport, options['requests'], options['concurrency'])
+            results[scenario.name] = result
+            line = (
+                f'{scenario.method} {scenario.route} ({scenario.name}): p50 {result["median_ms"]} ms, '
+                f'p95 {result["p95_ms"]} ms, {result["throughput_rps"]} req/s'
+            )
+            if result['errors']:
+                self.stdout.write(self.style.ERROR(f'{line}, {result["errors"]} errors {result["statuses"]}'))
+            else:
+                self.stdout.write(line)
+        return results
+    
+    def _run_connections(self, dataset, scenarios, options):
+        token = dataset.access_token()
+        scenarios = [scenario for scenario in scenarios if scenario.name in CONNECTION_SCENARIOS]
+        results = compare_connection_reuse(
+            scenarios, lambda: InProcessTransport(token), options['requests'], options['concurrency'], options['conn_max_age'],
+        )
+        for name, runs in results.items():
+            per_request, persistent = runs['per_request'], runs['persistent']
+            self.stdout.write(
+                f'{name}: {per_request["throughput_rps"]} req/s with a connection per request '
+                f'({per_request["connections_opened"]} opened), {persistent["throughput_rps"]} req/s persistent '
+                f'({persistent["connections_opened"]} opened), x{runs["speedup"]}'
+            )
+        return results
+    
+    def _regressions(self, results, baseline, threshold):
+        regressions = []
+        for section, stat in COMPARED_STAT.items():
+            for name, result in results.get(section, {}).items():
+                previous = baseline.get(section, {}).get(name)
+                if previous and result[stat] > previous[stat] * (1 + threshold):
+                    regressions.append(f'{section} {name}: {stat} {previous[stat]} -> {result[stat]}')
+        return regressions
+    
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+        
+        commit = self._git_commit()
+        results = {
+            'meta': {
+                'commit': commit,
+                'started_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'debug': settings.DEBUG,
+                'async_views': settings.ASYNC_VIEWS,
+                'options': {name: options[name] for name in (
+                    'accounts', 'invoices', 'currencies', 'skew', 'days', 'seed', 'repeat', 'sample',
+                    'requests', 'concurrency', 'base_url', 'provider_latency_ms', 'conn_max_age',
+                )},
+                'database': {
+                    'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+                    'pgbouncer_transaction_mode': getattr(settings, 'DB_PGBOUNCER_TRANSACTION_MODE', False),
+                },
+            },
+        }
+        
+        with StubRateProvider(options['provider_port'], options['provider_latency_ms']) as provider, \
+                override_settings(EXCHANGE_RATE_BASE_URL=provider.base_url, EXCHANGE_RATE_API_KEY='benchmark'):
+            self.stdout.write(f'Stub exchange rate provider at {provider.base_url}')
+            self._clear_rate_tables()
+            
+            self.stdout.write(f'Seeding {options["accounts"]} accounts of {options["invoices"]} invoices...')
+            try:
+                dataset = generate_dataset(
+                    options['accounts'], options['invoices'], options['currencies'],
+                    skew=options['skew'], days=options['days'], seed=options['seed'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            
+            scenarios = build_scenarios(dataset, options['requests'])
+            uncovered = uncovered_routes(urls.urlpatterns, scenarios)
+            try:
+                if uncovered:
+                    raise CommandError(f'No load scenario for {", ".join(uncovered)}')
+                results['dataset'] = dataset.describe()
+                
+                if 'micro' not in options['skip']:
+                    self.stdout.write(self.style.MIGRATE_HEADING('Micro-benchmarks'))
+                    results['micro'] = self._run_micro(dataset, options)
+                if 'load' not in options['skip']:
+                    self.stdout.write(self.style.MIGRATE_HEADING('Load'))
+                    results['load'] = self._run_load(dataset, scenarios, options)
+                # CONN_MAX_AGE of a server can't be changed from here
+                if 'connections' not in options['skip'] and not options['base_url']:
+                    self.stdout.write(self.style.MIGRATE_HEADING('Connection reuse'))
+                    results['connections'] = self._run_connections(dataset, scenarios, options)
+                results['meta']['provider_calls'] = provider.calls
+            finally:
+                self._clear_rate_tables()
+                if not options['keep']:
+                    dataset.delete()
+        
+        output = options['output'] or f'benchmark-{(commit or "unknown")[:12]}.json'
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+        
+        if baseline is not None:
+            regressions = self._regressions(results, baseline, options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
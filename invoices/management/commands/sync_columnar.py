@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from invoices.models import Account
+from invoices.services.analytics_cache import bump_data_versions
+from invoices.services.columnar_store import COLUMNAR_CONSUMER, ColumnarChangeConsumer, ColumnarStore
+from invoices.services.outbox import consume, consumer_lock, set_checkpoint
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild or compact the columnar analytics store and apply the pending invoice changes. '
+        'Keep it current with `consume_invoice_changes --follow`.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Reload every invoice from Postgres first')
+        parser.add_argument('--compact', action='store_true', help='Drop superseded row versions after syncing')
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'INVOICE_CHANGE_BATCH_SIZE', 10000),
+            help='Changes applied per DuckDB transaction'
+        )
+    
+    def handle(self, *args, **options):
+        store = ColumnarStore()
+        
+        try:
+            # a running `consume_invoice_changes --follow` waits until the store and checkpoint agree again
+            with consumer_lock(COLUMNAR_CONSUMER):
+                if options['rebuild']:
+                    rows, transaction_id = store.rebuild()
+                    # changes of transactions the snapshot may have missed are delivered again
+                    set_checkpoint(COLUMNAR_CONSUMER, transaction_id, 0)
+                    bump_data_versions(Account.objects.values_list('id', flat=True))
+                    self.stdout.write(f'Loaded {rows} invoices')
+                
+                applied = consume(ColumnarChangeConsumer(store), COLUMNAR_CONSUMER, options['batch_size'])
+                self.stdout.write(f'Applied {applied} changes')
+                
+                if options['compact']:
+                    self.stdout.write(f'Compacted {store.compact()} superseded rows')
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        
+        self.stdout.write(self.style.SUCCESS(f'Columnar store {store.path} is up to date'))
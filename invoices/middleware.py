@@ -0,0 +1,111 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from invoices.utils.instrumentation import end_request, get_request_metrics, start_request
+from invoices.utils.metrics import request_seconds
+
+logger = logging.getLogger('invoices.requests')
+slow_logger = logging.getLogger('invoices.slow')
+
+class RequestInstrumentationMiddleware:
+    """
+    Count and time the DB queries, Redis commands and exchange rate provider calls of each request.
+    Adds a Server-Timing header, logs one JSON line per request and sends requests slower than
+    SLOW_REQUEST_THRESHOLD_MS and queries slower than SLOW_QUERY_THRESHOLD_MS to the slow log.
+    Request durations also go to the http_request_duration_seconds histogram, by URL route.
+
+    Queries are seen through connection.execute_wrapper on the request's thread, so ORM calls
+    that async views run in other threads and rows a streaming response reads after the view
+    returns are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        token = start_request()
+        try:
+            with self._wrap_queries():
+                response = self.get_response(request)
+            return self._finish(request, response)
+        finally:
+            end_request(token)
+
+    async def __acall__(self, request):
+        token = start_request()
+        try:
+            with self._wrap_queries():
+                response = await self.get_response(request)
+            return self._finish(request, response)
+        finally:
+            end_request(token)
+
+    def _wrap_queries(self) -> ExitStack:
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self._time_query))
+        return stack
+
+    def _time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            metrics = get_request_metrics()
+            if metrics is not None:
+                metrics.add('db', seconds)
+            if seconds * 1000 >= self.slow_query_ms:
+                slow_logger.warning(json.dumps({
+                    'event': 'slow_query',
+                    'ms': round(seconds * 1000, 2),
+                    'sql': sql,
+                }))
+
+    def _finish(self, request, response):
+        metrics = get_request_metrics()
+        total_ms = round(metrics.elapsed_ms(), 2)
+        calls = metrics.summary()
+
+        timings = [
+            f'{kind};dur={call["ms"]};desc="{call["count"]} calls"'
+            for kind, call in sorted(calls.items())
+        ]
+        timings.append(f'total;dur={total_ms}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        record = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': total_ms,
+            'calls': calls,
+        }
+        match = getattr(request, 'resolver_match', None)
+        request_seconds.observe(
+            total_ms / 1000,
+            route=match.route if match is not None else 'unmatched',
+            method=request.method,
+            status=f'{response.status_code // 100}xx',
+        )
+
+        if total_ms >= self.slow_request_ms:
+            slow_logger.warning(json.dumps({**record, 'event': 'slow_request'}))
+        else:
+            logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.26 on 2026-10-17 09:00
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    InvoiceRevenueRollup = apps.get_model('invoices', 'InvoiceRevenueRollup')
+
+    groups = Invoice.objects.values('account_id', 'original_currency', 'status').annotate(
+        total_original_amount=Sum('original_amount'),
+        total_converted_amount=Sum('converted_amount'),
+        invoice_count=Count('id'),
+    ).order_by()
+
+    InvoiceRevenueRollup.objects.bulk_create(
+        [InvoiceRevenueRollup(**group) for group in groups],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_currency', models.CharField(max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid')], max_length=10)),
+                ('total_original_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_converted_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('invoice_count', models.BigIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='invoices.account')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='invoicerevenuerollup',
+            constraint=models.UniqueConstraint(fields=('account', 'original_currency', 'status'), name='unique_revenue_rollup_key'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_exchangeratesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['account', 'created_at', 'id'], name='invoice_account_created_idx'),
+        ),
+    ]
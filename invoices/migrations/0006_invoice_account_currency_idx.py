@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-17 11:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('invoices', '0005_importcheckpoint'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['account', 'original_currency', 'status'], include=['original_amount', 'converted_amount'], name='invoice_account_currency_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.26 on 2026-10-17 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    InvoiceRevenueDailyRollup = apps.get_model('invoices', 'InvoiceRevenueDailyRollup')
+
+    groups = Invoice.objects.annotate(day=TruncDate('created_at')).values(
+        'account_id', 'day', 'original_currency', 'status'
+    ).annotate(
+        total_original_amount=Sum('original_amount'),
+        total_converted_amount=Sum('converted_amount'),
+        invoice_count=Count('*'),
+    ).order_by()
+
+    InvoiceRevenueDailyRollup.objects.bulk_create(
+        (InvoiceRevenueDailyRollup(**group) for group in groups.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0006_invoice_account_currency_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceRevenueDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('original_currency', models.CharField(max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid')], max_length=10)),
+                ('total_original_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_converted_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('invoice_count', models.BigIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue_rollups', to='invoices.account')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='invoicerevenuedailyrollup',
+            constraint=models.UniqueConstraint(fields=('account', 'day', 'original_currency', 'status'), name='unique_revenue_daily_rollup_key'),
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.26 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_invoicerevenuedailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_id', models.BigIntegerField()),
+                ('account_id', models.BigIntegerField()),
+                ('operation', models.CharField(choices=[('INSERT', 'Insert'), ('DELETE', 'Delete')], max_length=6)),
+                ('original_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('original_currency', models.CharField(max_length=10)),
+                ('converted_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_invoicechange'),
+    ]
+
+    operations = [
+        # changes logged before this migration are committed, 0 orders them first
+        migrations.AddField(
+            model_name='invoicechange',
+            name='transaction_id',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='invoicechange',
+            index=models.Index(fields=['transaction_id', 'id'], name='invoice_change_order_idx'),
+        ),
+        migrations.CreateModel(
+            name='ChangeConsumerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('transaction_id', models.BigIntegerField(default=0)),
+                ('change_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -45,5 +45,149 @@ class Invoice(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["account", "created_at", "id"], name="invoice_account_created_idx"),
+            # covers the per-currency sums of rollup rebuilds with an index-only scan
+            models.Index(
+                fields=["account", "original_currency", "status"],
+                include=["original_amount", "converted_amount"],
+                name="invoice_account_currency_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Invoice #{self.id} ({self.original_currency})"
+
+
+class InvoiceRevenueRollup(models.Model):
+    """
+    Running revenue totals per (account, original_currency, status).
+    Maintained incrementally on every invoice write so analytics don't scan invoices.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="revenue_rollups"
+    )
+    original_currency = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=Invoice.STATUS_CHOICES)
+    total_original_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_converted_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    invoice_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "original_currency", "status"],
+                name="unique_revenue_rollup_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Rollup {self.account_id}/{self.original_currency}/{self.status}"
+
+
+class InvoiceRevenueDailyRollup(models.Model):
+    """
+    Revenue totals per (account, day, original_currency, status).
+    Maintained alongside InvoiceRevenueRollup and backs the revenue time series.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="daily_revenue_rollups"
+    )
+    day = models.DateField()
+    original_currency = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=Invoice.STATUS_CHOICES)
+    total_original_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_converted_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    invoice_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "day", "original_currency", "status"],
+                name="unique_revenue_daily_rollup_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Daily rollup {self.account_id}/{self.day}/{self.original_currency}/{self.status}"
+
+
+class ExchangeRateSnapshot(models.Model):
+    """
+    A full conversion table of one base currency as fetched from the provider.
+    """
+    base_currency = models.CharField(max_length=10)
+    rates = models.JSONField()
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["base_currency", "fetched_at"], name="rate_snapshot_base_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.base_currency} rates at {self.fetched_at}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a resumable bulk import, committed with the rows it counts.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    rows_done = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.rows_done} rows"
+
+
+class InvoiceChange(models.Model):
+    """
+    Outbox of invoice writes, recorded in the transaction that makes them.
+    An update is logged as the DELETE of the previous version followed by the INSERT of the new one.
+    Account and invoice are plain ids so the log keeps changes of deleted rows.
+    `transaction_id` is the writer's txid_current(); consumers read in (transaction_id, id) order.
+    """
+    INSERT = "INSERT"
+    DELETE = "DELETE"
+    OPERATION_CHOICES = [
+        (INSERT, "Insert"),
+        (DELETE, "Delete"),
+    ]
+
+    transaction_id = models.BigIntegerField()
+    invoice_id = models.BigIntegerField()
+    account_id = models.BigIntegerField()
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    original_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    original_currency = models.CharField(max_length=10)
+    converted_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=10, choices=Invoice.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["transaction_id", "id"], name="invoice_change_order_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.operation} invoice #{self.invoice_id}"
+
+
+class ChangeConsumerCheckpoint(models.Model):
+    """
+    Last InvoiceChange a consumer has handled, in (transaction_id, change_id) order.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    transaction_id = models.BigIntegerField(default=0)
+    change_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: change {self.change_id} of transaction {self.transaction_id}"
@@ -0,0 +1,62 @@
+import base64
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+class KeysetPagination:
+    """
+    Cursor pagination over (created_at, id).
+    Each page is an index range scan, so deep pages cost the same as the first one.
+    """
+    
+    def __init__(self):
+        self.default_limit = getattr(settings, 'INVOICE_PAGE_SIZE', 100)
+        self.max_limit = getattr(settings, 'INVOICE_MAX_PAGE_SIZE', 1000)
+    
+    def encode_cursor(self, obj) -> str:
+        position = f"{obj.created_at.isoformat()}|{obj.id}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+    
+    def decode_cursor(self, cursor: str):
+        """Returns (created_at, id) of the last row of the previous page"""
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(created_at)
+            return created_at, int(pk)
+        except (ValueError, TypeError, UnicodeDecodeError):
+            raise serializers.ValidationError({"cursor": "Invalid cursor"})
+    
+    def get_limit(self, request) -> int:
+        limit = request.GET.get('limit', self.default_limit)
+        try:
+            limit = int(limit)
+        except (ValueError, TypeError):
+            raise serializers.ValidationError({"limit": "limit must be an integer"})
+        if limit <= 0:
+            raise serializers.ValidationError({"limit": "limit must be positive"})
+        return min(limit, self.max_limit)
+    
+    def paginate_queryset(self, queryset, request):
+        """
+        Returns (page, next_cursor), next_cursor is None on the last page
+        """
+        limit = self.get_limit(request)
+        queryset = queryset.order_by('created_at', 'id')
+        
+        cursor = request.GET.get('cursor')
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            # the redundant bound prunes created_at partitions before the OR is evaluated
+            queryset = queryset.filter(created_at__gte=created_at).filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            )
+        
+        page = list(queryset[:limit + 1])
+        if len(page) <= limit:
+            return page, None
+        
+        page = page[:limit]
+        return page, self.encode_cursor(page[-1])
@@ -6,4 +6,4 @@ class IsInvoiceAccountOwner(permissions.BasePermission):
     """
     
     def has_object_permission(self, request, view, obj):
-        return obj.account == request.user.account
\ No newline at end of file
+        return obj.account_id == request.user.account_id
\ No newline at end of file
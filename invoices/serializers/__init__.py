@@ -2,10 +2,12 @@ from .base import BaseInvoiceSerializer
 from .general import InvoiceSerializer
 from .create import InvoiceCreateSerializer
 from .update import InvoiceUpdateSerializer
+from .fast import InvoiceRowEncoder
 
 __all__ = [
     'BaseInvoiceSerializer',
     'InvoiceSerializer',
     'InvoiceCreateSerializer',
     'InvoiceUpdateSerializer', 
+    'InvoiceRowEncoder',
 ]
\ No newline at end of file
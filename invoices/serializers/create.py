@@ -1,5 +1,7 @@
+from django.db import transaction
 from ..models import Invoice
 from ..services.currency_converter import convert_currency
+from ..services.revenue_rollup import apply_invoice_change
 from .base import BaseInvoiceSerializer
 
 class InvoiceCreateSerializer(BaseInvoiceSerializer):
@@ -8,7 +10,7 @@ class InvoiceCreateSerializer(BaseInvoiceSerializer):
     def create(self, validated_data):
         account = self.context['account']
         original_currency = validated_data['original_currency']
-        original_amount = float(validated_data['original_amount'])
+        original_amount = validated_data['original_amount']
         
         converted_amount, exchange_rate = convert_currency(
             original_amount, 
@@ -16,9 +18,13 @@ class InvoiceCreateSerializer(BaseInvoiceSerializer):
             'USD'
         )
         
-        return Invoice.objects.create(
-            account=account,
-            **validated_data,
-            converted_amount=converted_amount,
-            exchange_rate=exchange_rate,
-        )
\ No newline at end of file
+        with transaction.atomic():
+            invoice = Invoice.objects.create(
+                account=account,
+                **validated_data,
+                converted_amount=converted_amount,
+                exchange_rate=exchange_rate,
+            )
+            apply_invoice_change(after=invoice)
+        
+        return invoice
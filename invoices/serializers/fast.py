@@ -0,0 +1,57 @@
+import decimal
+from rest_framework import serializers
+from .general import InvoiceSerializer
+
+def _decimal_encoder(field):
+    """Same output as DRF's DecimalField.to_representation with coerce_to_string"""
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = field.max_digits
+    rounding = field.rounding
+    
+    def encode(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+    return encode
+
+def _datetime_encoder(field):
+    """Same output as DRF's DateTimeField.to_representation with ISO 8601 format"""
+    def encode(value):
+        value = field.enforce_timezone(value).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return encode
+
+class InvoiceRowEncoder:
+    """
+    Read-only fast path of InvoiceSerializer.
+    Encodes rows of `Invoice.objects.values_list(*InvoiceRowEncoder.columns)` into the
+    exact dicts InvoiceSerializer produces, without building model instances.
+    """
+    fields = InvoiceSerializer.Meta.fields
+    columns = ['account_id' if name == 'account' else name for name in fields]
+    
+    def __init__(self):
+        serializer_fields = InvoiceSerializer().fields
+        self._encoders = []
+        for name in self.fields:
+            field = serializer_fields[name]
+            if isinstance(field, serializers.DecimalField):
+                self._encoders.append(_decimal_encoder(field))
+            elif isinstance(field, serializers.DateTimeField):
+                self._encoders.append(_datetime_encoder(field))
+            else:
+                self._encoders.append(None)
+        self._plan = list(zip(self.fields, self._encoders))
+    
+    def encode(self, row) -> dict:
+        return {
+            name: value if encoder is None or value is None else encoder(value)
+            for (name, encoder), value in zip(self._plan, row)
+        }
+    
+    def encode_many(self, rows) -> list:
+        encode = self.encode
+        return [encode(row) for row in rows]
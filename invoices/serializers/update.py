@@ -1,6 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
 from ..models import Invoice
 from ..services.currency_converter import convert_currency
+from ..services.partitioning import invoice_key
+from ..services.revenue_rollup import apply_invoice_change
 from .base import BaseInvoiceSerializer
 
 class InvoiceUpdateSerializer(BaseInvoiceSerializer):
@@ -8,7 +11,7 @@ class InvoiceUpdateSerializer(BaseInvoiceSerializer):
     
     def update(self, instance, validated_data):
         original_currency = validated_data.get('original_currency', instance.original_currency)
-        original_amount = float(validated_data.get('original_amount', instance.original_amount))
+        original_amount = validated_data.get('original_amount', instance.original_amount)
         
         if (original_currency != instance.original_currency or 
             original_amount != instance.original_amount):
@@ -25,5 +28,14 @@ class InvoiceUpdateSerializer(BaseInvoiceSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        instance.save()
+        with transaction.atomic():
+            # lock and re-read the stored row so concurrent updates can't double count
+            previous = Invoice.objects.select_for_update().get(**invoice_key(instance))
+            # an UPDATE by primary key alone would probe every partition
+            Invoice.objects.filter(**invoice_key(previous)).update(**{
+                field.attname: getattr(instance, field.attname)
+                for field in Invoice._meta.concrete_fields if not field.primary_key
+            })
+            apply_invoice_change(before=previous, after=instance)
+        
         return instance
\ No newline at end of file
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import time
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+from invoices.integrations.exchange_rate import get_rate_table_version
+from invoices.utils.redis_client import get_pipeline, get_redis_client
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+def _data_version_key(account_id: int) -> str:
+    return f"analytics:data_version:{account_id}"
+
+def _version_seed() -> int:
+    """
+    Starting value of a missing data version: microseconds since the epoch, so a counter recreated
+    after a Redis flush, restart or eviction starts past every version issued before
+    """
+    return time.time_ns() // 1000
+
+def get_data_version(account_id: int) -> int:
+    """Counter bumped after every committed invoice write of an account"""
+    key = _data_version_key(account_id)
+    pipeline = get_pipeline(transaction=False)
+    pipeline.set(key, _version_seed(), nx=True)
+    pipeline.get(key)
+    return int(pipeline.execute()[1])
+
+def bump_data_versions(account_ids: Iterable[int]):
+    """
+    Invalidate the cached analytics of accounts.
+    Call after the writing transaction commits, so no reader caches pre-commit data under the new version.
+    """
+    try:
+        pipeline = get_pipeline(transaction=False)
+        seed = _version_seed()
+        for account_id in account_ids:
+            pipeline.set(_data_version_key(account_id), seed, nx=True)
+            pipeline.incr(_data_version_key(account_id))
+        pipeline.execute()
+    except Exception as e:
+        logger.error(f"Redis error bumping analytics data version of accounts {list(account_ids)}: {e}")
+
+class AnalyticsResultCache:
+    """
+    Cached result of one analytics endpoint call.
+    The key holds the account's data version and, for current-rate results, the version of
+    the rate table they were converted with, so stale entries are never read, only left to expire.
+    `key` is None when the versions can't be read; the result is then neither read nor stored.
+    """
+
+    def __init__(self, account_id: int, endpoint: str, params: Iterable, rate_currency: str = None):
+        self.redis_client = get_redis_client()
+        self.ttl = getattr(settings, 'ANALYTICS_CACHE_TTL', getattr(settings, 'CACHE_EXPIRY', 300))
+        if rate_currency is not None:
+            # the local rate cache may lag the Redis table by its TTL, so current-rate entries live no longer
+            self.ttl = min(self.ttl, getattr(settings, 'RATE_LOCAL_CACHE_TTL', self.ttl))
+        self.key = self._build_key(account_id, endpoint, params, rate_currency)
+
+    def _build_key(self, account_id, endpoint, params, rate_currency) -> str:
+        try:
+            data_version = get_data_version(account_id)
+        except Exception as e:
+            logger.error(f"Redis error reading analytics data version of account {account_id}: {e}")
+            return None
+
+        rate_version = '-'
+        if rate_currency is not None:
+            rate_version = get_rate_table_version(rate_currency)
+            if rate_version is None:
+                return None
+
+        params = ':'.join(str(param) for param in params)
+        return f"analytics:{account_id}:{endpoint}:{params}:d{data_version}:r{rate_version}"
+
+    @property
+    def etag(self) -> str:
+        if self.key is None:
+            return None
+        return '"' + hashlib.sha1(self.key.encode()).hexdigest() + '"'
+
+    def get(self):
+        if self.key is None:
+            return None
+        try:
+            cached = self.redis_client.get(self.key)
+            return json.loads(cached) if cached is not None else None
+        except Exception as e:
+            logger.error(f"Redis error retrieving {self.key}: {e}")
+            return None
+
+    def set(self, data):
+        if self.key is None:
+            return
+        try:
+            self.redis_client.set(self.key, json.dumps(data, cls=JSONEncoder), ex=self.ttl)
+        except Exception as e:
+            logger.error(f"Redis error caching {self.key}: {e}")
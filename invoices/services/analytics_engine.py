@@ -0,0 +1,95 @@
+from abc import ABC, abstractmethod
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.module_loading import import_string
+from invoices.services.revenue_rollup import get_account_daily_rollups, get_account_rollups
+from typing import List
+
+ENGINES = {
+    'postgres': 'invoices.services.analytics_engine.PostgresAnalyticsEngine',
+    'columnar': 'invoices.services.columnar_store.ColumnarAnalyticsEngine',
+}
+
+class AnalyticsEngine(ABC):
+    """
+    Aggregations the analytics endpoints are built from. Rows are dicts with Decimal totals.
+
+    - revenue_by_currency(account_id): one row per original_currency with total_original_amount,
+      total_converted_amount and invoice_count
+    - revenue_series(account_id, granularity, date_from, date_to): one row per (period, original_currency,
+      status) with the same totals, `period` being the first day of the day or month, in period order
+
+    The async variants run the sync ones in a thread unless an engine has a native implementation.
+    """
+    name = None
+
+    @abstractmethod
+    def revenue_by_currency(self, account_id: int) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def revenue_series(self, account_id: int, granularity: str, date_from=None, date_to=None) -> List[dict]:
+        ...
+
+    async def arevenue_by_currency(self, account_id: int) -> List[dict]:
+        return await sync_to_async(self.revenue_by_currency, thread_sensitive=False)(account_id)
+
+    async def arevenue_series(self, account_id: int, granularity: str, date_from=None, date_to=None) -> List[dict]:
+        return await sync_to_async(self.revenue_series, thread_sensitive=False)(account_id, granularity, date_from, date_to)
+
+class PostgresAnalyticsEngine(AnalyticsEngine):
+    """Aggregates the incrementally maintained rollup tables"""
+    name = 'postgres'
+
+    def _by_currency(self, account_id):
+        return get_account_rollups(account_id).values(
+            'original_currency'
+        ).annotate(
+            total_original_amount=Sum('total_original_amount'),
+            total_converted_amount=Sum('total_converted_amount'),
+            invoice_count=Sum('invoice_count'),
+        ).order_by()
+
+    def _series(self, account_id, granularity, date_from, date_to):
+        rollups = get_account_daily_rollups(account_id)
+        if date_from:
+            rollups = rollups.filter(day__gte=date_from)
+        if date_to:
+            rollups = rollups.filter(day__lte=date_to)
+
+        if granularity == 'month':
+            rollups = rollups.annotate(period=TruncMonth('day'))
+        else:
+            rollups = rollups.annotate(period=F('day'))
+
+        return rollups.values(
+            'period', 'original_currency', 'status'
+        ).annotate(
+            total_original_amount=Sum('total_original_amount'),
+            total_converted_amount=Sum('total_converted_amount'),
+            invoice_count=Sum('invoice_count'),
+        ).order_by('period', 'original_currency', 'status')
+
+    def revenue_by_currency(self, account_id):
+        return list(self._by_currency(account_id))
+
+    def revenue_series(self, account_id, granularity, date_from=None, date_to=None):
+        return list(self._series(account_id, granularity, date_from, date_to))
+
+    async def arevenue_by_currency(self, account_id):
+        return [row async for row in self._by_currency(account_id)]
+
+    async def arevenue_series(self, account_id, granularity, date_from=None, date_to=None):
+        return [row async for row in self._series(account_id, granularity, date_from, date_to)]
+
+_engine = None
+
+def get_analytics_engine() -> AnalyticsEngine:
+    """The process-wide engine selected by ANALYTICS_ENGINE ('postgres' or 'columnar')"""
+    global _engine
+    if _engine is None:
+        name = getattr(settings, 'ANALYTICS_ENGINE', 'postgres')
+        _engine = import_string(ENGINES.get(name, name))()
+    return _engine
@@ -0,0 +1,131 @@
+from itertools import islice
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from invoices.integrations.exchange_rate import get_rates_to
+from invoices.models import Invoice
+from invoices.serializers import BaseInvoiceSerializer
+from invoices.services.currency_converter import CurrencyConverter, fits_decimal_field
+from invoices.services.revenue_rollup import apply_invoices_created
+import logging
+from typing import Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _chunks(rows: Iterable, size: int):
+    """Yield (index of first row, rows) chunks of at most `size` rows"""
+    rows = iter(rows)
+    start = 0
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+class BulkInvoiceImporter:
+    """
+    Create many invoices of one account.
+    Rows are validated chunk by chunk, each chunk resolves its currencies with one rate
+    lookup and is written with bulk_create. Invalid rows are reported, not fatal.
+    """
+    
+    def __init__(self, account, chunk_size: int = None, batch_size: int = None):
+        self.account = account
+        self.chunk_size = chunk_size or getattr(settings, 'BULK_CHUNK_SIZE', 1000)
+        self.batch_size = batch_size or getattr(settings, 'BULK_BATCH_SIZE', 500)
+        self.converter = CurrencyConverter()
+    
+    def _resolve_rates(self, currencies: set) -> Tuple[Dict[str, float], Dict[str, str]]:
+        """
+        Returns ({currency: rate to USD}, {currency: error}) for the currencies of a chunk
+        """
+        try:
+            return get_rates_to(currencies, 'USD'), {}
+        except Exception as e:
+            logger.warning(f"Batch rate lookup failed, resolving currencies one by one: {e}")
+        
+        # the base table is cached by now, so isolating the bad currency costs no extra provider calls
+        rates, failures = {}, {}
+        for currency in currencies:
+            try:
+                rates.update(get_rates_to([currency], 'USD'))
+            except Exception as e:
+                failures[currency] = f"Currency conversion failed: {e}"
+        return rates, failures
+    
+    def _import_chunk(self, start: int, rows: list) -> Tuple[int, list]:
+        errors = []
+        valid = []
+        for index, row in enumerate(rows, start):
+            if row is None:
+                errors.append({'index': index, 'errors': {'non_field_errors': ['Invalid JSON']}})
+                continue
+            if not isinstance(row, dict):
+                errors.append({'index': index, 'errors': {'non_field_errors': ['Row must be a JSON object']}})
+                continue
+            serializer = BaseInvoiceSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        
+        rates, failures = self._resolve_rates({data['original_currency'] for _, data in valid})
+        
+        convertible = []
+        for index, data in valid:
+            currency = data['original_currency']
+            if currency in failures:
+                errors.append({'index': index, 'errors': {'original_currency': [failures[currency]]}})
+                continue
+            convertible.append((index, data))
+        
+        converted_amounts, exchange_rates = self.converter.convert_with_rates(
+            [data['original_amount'] for _, data in convertible],
+            [data['original_currency'] for _, data in convertible],
+            rates,
+        )
+        # one value overflowing its column would fail the insert of the whole chunk
+        converted_field = Invoice._meta.get_field('converted_amount')
+        invoices = []
+        for (index, data), converted_amount, exchange_rate in zip(convertible, converted_amounts, exchange_rates):
+            if not fits_decimal_field(converted_field, converted_amount):
+                errors.append({'index': index, 'errors': {'original_amount': [
+                    f"Converted amount {converted_amount} USD exceeds {converted_field.max_digits} digits"
+                ]}})
+                continue
+            invoices.append(Invoice(
+                account=self.account,
+                **data,
+                converted_amount=converted_amount,
+                exchange_rate=exchange_rate,
+            ))
+        
+        try:
+            with transaction.atomic():
+                Invoice.objects.bulk_create(invoices, batch_size=self.batch_size)
+                apply_invoices_created(invoices)
+        except DatabaseError as e:
+            logger.error(f"Bulk insert of rows {start}-{start + len(rows) - 1} failed: {e}")
+            failed = {error['index'] for error in errors}
+            errors.extend(
+                {'index': index, 'errors': {'non_field_errors': [f"Insert failed: {e}"]}}
+                for index, _ in valid if index not in failed
+            )
+            return 0, errors
+        
+        return len(invoices), errors
+    
+    def import_rows(self, rows: Iterable) -> dict:
+        """
+        Import an iterable of invoice dicts, None marks an unparsable row.
+        Returns {'created', 'failed', 'errors'}, errors hold the row index and its messages.
+        """
+        created = 0
+        errors = []
+        for start, chunk in _chunks(rows, self.chunk_size):
+            chunk_created, chunk_errors = self._import_chunk(start, chunk)
+            created += chunk_created
+            errors.extend(chunk_errors)
+        
+        errors.sort(key=lambda error: error['index'])
+        return {'created': created, 'failed': len(errors), 'errors': errors}
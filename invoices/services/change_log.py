@@ -0,0 +1,29 @@
+from django.db import connection
+from invoices.models import InvoiceChange
+from typing import Iterable
+
+CHANGE_FIELDS = ['original_amount', 'original_currency', 'converted_amount', 'status', 'created_at']
+
+def _current_transaction_id() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_current()")
+        return cursor.fetchone()[0]
+
+def _change(invoice, operation: str, transaction_id: int) -> InvoiceChange:
+    return InvoiceChange(
+        transaction_id=transaction_id,
+        invoice_id=invoice.id,
+        account_id=invoice.account_id,
+        operation=operation,
+        **{field: getattr(invoice, field) for field in CHANGE_FIELDS},
+    )
+
+def record_invoice_changes(deleted: Iterable = (), inserted: Iterable = ()):
+    """
+    Log removed and added invoice versions, deletes first.
+    Must be called inside the transaction that writes the invoices, after they have ids.
+    """
+    transaction_id = _current_transaction_id()
+    changes = [_change(invoice, InvoiceChange.DELETE, transaction_id) for invoice in deleted]
+    changes += [_change(invoice, InvoiceChange.INSERT, transaction_id) for invoice in inserted]
+    InvoiceChange.objects.bulk_create(changes, batch_size=1000)
@@ -0,0 +1,265 @@
+import csv
+import os
+import tempfile
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+from invoices.models import Invoice, InvoiceChange
+from invoices.services.analytics_cache import bump_data_versions
+from invoices.services.analytics_engine import AnalyticsEngine, PostgresAnalyticsEngine
+from invoices.services.outbox import ChangeConsumer
+from invoices.utils.pg_copy import copy_query_to
+import logging
+from typing import Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS invoices (
+        change_id BIGINT NOT NULL,
+        invoice_id BIGINT NOT NULL,
+        account_id BIGINT NOT NULL,
+        day DATE NOT NULL,
+        original_currency VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        original_amount DECIMAL(12, 2) NOT NULL,
+        converted_amount DECIMAL(12, 2) NOT NULL
+    )
+    """,
+    # a marker hides the versions of its invoice older than its change
+    """
+    CREATE TABLE IF NOT EXISTS invoices_deleted (
+        change_id BIGINT NOT NULL,
+        invoice_id BIGINT NOT NULL,
+        account_id BIGINT NOT NULL
+    )
+    """,
+]
+
+INVOICE_COLUMNS = ['change_id', 'invoice_id', 'account_id', 'day', 'original_currency', 'status', 'original_amount', 'converted_amount']
+MARKER_COLUMNS = ['change_id', 'invoice_id', 'account_id']
+
+# live versions of one account's invoices; bound to (account_id, account_id)
+LIVE_INVOICES = """
+    FROM invoices i
+    WHERE i.account_id = ?
+      AND NOT EXISTS (
+          SELECT 1 FROM invoices_deleted d
+          WHERE d.account_id = ? AND d.invoice_id = i.invoice_id AND d.change_id > i.change_id
+      )
+"""
+
+COLUMNAR_CONSUMER = 'columnar'
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImproperlyConfigured('The columnar analytics store requires duckdb to be installed')
+    return duckdb
+
+def _quote(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+class ColumnarStore:
+    """
+    Embedded DuckDB copy of the invoices, fed from the InvoiceChange outbox by ColumnarChangeConsumer.
+    Rows are never updated in place: each change adds a marker to invoices_deleted hiding the older
+    versions of its invoice, and inserts add the new version, so updates are a marker plus a row.
+    compact() drops hidden rows and the markers.
+
+    DuckDB allows one writing process and no readers meanwhile, so writers hold the file only for
+    one batch and rebuilds are written to a new file swapped in when complete.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or getattr(settings, 'COLUMNAR_DATABASE_PATH', 'invoices_columnar.duckdb')
+
+    def connect(self, read_only: bool = False, path: str = None):
+        return _duckdb().connect(path or self.path, read_only=read_only)
+
+    def _create_schema(self, con):
+        for statement in SCHEMA:
+            con.execute(statement)
+
+    def _load_csv(self, con, table: str, columns: List[str], path: str):
+        if os.path.getsize(path):
+            con.execute(f"COPY {table} ({', '.join(columns)}) FROM {_quote(path)} (FORMAT csv, HEADER false, DELIMITER ',')")
+
+    def _write_csv(self, rows: Iterable) -> str:
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as f:
+            csv.writer(f).writerows(rows)
+        return f.name
+
+    def apply_changes(self, changes: List[InvoiceChange]) -> Set[int]:
+        """
+        Apply a batch of changes in one DuckDB transaction.
+        Changes already stored are skipped by change id, so a redelivered batch is harmless.
+        Returns the ids of the accounts changed.
+        """
+        first_change = min(change.id for change in changes)
+        markers_path = self._write_csv(
+            [change.id, change.invoice_id, change.account_id] for change in changes
+        )
+        rows_path = self._write_csv(
+            [
+                change.id, change.invoice_id, change.account_id, timezone.localdate(change.created_at),
+                change.original_currency, change.status, change.original_amount, change.converted_amount,
+            ]
+            for change in changes if change.operation == InvoiceChange.INSERT
+        )
+        try:
+            with self.connect() as con:
+                self._create_schema(con)
+                con.begin()
+                con.execute("CREATE TEMP TABLE new_markers AS SELECT * FROM invoices_deleted LIMIT 0")
+                con.execute("CREATE TEMP TABLE new_rows AS SELECT * FROM invoices LIMIT 0")
+                self._load_csv(con, 'new_markers', MARKER_COLUMNS, markers_path)
+                self._load_csv(con, 'new_rows', INVOICE_COLUMNS, rows_path)
+                # the change_id lower bound lets zone maps skip older row groups
+                con.execute("""
+                    INSERT INTO invoices_deleted SELECT * FROM new_markers n
+                    WHERE NOT EXISTS (SELECT 1 FROM invoices_deleted d WHERE d.change_id >= ? AND d.change_id = n.change_id)
+                """, [first_change])
+                con.execute("""
+                    INSERT INTO invoices SELECT * FROM new_rows n
+                    WHERE NOT EXISTS (SELECT 1 FROM invoices i WHERE i.change_id >= ? AND i.change_id = n.change_id)
+                """, [first_change])
+                con.commit()
+        finally:
+            os.remove(markers_path)
+            os.remove(rows_path)
+
+        return {change.account_id for change in changes}
+
+    def rebuild(self) -> Tuple[int, int]:
+        """
+        Reload every invoice from Postgres into a new file and swap it in.
+        Returns (rows loaded, transaction id): the snapshot holds every change of the transactions
+        below it, later ones may be in it too and are re-applied harmlessly on top of its rows.
+        """
+        tz = timezone.get_current_timezone_name()
+        invoices_sql = (
+            f"SELECT 0, id, account_id, (created_at AT TIME ZONE {_quote(tz)})::date, original_currency, status, "
+            f"original_amount, converted_amount FROM {Invoice._meta.db_table}"
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as f:
+            export_path = f.name
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+                    transaction_id = cursor.fetchone()[0]
+                copy_query_to(f, invoices_sql)
+
+        new_path = f"{self.path}.rebuild"
+        try:
+            if os.path.exists(new_path):
+                os.remove(new_path)
+            with self.connect(path=new_path) as con:
+                self._create_schema(con)
+                con.execute("CREATE TEMP TABLE loaded AS SELECT * FROM invoices LIMIT 0")
+                self._load_csv(con, 'loaded', INVOICE_COLUMNS, export_path)
+                # clustered by account so per-account scans skip other accounts' row groups
+                con.execute("INSERT INTO invoices SELECT * FROM loaded ORDER BY account_id, day")
+                rows = con.execute("SELECT count(*) FROM invoices").fetchone()[0]
+                con.execute("CHECKPOINT")
+            os.replace(new_path, self.path)
+        finally:
+            os.remove(export_path)
+
+        return rows, transaction_id
+
+    def compact(self) -> int:
+        """Delete hidden row versions and the markers, returns the rows deleted"""
+        with self.connect() as con:
+            self._create_schema(con)
+            con.begin()
+            deleted = con.execute("""
+                DELETE FROM invoices i
+                WHERE EXISTS (
+                    SELECT 1 FROM invoices_deleted d
+                    WHERE d.invoice_id = i.invoice_id AND d.change_id > i.change_id
+                )
+            """).fetchone()[0]
+            # every marker is older than any row still to come, so none is needed any more
+            con.execute("DELETE FROM invoices_deleted")
+            con.commit()
+            con.execute("CHECKPOINT")
+        return deleted
+
+    def query(self, sql: str, params: list) -> List[dict]:
+        with self.connect(read_only=True) as con:
+            cursor = con.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+class ColumnarAnalyticsEngine(AnalyticsEngine):
+    """
+    Aggregates the invoices of the ColumnarStore. Results lag Postgres by the sync interval.
+    Falls back to the rollups when the store can't be read, e.g. while a sync batch holds the file.
+    """
+    name = 'columnar'
+
+    def __init__(self, store: ColumnarStore = None):
+        self.store = store or ColumnarStore()
+        self.fallback = PostgresAnalyticsEngine()
+
+    def _query(self, sql: str, params: list, fallback):
+        try:
+            return self.store.query(sql, params)
+        except ImproperlyConfigured:
+            raise
+        except Exception as e:
+            logger.warning(f"Columnar store unavailable, aggregating in Postgres: {e}")
+            return fallback()
+
+    def revenue_by_currency(self, account_id):
+        sql = f"""
+            SELECT original_currency,
+                   sum(original_amount) AS total_original_amount,
+                   sum(converted_amount) AS total_converted_amount,
+                   count(*) AS invoice_count
+            {LIVE_INVOICES}
+            GROUP BY original_currency
+        """
+        return self._query(sql, [account_id, account_id], lambda: self.fallback.revenue_by_currency(account_id))
+
+    def revenue_series(self, account_id, granularity, date_from=None, date_to=None):
+        period = "CAST(date_trunc('month', day) AS DATE)" if granularity == 'month' else 'day'
+        filters, params = '', [account_id, account_id]
+        if date_from:
+            filters += " AND day >= ?"
+            params.append(date_from)
+        if date_to:
+            filters += " AND day <= ?"
+            params.append(date_to)
+
+        sql = f"""
+            SELECT {period} AS period, original_currency, status,
+                   sum(original_amount) AS total_original_amount,
+                   sum(converted_amount) AS total_converted_amount,
+                   count(*) AS invoice_count
+            {LIVE_INVOICES} {filters}
+            GROUP BY ALL
+            ORDER BY period, original_currency, status
+        """
+        return self._query(
+            sql, params, lambda: self.fallback.revenue_series(account_id, granularity, date_from, date_to)
+        )
+
+class ColumnarChangeConsumer(ChangeConsumer):
+    """
+    Apply outbox changes to the ColumnarStore and invalidate the cached analytics they affect.
+    Registered in INVOICE_CHANGE_CONSUMERS as COLUMNAR_CONSUMER.
+    """
+
+    def __init__(self, store: ColumnarStore = None):
+        self.store = store or ColumnarStore()
+
+    def handle(self, changes):
+        account_ids = self.store.apply_changes(changes)
+        # results computed from the store before this batch are stale
+        bump_data_versions(account_ids)
@@ -1,37 +1,131 @@
-from invoices.integrations.exchange_rate import get_exchange_rate
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from invoices.integrations.exchange_rate import get_rates_to
 import logging
-from typing import Tuple
+from typing import Dict, Iterable, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+def fits_decimal_field(field, value: Decimal) -> bool:
+    """Whether a Decimal quantized to a DecimalField's places fits its numeric(max_digits, decimal_places) column"""
+    return value.is_finite() and value.adjusted() < field.max_digits - field.decimal_places
+
 class CurrencyConverter:
-    def convert_currency(self, amount: float, from_currency: str, to_currency: str) -> Tuple[float, float]:
+    """
+    Converts amounts with Decimal arithmetic.
+    Results are rounded to `decimal_places` using a `decimal` rounding mode such as 'ROUND_HALF_UP'.
+    """
+
+    def __init__(self, decimal_places: int = None, rounding: str = None):
+        if decimal_places is None:
+            decimal_places = getattr(settings, 'CONVERSION_DECIMAL_PLACES', 2)
+        self.quantum = Decimal(1).scaleb(-decimal_places)
+        self.rounding = rounding or getattr(settings, 'CONVERSION_ROUNDING', 'ROUND_HALF_UP')
+
+    def _as_decimal(self, amount) -> Decimal:
+        if isinstance(amount, bool) or not isinstance(amount, (int, float, Decimal)):
+            raise ValueError("Amount must be a positive number")
+        try:
+            amount = Decimal(str(amount)) if isinstance(amount, float) else Decimal(amount)
+        except InvalidOperation:
+            raise ValueError("Amount must be a positive number")
+        if not amount.is_finite() or amount < 0:
+            raise ValueError("Amount must be a positive number")
+        return amount
+
+    def convert_with_rates(
+        self, amounts: Iterable, from_currencies: Iterable[str], rates: Dict[str, float]
+    ) -> Tuple[List[Decimal], List[Decimal]]:
         """
-        Convert amount from one currency to another
-        Returns (converted_amount, exchange_rate)
+        Convert amounts[i] from from_currencies[i] using already resolved {from_currency: rate}.
+        Returns (converted_amounts, exchange_rates) in input order
+        """
+        decimal_rates = {currency: Decimal(str(rate)) for currency, rate in rates.items()}
+        converted_amounts = []
+        exchange_rates = []
+        for amount, currency in zip(amounts, from_currencies):
+            rate = decimal_rates[currency]
+            converted_amounts.append(
+                (self._as_decimal(amount) * rate).quantize(self.quantum, rounding=self.rounding)
+            )
+            exchange_rates.append(rate)
+        return converted_amounts, exchange_rates
+
+    def convert_many(
+        self, amounts: Iterable, from_currencies: Iterable[str], to_currency: str
+    ) -> Tuple[List[Decimal], List[Decimal]]:
+        """
+        Convert amounts[i] from from_currencies[i] into to_currency.
+        Every distinct rate is fetched once, from the target currency's rate table.
+        Returns (converted_amounts, exchange_rates) in input order
+        """
+        try:
+            amounts, from_currencies, to_currency, distinct = self._prepare(amounts, from_currencies, to_currency)
+            rates = get_rates_to(distinct, to_currency) if distinct else {}
+            rates[to_currency] = 1
+
+            return self.convert_with_rates(amounts, from_currencies, rates)
+
+        except Exception as e:
+            logger.error(f"Currency conversion error: {e}")
+            raise
+
+    async def aconvert_many(
+        self, amounts: Iterable, from_currencies: Iterable[str], to_currency: str
+    ) -> Tuple[List[Decimal], List[Decimal]]:
         """
+        convert_many for async views, the rate table is read without blocking the event loop
+        """
+        # httpx is only needed by ASGI deployments
+        from invoices.integrations.async_exchange_rate import aget_rates_to
+
         try:
-            if not isinstance(amount, (int, float)) or amount < 0:
-                raise ValueError("Amount must be a positive number")
-            
-            from_currency = from_currency.upper().strip()
-            to_currency = to_currency.upper().strip()
-            
-            if from_currency == to_currency:
-                return float(amount), 1.0
-            
-            exchange_rate = get_exchange_rate(from_currency, to_currency)
-            converted_amount = amount * exchange_rate   
-                     
-            return converted_amount, exchange_rate
-            
+            amounts, from_currencies, to_currency, distinct = self._prepare(amounts, from_currencies, to_currency)
+            rates = await aget_rates_to(distinct, to_currency) if distinct else {}
+            rates[to_currency] = 1
+
+            return self.convert_with_rates(amounts, from_currencies, rates)
+
         except Exception as e:
             logger.error(f"Currency conversion error: {e}")
             raise
 
-def convert_currency(amount: float, from_currency: str, to_currency: str) -> Tuple[float, float]:
+    def _prepare(self, amounts: Iterable, from_currencies: Iterable[str], to_currency: str):
+        """Returns (amounts, from_currencies, to_currency, currencies that need a rate)"""
+        amounts = list(amounts)
+        from_currencies = [currency.upper().strip() for currency in from_currencies]
+        to_currency = to_currency.upper().strip()
+
+        if len(amounts) != len(from_currencies):
+            raise ValueError("amounts and from_currencies must have the same length")
+
+        return amounts, from_currencies, to_currency, set(from_currencies) - {to_currency}
+
+    def convert_currency(self, amount, from_currency: str, to_currency: str) -> Tuple[Decimal, Decimal]:
+        """
+        Convert amount from one currency to another
+        Returns (converted_amount, exchange_rate)
+        """
+        converted_amounts, exchange_rates = self.convert_many([amount], [from_currency], to_currency)
+        return converted_amounts[0], exchange_rates[0]
+
+def convert_many(amounts: Iterable, from_currencies: Iterable[str], to_currency: str) -> Tuple[List[Decimal], List[Decimal]]:
+    """
+    Convenience function to convert many amounts into one currency
+    """
+    converter = CurrencyConverter()
+    return converter.convert_many(amounts, from_currencies, to_currency)
+
+async def aconvert_many(amounts: Iterable, from_currencies: Iterable[str], to_currency: str) -> Tuple[List[Decimal], List[Decimal]]:
+    """
+    Convenience coroutine to convert many amounts into one currency
+    """
+    converter = CurrencyConverter()
+    return await converter.aconvert_many(amounts, from_currencies, to_currency)
+
+def convert_currency(amount, from_currency: str, to_currency: str) -> Tuple[Decimal, Decimal]:
     """
     Convenience function to convert currency
     """
     converter = CurrencyConverter()
-    return converter.convert_currency(amount, from_currency, to_currency)
\ No newline at end of file
+    return converter.convert_currency(amount, from_currency, to_currency)
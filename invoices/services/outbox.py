@@ -0,0 +1,151 @@
+import json
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from invoices.models import ChangeConsumerCheckpoint, InvoiceChange
+from invoices.utils.redis_client import get_pipeline
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+class ChangeConsumer(ABC):
+    """
+    Downstream reader of the InvoiceChange outbox.
+    Delivery is at-least-once: a batch whose checkpoint wasn't saved is handled again,
+    so handle() must be idempotent, e.g. by keying its effects on the change id.
+    """
+
+    @abstractmethod
+    def handle(self, changes: List[InvoiceChange]):
+        ...
+
+def get_consumers(names: List[str] = None) -> Dict[str, ChangeConsumer]:
+    """Consumers of INVOICE_CHANGE_CONSUMERS ({name: dotted class path}), optionally only `names`"""
+    configured = getattr(settings, 'INVOICE_CHANGE_CONSUMERS', {})
+    unknown = set(names or []) - set(configured)
+    if unknown:
+        raise ValueError(f"Unknown change consumers: {', '.join(sorted(unknown))}")
+    return {
+        name: import_string(path)()
+        for name, path in configured.items()
+        if not names or name in names
+    }
+
+def get_checkpoint(name: str) -> ChangeConsumerCheckpoint:
+    checkpoint, _ = ChangeConsumerCheckpoint.objects.get_or_create(name=name)
+    return checkpoint
+
+def set_checkpoint(name: str, transaction_id: int, change_id: int):
+    ChangeConsumerCheckpoint.objects.update_or_create(
+        name=name, defaults={'transaction_id': transaction_id, 'change_id': change_id},
+    )
+
+@contextmanager
+def consumer_lock(name: str):
+    """
+    Postgres session advisory lock of one consumer, held by consume() and by anything else moving
+    its checkpoint (e.g. a rebuild), so a running consumer can't save a checkpoint over theirs.
+    Re-entrant within a connection. Session locks need a session of their own: behind PgBouncer in
+    transaction mode, run the consumer commands against Postgres directly.
+    """
+    key = f"invoice_change_consumer:{name}"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", [key])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", [key])
+
+def _oldest_running_transaction_id() -> int:
+    """Every transaction with a lower id has committed or aborted"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+def read_batch(checkpoint: ChangeConsumerCheckpoint, limit: int) -> List[InvoiceChange]:
+    """
+    Changes after a checkpoint in (transaction_id, id) order.
+    Only finished transactions are read: change ids are taken before commit, but no transaction
+    below the snapshot xmin can still add changes, so nothing is skipped by moving past them.
+    """
+    return list(
+        InvoiceChange.objects.filter(
+            Q(transaction_id__gt=checkpoint.transaction_id)
+            | Q(transaction_id=checkpoint.transaction_id, id__gt=checkpoint.change_id),
+            transaction_id__lt=_oldest_running_transaction_id(),
+        ).order_by('transaction_id', 'id')[:limit]
+    )
+
+def consume(consumer: ChangeConsumer, name: str, batch_size: int) -> int:
+    """
+    Hand every available change to a consumer batch by batch, returns the changes handled.
+    Runs under the consumer's lock, waiting for another consume() or a rebuild of the same consumer.
+    """
+    handled = 0
+    with consumer_lock(name):
+        while True:
+            checkpoint = get_checkpoint(name)
+            changes = read_batch(checkpoint, batch_size)
+            if not changes:
+                return handled
+            consumer.handle(changes)
+            # saved after handling: a crash in between redelivers the batch
+            set_checkpoint(name, changes[-1].transaction_id, changes[-1].id)
+            handled += len(changes)
+
+def prune(retention: timedelta = None) -> int:
+    """
+    Delete changes every configured consumer has handled and older than `retention`
+    (default INVOICE_CHANGE_RETENTION_DAYS). Returns the changes deleted.
+    """
+    if retention is None:
+        retention = timedelta(days=getattr(settings, 'INVOICE_CHANGE_RETENTION_DAYS', 7))
+    names = list(getattr(settings, 'INVOICE_CHANGE_CONSUMERS', {}))
+    checkpoints = [get_checkpoint(name) for name in names]
+    if not checkpoints:
+        return 0
+    slowest = min(checkpoints, key=lambda checkpoint: (checkpoint.transaction_id, checkpoint.change_id))
+
+    with transaction.atomic():
+        deleted, _ = InvoiceChange.objects.filter(
+            Q(transaction_id__lt=slowest.transaction_id)
+            | Q(transaction_id=slowest.transaction_id, id__lte=slowest.change_id),
+            recorded_at__lt=timezone.now() - retention,
+        ).delete()
+    return deleted
+
+class RedisStreamConsumer(ChangeConsumer):
+    """
+    Publish changes to the INVOICE_CHANGE_STREAM Redis stream, capped at about
+    INVOICE_CHANGE_STREAM_MAXLEN entries. Entries carry the change id for subscribers to deduplicate.
+    """
+
+    def __init__(self):
+        self.stream = getattr(settings, 'INVOICE_CHANGE_STREAM', 'invoices:changes')
+        self.maxlen = getattr(settings, 'INVOICE_CHANGE_STREAM_MAXLEN', 100000)
+
+    def handle(self, changes):
+        pipeline = get_pipeline(transaction=False)
+        for change in changes:
+            pipeline.xadd(self.stream, {
+                'change_id': change.id,
+                'transaction_id': change.transaction_id,
+                'operation': change.operation,
+                'invoice': json.dumps({
+                    'id': change.invoice_id,
+                    'account': change.account_id,
+                    'original_amount': str(change.original_amount),
+                    'original_currency': change.original_currency,
+                    'converted_amount': str(change.converted_amount),
+                    'status': change.status,
+                    'created_at': change.created_at.isoformat(),
+                }),
+            }, maxlen=self.maxlen, approximate=True)
+        pipeline.execute()
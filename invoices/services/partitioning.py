@@ -0,0 +1,360 @@
+import re
+from datetime import date
+from django.conf import settings
+from django.db import connection, transaction
+from django.shortcuts import get_object_or_404
+from django.http import Http404
+from invoices.models import ImportCheckpoint, Invoice
+from typing import List, Optional, Tuple
+
+# column each strategy partitions invoices_invoice on
+PARTITION_KEYS = {
+    'hash': 'account_id',
+    'range': 'created_at',
+}
+
+BACKFILL_CHECKPOINT = 'partition_invoices'
+
+def get_strategy() -> str:
+    """INVOICE_PARTITIONING: '' for the plain table, 'hash' or 'range'"""
+    return getattr(settings, 'INVOICE_PARTITIONING', '') or ''
+
+def invoice_key(invoice) -> dict:
+    """
+    Lookup of one stored invoice that includes the partition key when invoices are partitioned,
+    so the query is planned against a single partition instead of probing every partition's index.
+    """
+    lookup = {'pk': invoice.pk}
+    key = PARTITION_KEYS.get(get_strategy())
+    if key:
+        lookup[key] = getattr(invoice, key)
+    return lookup
+
+def get_account_invoice(queryset, pk, account_id):
+    """
+    Invoice `pk` of `queryset`, looked up within the account first: with hash partitioning that
+    reads one partition. Other accounts are only searched when it misses, so callers still answer
+    403 rather than 404 for another account's invoice.
+    """
+    invoice = queryset.filter(pk=pk, account_id=account_id).first()
+    if invoice is not None:
+        return invoice
+    return get_object_or_404(queryset, pk=pk)
+
+async def aget_account_invoice(queryset, pk, account_id):
+    invoice = await queryset.filter(pk=pk, account_id=account_id).afirst()
+    if invoice is None:
+        invoice = await queryset.filter(pk=pk).afirst()
+    if invoice is None:
+        raise Http404
+    return invoice
+
+def _quote(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` after the month of `day`"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _next_month(day: date) -> date:
+    return add_months(day, 1)
+
+def _month_partition(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+def _bound(month: date) -> str:
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+def is_partitioned(table: str = None) -> bool:
+    table = table or Invoice._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+def table_exists(table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+        return cursor.fetchone()[0]
+
+def get_partitions(table: str = None) -> List[Tuple[str, str, int]]:
+    """(name, bound expression, estimated rows) of every partition of a table"""
+    table = table or Invoice._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            ORDER BY c.relname
+            """,
+            [table],
+        )
+        return cursor.fetchall()
+
+def create_month_partitions(table: str, first: date, last: date) -> List[str]:
+    """
+    Create the missing monthly partitions of a range-partitioned table from the month of `first`
+    through the month of `last`. Rows of a new month already in the default partition are moved
+    into it. Returns the partitions created.
+    """
+    existing = {name for name, _, _ in get_partitions(table)}
+    default = f"{table}_pdefault"
+    created = []
+    month = _month_start(first)
+    while month <= last:
+        name = _month_partition(table, month)
+        if name not in existing:
+            _create_month_partition(table, default if default in existing else None, name, month)
+            created.append(name)
+        month = _next_month(month)
+    return created
+
+@transaction.atomic
+def _create_month_partition(table: str, default: Optional[str], name: str, month: date):
+    start, end = _bound(month), _bound(_next_month(month))
+    with connection.cursor() as cursor:
+        if default is not None:
+            cursor.execute(
+                f"SELECT 1 FROM {_quote(default)} WHERE created_at >= {start} AND created_at < {end} LIMIT 1"
+            )
+        if default is None or cursor.fetchone() is None:
+            cursor.execute(
+                f"CREATE TABLE {_quote(name)} PARTITION OF {_quote(table)} FOR VALUES FROM ({start}) TO ({end})"
+            )
+            return
+
+        # Postgres refuses a partition whose rows sit in the default one: move them over
+        cursor.execute(f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(default)}")
+        cursor.execute(
+            f"CREATE TABLE {_quote(name)} PARTITION OF {_quote(table)} FOR VALUES FROM ({start}) TO ({end})"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {_quote(default)} WHERE created_at >= {start} AND created_at < {end} RETURNING *) "
+            f"INSERT INTO {_quote(name)} SELECT * FROM moved"
+        )
+        cursor.execute(f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(default)} DEFAULT")
+
+def default_partition_months(table: str = None) -> List[date]:
+    """Months with rows in the default partition of a range-partitioned table"""
+    table = table or Invoice._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date "
+            f"FROM {_quote(table + '_pdefault')} ORDER BY 1"
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def detach_months_before(table: str, before: date) -> List[str]:
+    """Detach the monthly partitions ending on or before `before`, keeping them as plain tables"""
+    detached = []
+    for name, _, _ in get_partitions(table):
+        match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})_(\d{{2}})", name)
+        if match and _next_month(date(int(match[1]), int(match[2]), 1)) <= before:
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(name)}")
+            detached.append(name)
+    return detached
+
+def analyze(table: str = None):
+    """Autovacuum analyzes partitions but never their parent, whose statistics plan the joins and aggregates"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {_quote(table or Invoice._meta.db_table)}")
+
+class PartitionMigration:
+    """
+    Online move of invoices_invoice into a partitioned copy.
+
+    1. setup(): create the partitioned shadow table with the same columns, indexes and account
+       foreign key, and a trigger mirroring every write of the old table into it.
+    2. backfill_batch(): copy the existing rows in id batches, resumable from an ImportCheckpoint. Rows are
+       share-locked while copied, so a concurrent update or delete waits and its trigger sees the copy.
+    3. cutover(): under a short exclusive lock, drop the trigger, swap the table, index and
+       constraint names and carry on the id sequence. The old table is kept as
+       invoices_invoice_unpartitioned until drop_old().
+
+    The partition key joins id in the primary key, as Postgres requires; ids stay unique through the
+    sequence.
+    """
+
+    def __init__(self, strategy: str, partitions: int = 16):
+        if strategy not in PARTITION_KEYS:
+            raise ValueError(f"Unknown partitioning strategy '{strategy}', expected one of {', '.join(PARTITION_KEYS)}")
+        self.strategy = strategy
+        self.partitions = partitions
+        self.key = PARTITION_KEYS[strategy]
+        self.table = Invoice._meta.db_table
+        self.shadow = f"{self.table}_partitioned"
+        self.old = f"{self.table}_unpartitioned"
+        self.trigger = f"{self.table}_partition_mirror"
+
+    def _execute(self, sql: str, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def _index_definitions(self) -> List[Tuple[str, str]]:
+        """(name, CREATE INDEX statement) of the old table's secondary indexes, retargeted at the shadow"""
+        rows = self._execute(
+            """
+            SELECT i.relname, pg_get_indexdef(x.indexrelid)
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+            """,
+            [self.table],
+        )
+        definitions = []
+        for name, definition in rows:
+            temp_name = f"{name[:59]}_new"
+            definition = re.sub(
+                r"^CREATE (UNIQUE )?INDEX \S+ ON \S+ ",
+                lambda m: f"CREATE {m[1] or ''}INDEX {_quote(temp_name)} ON {_quote(self.shadow)} ",
+                definition,
+            )
+            definitions.append((name, definition))
+        return definitions
+
+    @transaction.atomic
+    def setup(self, first_month: date = None, last_month: date = None):
+        table, shadow = _quote(self.table), _quote(self.shadow)
+        partition_by = f"HASH ({self.key})" if self.strategy == 'hash' else f"RANGE ({self.key})"
+        self._execute(
+            f"CREATE TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY {partition_by}"
+        )
+        self._execute(f"ALTER TABLE {shadow} ADD PRIMARY KEY (id, {self.key})")
+        for _, definition in self._index_definitions():
+            self._execute(definition)
+        account_table = Invoice._meta.get_field('account').related_model._meta.db_table
+        self._execute(
+            f"ALTER TABLE {shadow} ADD FOREIGN KEY (account_id) REFERENCES {_quote(account_table)} (id) "
+            f"DEFERRABLE INITIALLY DEFERRED"
+        )
+
+        if self.strategy == 'hash':
+            for remainder in range(self.partitions):
+                self._execute(
+                    f"CREATE TABLE {_quote(f'{self.table}_p{remainder}')} PARTITION OF {shadow} "
+                    f"FOR VALUES WITH (MODULUS {self.partitions}, REMAINDER {remainder})"
+                )
+        else:
+            # a default partition takes rows no month covers yet, e.g. imports of old invoices
+            self._execute(f"CREATE TABLE {_quote(f'{self.table}_pdefault')} PARTITION OF {shadow} DEFAULT")
+            month = _month_start(first_month or date.today())
+            while month <= (last_month or date.today()):
+                start, end = _bound(month), _bound(_next_month(month))
+                self._execute(
+                    f"CREATE TABLE {_quote(_month_partition(self.table, month))} PARTITION OF {shadow} "
+                    f"FOR VALUES FROM ({start}) TO ({end})"
+                )
+                month = _next_month(month)
+
+        # the lock taken by CREATE TRIGGER waits for running writers, every later write is mirrored
+        key_match = f"id = OLD.id AND {self.key} = OLD.{self.key}"
+        self._execute(f"""
+            CREATE FUNCTION {_quote(self.trigger)}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {shadow} WHERE {key_match};
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {shadow} VALUES (NEW.*);
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        self._execute(
+            f"CREATE TRIGGER {_quote(self.trigger)} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {_quote(self.trigger)}()"
+        )
+        ImportCheckpoint.objects.filter(name=BACKFILL_CHECKPOINT).delete()
+
+    def created_at_months(self) -> Tuple[Optional[date], Optional[date]]:
+        rows = self._execute(
+            f"SELECT min(created_at AT TIME ZONE 'UTC')::date, max(created_at AT TIME ZONE 'UTC')::date "
+            f"FROM {_quote(self.table)}"
+        )
+        return rows[0]
+
+    def backfill_batch(self, batch_size: int) -> int:
+        """Copy the next batch of rows, returns the rows read"""
+        with transaction.atomic():
+            # rows_done holds the last copied invoice id
+            checkpoint, _ = ImportCheckpoint.objects.select_for_update().get_or_create(name=BACKFILL_CHECKPOINT)
+            rows = self._execute(
+                f"""
+                WITH batch AS (
+                    SELECT * FROM {_quote(self.table)} WHERE id > %s ORDER BY id LIMIT %s FOR SHARE
+                ), copied AS (
+                    INSERT INTO {_quote(self.shadow)} SELECT * FROM batch ON CONFLICT DO NOTHING
+                )
+                SELECT count(*), max(id) FROM batch
+                """,
+                [checkpoint.rows_done, batch_size],
+            )
+            count, last_id = rows[0]
+            if count:
+                checkpoint.rows_done = last_id
+                checkpoint.save(update_fields=['rows_done', 'updated_at'])
+        return count
+
+    def verify(self) -> Tuple[int, int]:
+        """Row counts of the old table and the shadow in one snapshot, equal once backfilled"""
+        with transaction.atomic():
+            self._execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            rows = self._execute(
+                f"SELECT (SELECT count(*) FROM {_quote(self.table)}), (SELECT count(*) FROM {_quote(self.shadow)})"
+            )
+        return rows[0]
+
+    def _rename_indexes(self, names: List[Tuple[str, str]]):
+        for old_name, new_name in names:
+            self._execute(f"ALTER INDEX {_quote(old_name)} RENAME TO {_quote(new_name)}")
+
+    @transaction.atomic
+    def cutover(self):
+        table, shadow = _quote(self.table), _quote(self.shadow)
+        indexes = self._index_definitions()
+        old_sequence = self._execute("SELECT pg_get_serial_sequence(%s, 'id')", [self.table])[0][0]
+
+        self._execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        self._execute(f"DROP TRIGGER {_quote(self.trigger)} ON {table}")
+        self._execute(f"DROP FUNCTION {_quote(self.trigger)}()")
+
+        self._execute(f"ALTER TABLE {table} RENAME TO {_quote(self.old)}")
+        self._execute(f"ALTER TABLE {_quote(self.old)} RENAME CONSTRAINT {_quote(self.table + '_pkey')} TO {_quote(self.old + '_pkey')}")
+        self._rename_indexes([(name, f"{name[:59]}_old") for name, _ in indexes])
+        self._execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+        self._execute(f"ALTER TABLE {table} RENAME CONSTRAINT {_quote(self.shadow + '_pkey')} TO {_quote(self.table + '_pkey')}")
+        self._rename_indexes([(f"{name[:59]}_new", name) for name, _ in indexes])
+
+        # new ids continue after every id the old sequence handed out, including reserved ones
+        sequence = f"{self.table}_id_seq_partitioned"
+        self._execute(f"ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT")
+        self._execute(f"CREATE SEQUENCE {_quote(sequence)} OWNED BY {table}.id")
+        self._execute(
+            "SELECT setval(%s, greatest(coalesce(pg_sequence_last_value(%s::regclass), 0), "
+            f"(SELECT coalesce(max(id), 0) FROM {table})) + 1, false)",
+            [sequence, old_sequence],
+        )
+        self._execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)")
+        ImportCheckpoint.objects.filter(name=BACKFILL_CHECKPOINT).delete()
+
+    @transaction.atomic
+    def abort(self):
+        """Drop the trigger and the shadow table, leaving the old table as it was"""
+        self._execute(f"DROP TRIGGER IF EXISTS {_quote(self.trigger)} ON {_quote(self.table)}")
+        self._execute(f"DROP FUNCTION IF EXISTS {_quote(self.trigger)}()")
+        self._execute(f"DROP TABLE IF EXISTS {_quote(self.shadow)} CASCADE")
+        ImportCheckpoint.objects.filter(name=BACKFILL_CHECKPOINT).delete()
+
+    def drop_old(self):
+        self._execute(f"DROP TABLE IF EXISTS {_quote(self.old)}")
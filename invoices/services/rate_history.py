@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from invoices.models import ExchangeRateSnapshot
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+def save_snapshot(base_currency: str, rates: Dict[str, float], fetched_at: datetime = None) -> ExchangeRateSnapshot:
+    """Persist a fetched conversion table of a base currency"""
+    return ExchangeRateSnapshot.objects.create(
+        base_currency=base_currency.upper(),
+        rates=rates,
+        fetched_at=fetched_at or timezone.now(),
+    )
+
+def prune_snapshots(full_days: int = None, retention_days: int = None) -> int:
+    """
+    Keep the snapshot table bounded: past `full_days` (RATE_HISTORY_FULL_DAYS) only the last snapshot
+    of each base currency and hour is kept, and past `retention_days` (RATE_HISTORY_RETENTION_DAYS,
+    unset keeps them forever) none is.
+    Returns the number of snapshots deleted.
+    """
+    if full_days is None:
+        full_days = getattr(settings, 'RATE_HISTORY_FULL_DAYS', 7)
+    if retention_days is None:
+        retention_days = getattr(settings, 'RATE_HISTORY_RETENTION_DAYS', None)
+    now = timezone.now()
+    deleted = 0
+
+    if retention_days:
+        deleted += ExchangeRateSnapshot.objects.filter(fetched_at__lt=now - timedelta(days=retention_days)).delete()[0]
+
+    downsampled = ExchangeRateSnapshot.objects.filter(fetched_at__lt=now - timedelta(days=full_days))
+    for base_currency in downsampled.values_list('base_currency', flat=True).order_by().distinct():
+        snapshots = downsampled.filter(base_currency=base_currency)
+        kept = snapshots.annotate(hour=TruncHour('fetched_at')).order_by('hour', '-fetched_at').distinct('hour').values('id')
+        deleted += snapshots.exclude(id__in=kept).delete()[0]
+
+    if deleted:
+        logger.info(f"Pruned {deleted} exchange rate snapshots")
+    return deleted
+
+def get_snapshot_at(base_currency: str, at: datetime = None) -> ExchangeRateSnapshot:
+    """
+    Latest snapshot of a base currency fetched at or before `at` (default now).
+    Returns None if there is none.
+    """
+    return ExchangeRateSnapshot.objects.filter(
+        base_currency=base_currency.upper(),
+        fetched_at__lte=at or timezone.now(),
+    ).order_by('-fetched_at').first()
+
+def get_rate_at(from_currency: str, to_currency: str, at: datetime = None):
+    """
+    Exchange rate from one currency to another as known at time `at`.
+    Uses the table of `from_currency`, or inverts the table of `to_currency` if that one is newer.
+    Returns (rate, fetched_at), or (None, None) if no snapshot covers the pair.
+    """
+    from_currency = from_currency.upper()
+    to_currency = to_currency.upper()
+
+    if from_currency == to_currency:
+        return 1.0, at or timezone.now()
+
+    candidates = []
+
+    direct = get_snapshot_at(from_currency, at)
+    if direct is not None and to_currency in direct.rates:
+        candidates.append((float(direct.rates[to_currency]), direct.fetched_at))
+
+    inverse = get_snapshot_at(to_currency, at)
+    if inverse is not None and inverse.rates.get(from_currency):
+        candidates.append((1.0 / float(inverse.rates[from_currency]), inverse.fetched_at))
+
+    if not candidates:
+        return None, None
+
+    return max(candidates, key=lambda candidate: candidate[1])
@@ -0,0 +1,174 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from invoices.db_router import pin_to_primary
+from invoices.models import Invoice, InvoiceRevenueDailyRollup, InvoiceRevenueRollup
+from invoices.services.analytics_cache import bump_data_versions
+from invoices.services.change_log import record_invoice_changes
+from invoices.utils.metrics import rollup_lag_seconds, rollup_rebuilt_at
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def _as_stored_decimal(field_name: str, value) -> Decimal:
+    """Round a value the same way the Invoice column stores it"""
+    field = Invoice._meta.get_field(field_name)
+    return field.to_python(value).quantize(Decimal(1).scaleb(-field.decimal_places))
+
+def _rollup_key(invoice: Invoice) -> tuple:
+    return invoice.account_id, invoice.original_currency, invoice.status
+
+def _daily_rollup_key(invoice: Invoice) -> tuple:
+    return invoice.account_id, timezone.localdate(invoice.created_at), invoice.original_currency, invoice.status
+
+def _on_rollups_committed(account_ids, started: float, path: str):
+    """
+    Pin the accounts' reads to the primary, invalidate their cached analytics and record how long
+    the rollup change took to become visible. Pinning first keeps results read from a lagging
+    replica out of the cache under the new data version.
+    """
+    pin_to_primary(account_ids)
+    bump_data_versions(account_ids)
+    rollup_lag_seconds.observe(time.monotonic() - started, path=path)
+
+def _apply_totals(model, lookup: dict, original_amount: Decimal, converted_amount: Decimal, count: int):
+    """Add signed totals to the rollup row of `model` matching `lookup`"""
+    updated = model.objects.filter(**lookup).update(
+        total_original_amount=F('total_original_amount') + original_amount,
+        total_converted_amount=F('total_converted_amount') + converted_amount,
+        invoice_count=F('invoice_count') + count,
+    )
+    if updated:
+        return
+
+    # first invoice for this key; a concurrent writer may create the row first
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                **lookup,
+                total_original_amount=original_amount,
+                total_converted_amount=converted_amount,
+                invoice_count=count,
+            )
+    except IntegrityError:
+        _apply_totals(model, lookup, original_amount, converted_amount, count)
+
+def _apply_rollup_totals(key: tuple, *totals):
+    account_id, original_currency, status = key
+    _apply_totals(
+        InvoiceRevenueRollup,
+        {'account_id': account_id, 'original_currency': original_currency, 'status': status},
+        *totals,
+    )
+
+def _apply_daily_rollup_totals(key: tuple, *totals):
+    account_id, day, original_currency, status = key
+    _apply_totals(
+        InvoiceRevenueDailyRollup,
+        {'account_id': account_id, 'day': day, 'original_currency': original_currency, 'status': status},
+        *totals,
+    )
+
+def _apply_delta(invoice: Invoice, sign: int):
+    """Add (sign=1) or remove (sign=-1) one invoice's contribution to its rollup rows"""
+    totals = (
+        sign * _as_stored_decimal('original_amount', invoice.original_amount),
+        sign * _as_stored_decimal('converted_amount', invoice.converted_amount),
+        sign,
+    )
+    _apply_rollup_totals(_rollup_key(invoice), *totals)
+    _apply_daily_rollup_totals(_daily_rollup_key(invoice), *totals)
+
+def apply_invoice_change(before: Invoice = None, after: Invoice = None):
+    """
+    Move an invoice's contribution between rollup rows and log the change.
+    Pass only `after` for creates, only `before` for deletes and both for updates.
+    Must be called inside the transaction that writes the invoice.
+    """
+    started = time.monotonic()
+    account_ids = set()
+    if before is not None:
+        _apply_delta(before, -1)
+        account_ids.add(before.account_id)
+    if after is not None:
+        _apply_delta(after, 1)
+        account_ids.add(after.account_id)
+    record_invoice_changes(
+        deleted=[before] if before is not None else [],
+        inserted=[after] if after is not None else [],
+    )
+    transaction.on_commit(lambda: _on_rollups_committed(account_ids, started, 'single'))
+
+def apply_invoices_created(invoices):
+    """
+    Add many new invoices with one rollup update per (account, currency, status) and log them.
+    Must be called inside the transaction that inserts the invoices, once they have ids.
+    """
+    started = time.monotonic()
+    totals = {}
+    daily_totals = {}
+    for invoice in invoices:
+        original_amount = _as_stored_decimal('original_amount', invoice.original_amount)
+        converted_amount = _as_stored_decimal('converted_amount', invoice.converted_amount)
+        for key, bucket in ((_rollup_key(invoice), totals), (_daily_rollup_key(invoice), daily_totals)):
+            key_original, key_converted, key_count = bucket.get(key, (0, 0, 0))
+            bucket[key] = (key_original + original_amount, key_converted + converted_amount, key_count + 1)
+
+    # fixed order so concurrent bulk writers lock rollup rows without deadlocking
+    for key in sorted(totals):
+        _apply_rollup_totals(key, *totals[key])
+    for key in sorted(daily_totals):
+        _apply_daily_rollup_totals(key, *daily_totals[key])
+
+    record_invoice_changes(inserted=invoices)
+    account_ids = {account_id for account_id, _, _ in totals}
+    transaction.on_commit(lambda: _on_rollups_committed(account_ids, started, 'bulk'))
+
+def get_account_rollups(account):
+    """Non-empty rollup rows of an account"""
+    return InvoiceRevenueRollup.objects.filter(account=account, invoice_count__gt=0)
+
+def get_account_daily_rollups(account):
+    """Non-empty daily rollup rows of an account"""
+    return InvoiceRevenueDailyRollup.objects.filter(account=account, invoice_count__gt=0)
+
+@transaction.atomic
+def rebuild_account_rollups(account_id: int) -> int:
+    """
+    Recompute the rollup and daily rollup rows of an account from its invoices.
+    Used to reconcile after writes that bypass the API (admin, raw SQL).
+    Returns the number of rollup rows written.
+    """
+    InvoiceRevenueRollup.objects.filter(account_id=account_id).delete()
+    InvoiceRevenueDailyRollup.objects.filter(account_id=account_id).delete()
+
+    invoices = Invoice.objects.filter(account_id=account_id)
+    totals = {
+        'total_original_amount': Sum('original_amount'),
+        'total_converted_amount': Sum('converted_amount'),
+        # COUNT(*) keeps the scan index-only on invoice_account_currency_idx
+        'invoice_count': Count('*'),
+    }
+
+    groups = invoices.values('original_currency', 'status').annotate(**totals).order_by()
+    rollups = InvoiceRevenueRollup.objects.bulk_create(
+        [InvoiceRevenueRollup(account_id=account_id, **group) for group in groups]
+    )
+
+    daily_groups = invoices.annotate(day=TruncDate('created_at')).values(
+        'day', 'original_currency', 'status'
+    ).annotate(**totals).order_by()
+    daily_rollups = InvoiceRevenueDailyRollup.objects.bulk_create(
+        [InvoiceRevenueDailyRollup(account_id=account_id, **group) for group in daily_groups],
+        batch_size=1000,
+    )
+
+    transaction.on_commit(lambda: bump_data_versions([account_id]))
+    transaction.on_commit(lambda: rollup_rebuilt_at.set(time.time()))
+    logger.info(
+        f"Rebuilt {len(rollups)} revenue rollup rows and {len(daily_rollups)} daily rows for account {account_id}"
+    )
+    return len(rollups) + len(daily_rollups)
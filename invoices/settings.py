@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'invoices.middleware.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +83,10 @@ AUTH_USER_MODEL = 'invoices.User'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# behind PgBouncer in transaction pooling mode a session spans many server connections:
+# server-side cursors (streaming) and psycopg 3 prepared statements are turned off
+DB_PGBOUNCER_TRANSACTION_MODE = os.getenv('DB_PGBOUNCER_TRANSACTION_MODE', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -90,8 +95,44 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # connections are reused across requests for this many seconds, 0 opens one per request.
+        # Each gunicorn worker thread holds one, so workers * threads must stay below max_connections
+        # (or PgBouncer's default_pool_size). Use 0 with ASGI workers and pool in PgBouncer instead
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        # a reused connection is checked before the first query of a request, so a restarted
+        # database or pooler costs a reconnect instead of a failed request
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER_TRANSACTION_MODE,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
+if DB_PGBOUNCER_TRANSACTION_MODE:
+    try:
+        import psycopg  # noqa: F401
+        DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+    except ImportError:
+        pass
+
+# read replicas for the analytics and invoice list reads, as a comma separated host[:port] list;
+# reads fall back to the primary while a replica lags more than REPLICA_MAX_LAG_SECONDS or is down,
+# and an account's reads stay on the primary for REPLICA_PIN_SECONDS after it writes;
+# the health check reads pg_stat_wal_receiver, so the replica user needs pg_read_all_stats
+REPLICA_DATABASES = []
+for index, address in enumerate(address for address in os.getenv('DB_REPLICA_HOSTS', '').split(',') if address):
+    host, _, port = address.partition(':')
+    REPLICA_DATABASES.append(f'replica_{index}')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['invoices.db_router.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_HEALTH_CHECK_INTERVAL = 10
 
 
 # Password validation
@@ -162,11 +203,116 @@ REDIS_PORT = os.getenv('REDIS_PORT')
 REDIS_DB = os.getenv('REDIS_DB')
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
 
+# 'standalone', 'sentinel' (REDIS_SENTINELS as host:port list + REDIS_SENTINEL_SERVICE) or 'cluster'
+REDIS_MODE = os.getenv('REDIS_MODE', 'standalone')
+REDIS_SENTINELS = [address for address in os.getenv('REDIS_SENTINELS', '').split(',') if address]
+REDIS_SENTINEL_SERVICE = os.getenv('REDIS_SENTINEL_SERVICE', 'mymaster')
+REDIS_SENTINEL_PASSWORD = os.getenv('REDIS_SENTINEL_PASSWORD')
+
+# connections per process; callers wait up to REDIS_POOL_TIMEOUT seconds for a free one
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = 5
+REDIS_CONNECT_TIMEOUT = 5
+REDIS_SOCKET_TIMEOUT = 5
+REDIS_HEALTH_CHECK_INTERVAL = 30
+REDIS_RETRY_ON_TIMEOUT = True
+
 EXCHANGE_RATE_API_KEY = os.getenv('EXCHANGE_RATE_API_KEY')
 EXCHANGE_RATE_BASE_URL = 'https://v6.exchangerate-api.com/v6'
 
 CACHE_EXPIRY = 300
 
+# rate tables are served stale for this long past CACHE_EXPIRY while one worker refreshes them
+RATE_STALE_TTL = int(os.getenv('RATE_STALE_TTL', CACHE_EXPIRY))
+# both are raised to cover the worst-case provider call, RATE_HTTP_TIMEOUT * (RATE_HTTP_RETRIES + 1) plus backoff;
+# the lock also covers caching and saving the fetched table for RATE_REFRESH_LOCK_MARGIN seconds
+RATE_REFRESH_LOCK_TIMEOUT = 15
+RATE_REFRESH_LOCK_MARGIN = 5
+RATE_REFRESH_WAIT = 10
+RATE_EARLY_REFRESH_BETA = 1.0
+
+# when the refresh_rates command keeps tables warm, requests serve expired tables instead of calling the provider
+RATE_BACKGROUND_REFRESH = os.getenv('RATE_BACKGROUND_REFRESH', 'False') == 'True'
+RATE_REFRESH_INTERVAL = CACHE_EXPIRY // 5
+# conversion targets refreshed before the invoice currencies; every write and revenue figure reads the USD table
+RATE_REFRESH_BASES = ['USD']
+# refresh_rates prunes the rate history this often (seconds): snapshots older than RATE_HISTORY_FULL_DAYS
+# are downsampled to one per base currency and hour, older than RATE_HISTORY_RETENTION_DAYS (if set) deleted
+RATE_HISTORY_PRUNE_INTERVAL = 3600
+RATE_HISTORY_FULL_DAYS = int(os.getenv('RATE_HISTORY_FULL_DAYS', 7))
+RATE_HISTORY_RETENTION_DAYS = int(os.getenv('RATE_HISTORY_RETENTION_DAYS', 0)) or None
+
+# per-worker in-memory rate cache in front of Redis
+RATE_LOCAL_CACHE_SIZE = int(os.getenv('RATE_LOCAL_CACHE_SIZE', 1024))
+RATE_LOCAL_CACHE_TTL = CACHE_EXPIRY // 10
+# optional pub/sub channel used to drop local rates when Redis is refreshed
+RATE_INVALIDATION_CHANNEL = os.getenv('RATE_INVALIDATION_CHANNEL')
+
+# serve analytics and exchange-rate views as async views (needs adrf and httpx), for ASGI workers
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# exchange rate provider HTTP client: pooled keep-alive connections, retried with exponential backoff
+RATE_HTTP_TIMEOUT = 10
+RATE_HTTP_POOL_SIZE = int(os.getenv('RATE_HTTP_POOL_SIZE', 10))
+RATE_HTTP_RETRIES = 2
+RATE_HTTP_BACKOFF = 0.5
+# after this many failed provider calls in a row, last-known rates are served for RATE_CIRCUIT_RESET_TIMEOUT seconds
+RATE_CIRCUIT_FAILURE_THRESHOLD = 5
+RATE_CIRCUIT_RESET_TIMEOUT = 30
+
+# request instrumentation: slower requests and queries go to the invoices.slow logger
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 500))
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+
+# /metrics: a thread of each worker pushes its counters to Redis this often (seconds);
+# when METRICS_TOKEN is set scrapers must send it as a bearer token
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# invoice listing configuration
+
+INVOICE_PAGE_SIZE = 100
+INVOICE_MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+
+# opt-in declarative partitioning of invoices, applied online by `manage.py partition_invoices`:
+# 'hash' on account_id, 'range' on created_at by month, or '' for the plain table.
+# Detail lookups and writes add the partition key so Postgres reads one partition
+INVOICE_PARTITIONING = os.getenv('INVOICE_PARTITIONING', '')
+INVOICE_HASH_PARTITIONS = 16
+# monthly partitions `manage.py maintain_partitions` keeps ready after the current month
+INVOICE_PARTITION_MONTHS_AHEAD = 3
+
+# bulk create: rows validated and rate-resolved per chunk, inserted per batch
+BULK_CHUNK_SIZE = 1000
+BULK_BATCH_SIZE = 500
+# import_invoices: a historic rate fetched more than this many days before the end of an invoice's day doesn't cover it
+IMPORT_MAX_RATE_AGE_DAYS = 2
+
 # analytics configuration
 
+# summary/average-size/revenue-series results, invalidated by invoice writes and rate table refreshes
+ANALYTICS_CACHE_TTL = CACHE_EXPIRY
+
+# 'postgres' aggregates the rollup tables, 'columnar' an embedded DuckDB copy of the invoices
+# (needs duckdb) kept up to date from the invoice change outbox by `manage.py consume_invoice_changes --follow`
+ANALYTICS_ENGINE = os.getenv('ANALYTICS_ENGINE', 'postgres')
+COLUMNAR_DATABASE_PATH = os.getenv('COLUMNAR_DATABASE_PATH', str(BASE_DIR / 'invoices_columnar.duckdb'))
+
+# invoice change outbox: consumers by checkpoint name, each delivered at-least-once in commit order
+INVOICE_CHANGE_CONSUMERS = {
+    'stream': 'invoices.services.outbox.RedisStreamConsumer',
+}
+if ANALYTICS_ENGINE == 'columnar':
+    INVOICE_CHANGE_CONSUMERS['columnar'] = 'invoices.services.columnar_store.ColumnarChangeConsumer'
+INVOICE_CHANGE_BATCH_SIZE = 10000
+INVOICE_CHANGE_POLL_INTERVAL = 2
+INVOICE_CHANGE_RETENTION_DAYS = 7
+INVOICE_CHANGE_STREAM = 'invoices:changes'
+INVOICE_CHANGE_STREAM_MAXLEN = 100000
+
 CONVERSION_FEE_PERCENT = float(os.getenv('CONVERSION_FEE_PERCENT', 2))
+
+# converted amounts are rounded with a decimal module rounding mode
+CONVERSION_DECIMAL_PLACES = 2
+CONVERSION_ROUNDING = 'ROUND_HALF_UP'
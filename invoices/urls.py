@@ -14,17 +14,32 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from .views.crud import InvoiceListCreateAPIView, InvoiceDetailAPIView
-from .views.exchange_rate import InvoiceExchangeRateAPIView
-from .views.analytics import InvoiceRevenueSummaryAPIView, InvoiceRevenueAverageSizeAPIView
+from .views.crud import InvoiceListCreateAPIView, InvoiceDetailAPIView, InvoiceBulkCreateAPIView
+from .views.exchange_rate import InvoiceExchangeRateAPIView, ExchangeRateHistoryAPIView
+from .views.analytics import InvoiceRevenueSummaryAPIView, InvoiceRevenueAverageSizeAPIView, InvoiceRevenueSeriesAPIView
+from .views.metrics import metrics_view
+
+if settings.ASYNC_VIEWS:
+    # adrf and httpx are only needed when serving through ASGI
+    from .views.async_views import (
+        AsyncInvoiceExchangeRateAPIView as InvoiceExchangeRateAPIView,
+        AsyncInvoiceRevenueAverageSizeAPIView as InvoiceRevenueAverageSizeAPIView,
+        AsyncInvoiceRevenueSeriesAPIView as InvoiceRevenueSeriesAPIView,
+        AsyncInvoiceRevenueSummaryAPIView as InvoiceRevenueSummaryAPIView,
+    )
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('invoices/', InvoiceListCreateAPIView.as_view(), name='invoice-list-create'),
+    path('invoices/bulk/', InvoiceBulkCreateAPIView.as_view(), name='invoice-bulk-create'),
     path('invoices/<int:pk>/', InvoiceDetailAPIView.as_view(), name='invoice-detail'),
     path('invoices/<int:pk>/exchange-rate/', InvoiceExchangeRateAPIView.as_view(), name='invoice-detail'),
     path('invoices/summary/', InvoiceRevenueSummaryAPIView.as_view(), name='invoice-summary'),
     path('invoices/average-size/', InvoiceRevenueAverageSizeAPIView.as_view(), name='invoice-average-size'),
+    path('invoices/revenue-series/', InvoiceRevenueSeriesAPIView.as_view(), name='invoice-revenue-series'),
+    path('exchange-rates/history/', ExchangeRateHistoryAPIView.as_view(), name='exchange-rate-history'),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,56 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+class RequestMetrics:
+    """
+    Count and total duration of the DB queries, Redis commands and provider calls of one request.
+    Shared by the threads sync_to_async runs the request's code in, so updates are locked.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float):
+        with self._lock:
+            count, total = self.calls.get(kind, (0, 0.0))
+            self.calls[kind] = (count + 1, total + seconds)
+
+    def summary(self) -> dict:
+        """{kind: {'count', 'ms'}}"""
+        with self._lock:
+            return {
+                kind: {'count': count, 'ms': round(total * 1000, 2)}
+                for kind, (count, total) in self.calls.items()
+            }
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+def start_request() -> contextvars.Token:
+    return _current_metrics.set(RequestMetrics())
+
+def get_request_metrics() -> RequestMetrics:
+    """Metrics of the request being served, None outside of a request"""
+    return _current_metrics.get()
+
+def end_request(token: contextvars.Token):
+    _current_metrics.reset(token)
+
+@contextmanager
+def record_call(kind: str):
+    """Time a call and add it to the current request's metrics, if any"""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(kind, time.perf_counter() - started)
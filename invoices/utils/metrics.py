@@ -0,0 +1,202 @@
+import atexit
+import os
+import threading
+import time
+from django.conf import settings
+from invoices.utils.redis_client import get_pipeline
+import logging
+from typing import Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels: dict) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in sorted(labels.items()))
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class MetricsRegistry:
+    """
+    Counters, histograms and gauges shared by every worker through Redis.
+    Observing a metric only updates in-process deltas; a daemon thread of each process pushes them
+    with one pipelined HINCRBYFLOAT batch every METRICS_FLUSH_INTERVAL seconds, along with the
+    gauges set meanwhile, so callers never wait on Redis.
+    Each metric is one Redis hash keyed by sample; render() returns the Prometheus text format.
+    """
+
+    def __init__(self, key_prefix: str = 'metrics'):
+        self.key_prefix = key_prefix
+        self.flush_interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        self._metrics = {}
+        self._pending = {}
+        self._pending_values = {}
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _key(self, name: str) -> str:
+        return f"{self.key_prefix}:{name}"
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _ensure_flusher(self):
+        """Start the flusher thread of this process; call with the lock held"""
+        if self._flusher_pid == os.getpid():
+            return
+        if self._flusher_pid is not None:
+            # forked: the parent pushes its own deltas
+            self._pending, self._pending_values = {}, {}
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name='metrics-flusher', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def add(self, name: str, field: str, amount: float):
+        with self._lock:
+            self._ensure_flusher()
+            pending = self._pending.setdefault(name, {})
+            pending[field] = pending.get(field, 0) + amount
+
+    def set(self, name: str, field: str, value: float):
+        with self._lock:
+            self._ensure_flusher()
+            self._pending_values.setdefault(name, {})[field] = value
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            values, self._pending_values = self._pending_values, {}
+        if not pending and not values:
+            return
+        try:
+            pipeline = get_pipeline(transaction=False)
+            for name, fields in pending.items():
+                for field, amount in fields.items():
+                    pipeline.hincrbyfloat(self._key(name), field, amount)
+            for name, fields in values.items():
+                pipeline.hset(self._key(name), mapping=fields)
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Redis error flushing metrics, dropped {len(pending) + len(values)} metrics: {e}")
+
+    def render(self) -> str:
+        """Prometheus text exposition of every worker's metrics, after flushing this worker's"""
+        self.flush()
+        pipeline = get_pipeline(transaction=False)
+        metrics = list(self._metrics.values())
+        for metric in metrics:
+            pipeline.hgetall(self._key(metric.name))
+        samples = pipeline.execute()
+
+        lines = []
+        for metric, fields in zip(metrics, samples):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(fields))
+        return '\n'.join(lines) + '\n'
+
+class Metric:
+    """One Redis hash of samples, rendered one line per labelled sample"""
+    type = None
+
+    def __init__(self, registry: MetricsRegistry, name: str, help: str):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        registry.register(self)
+
+    def render(self, fields: dict) -> list:
+        return [
+            f"{self.name}{{{labels}}} {_format_value(float(value))}" if labels else f"{self.name} {_format_value(float(value))}"
+            for labels, value in sorted(fields.items())
+        ]
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        self.registry.add(self.name, _format_labels(labels), amount)
+
+class Gauge(Metric):
+    """Last value set by any worker"""
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        self.registry.set(self.name, _format_labels(labels), value)
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry: MetricsRegistry, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = sorted(buckets)
+        super().__init__(registry, name, help)
+
+    def observe(self, value: float, **labels):
+        labels = _format_labels(labels)
+        for bound in self.buckets:
+            if value <= bound:
+                self.registry.add(self.name, f"bucket|{bound}|{labels}", 1)
+        self.registry.add(self.name, f"bucket|+Inf|{labels}", 1)
+        self.registry.add(self.name, f"sum||{labels}", value)
+        self.registry.add(self.name, f"count||{labels}", 1)
+
+    def render(self, fields: dict) -> list:
+        series = {}
+        for field, value in fields.items():
+            sample, bound, labels = field.split('|', 2)
+            series.setdefault(labels, {})[(sample, bound)] = float(value)
+
+        lines = []
+        for labels, samples in sorted(series.items()):
+            prefix = f"{labels}," if labels else ''
+            for bound in [str(bound) for bound in self.buckets] + ['+Inf']:
+                value = samples.get(('bucket', bound), 0)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {_format_value(value)}')
+            suffix = f"{{{labels}}}" if labels else ''
+            lines.append(f"{self.name}_sum{suffix} {_format_value(samples.get(('sum', ''), 0))}")
+            lines.append(f"{self.name}_count{suffix} {_format_value(samples.get(('count', ''), 0))}")
+        return lines
+
+registry = MetricsRegistry()
+
+rate_cache_lookups = Counter(
+    registry, 'exchange_rate_cache_lookups_total',
+    'Rate lookups by cache layer and result; a redis stale result is a table past its refresh point',
+)
+stale_rate_responses = Counter(
+    registry, 'exchange_rate_stale_responses_total',
+    'Rate lookups answered with expired or last-known rates',
+)
+provider_call_seconds = Histogram(
+    registry, 'exchange_rate_provider_call_seconds',
+    'Duration of exchange rate provider calls by outcome',
+)
+provider_calls_rejected = Counter(
+    registry, 'exchange_rate_provider_calls_rejected_total',
+    'Provider calls failed fast while the circuit was open',
+)
+request_seconds = Histogram(
+    registry, 'http_request_duration_seconds',
+    'Request duration by route, method and status class',
+)
+replica_reads = Counter(
+    registry, 'db_replica_read_routes_total',
+    'Replica-eligible reads by database chosen and reason: replica, pinned after a write or no healthy replica',
+)
+rollup_lag_seconds = Histogram(
+    registry, 'invoice_rollup_lag_seconds',
+    'Time from an invoice write updating its revenue rollups until they are committed and cached analytics invalidated, by write path',
+)
+rollup_rebuilt_at = Gauge(
+    registry, 'invoice_rollup_rebuilt_timestamp_seconds',
+    'Unix time of the last rollup rebuild of any account',
+)
@@ -0,0 +1,55 @@
+import csv
+import io
+from django.db import connections
+
+def copy_rows(table: str, columns: list, rows: list, using=None):
+    """
+    Load rows into a table with PostgreSQL COPY FROM STDIN.
+    Works with both psycopg2 and psycopg 3. Runs in the caller's transaction.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(rows)
+    buffer.seek(0)
+    
+    db = connections[using or 'default']
+    quoted_columns = ', '.join(db.ops.quote_name(column) for column in columns)
+    sql = f"COPY {db.ops.quote_name(table)} ({quoted_columns}) FROM STDIN WITH (FORMAT csv)"
+    
+    with db.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+def reserve_ids(table: str, count: int, column: str = 'id', using=None) -> list:
+    """
+    Take `count` values from the sequence of a serial/identity column, so COPY can write rows whose
+    ids are known to the caller.
+    """
+    db = connections[using or 'default']
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [db.ops.quote_name(table), column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def copy_query_to(file, sql: str, using=None):
+    """
+    Write the rows of a query to a text file object as CSV with PostgreSQL COPY TO STDOUT.
+    Works with both psycopg2 and psycopg 3. Runs in the caller's transaction.
+    """
+    db = connections[using or 'default']
+    copy_sql = f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)"
+    
+    with db.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            raw_cursor.copy_expert(copy_sql, file)
+        else:
+            with raw_cursor.copy(copy_sql) as copy:
+                for data in copy:
+                    file.write(bytes(data).decode())
@@ -1,38 +1,191 @@
+import asyncio
+import threading
+import weakref
 import redis
+import redis.asyncio
+import redis.asyncio.cluster
+import redis.asyncio.sentinel
+import redis.cluster
+import redis.sentinel
 from django.conf import settings
+from invoices.utils.instrumentation import record_call
 import logging
+from typing import Dict, Iterable, List, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# clients whose commands are counted in the request metrics; pipelines are counted by get_pipeline
+class InstrumentedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        with record_call('redis'):
+            return super().execute_command(*args, **options)
+
+class InstrumentedRedisCluster(redis.cluster.RedisCluster):
+    def execute_command(self, *args, **kwargs):
+        with record_call('redis'):
+            return super().execute_command(*args, **kwargs)
+
+class AsyncInstrumentedRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        with record_call('redis'):
+            return await super().execute_command(*args, **options)
+
+class AsyncInstrumentedRedisCluster(redis.asyncio.cluster.RedisCluster):
+    async def execute_command(self, *args, **kwargs):
+        with record_call('redis'):
+            return await super().execute_command(*args, **kwargs)
+
 class RedisClient:
+    """
+    Process-wide Redis clients built from the REDIS_* settings.
+    REDIS_MODE picks a single server behind a BlockingConnectionPool ('standalone'),
+    the master of a Sentinel service ('sentinel') or a Redis Cluster ('cluster').
+    Connections are opened on first use, not when the client is built.
+    """
     _instance = None
+    # asyncio clients by event loop
+    _async_instances = weakref.WeakKeyDictionary()
+    _async_lock = threading.Lock()
+
+    @classmethod
+    def _connection_params(cls) -> dict:
+        return {
+            'password': settings.REDIS_PASSWORD,
+            'decode_responses': True,
+            'socket_connect_timeout': getattr(settings, 'REDIS_CONNECT_TIMEOUT', 5),
+            'socket_timeout': getattr(settings, 'REDIS_SOCKET_TIMEOUT', 5),
+            'health_check_interval': getattr(settings, 'REDIS_HEALTH_CHECK_INTERVAL', 30),
+            'retry_on_timeout': getattr(settings, 'REDIS_RETRY_ON_TIMEOUT', True),
+        }
+
+    @classmethod
+    def _sentinel_addresses(cls) -> List[Tuple[str, int]]:
+        addresses = []
+        for address in getattr(settings, 'REDIS_SENTINELS', []):
+            host, port = address.rsplit(':', 1)
+            addresses.append((host, int(port)))
+        return addresses
+
+    @classmethod
+    def _build_client(cls, asyncio_client: bool):
+        lib = redis.asyncio if asyncio_client else redis
+        redis_class = AsyncInstrumentedRedis if asyncio_client else InstrumentedRedis
+        mode = getattr(settings, 'REDIS_MODE', 'standalone')
+        max_connections = getattr(settings, 'REDIS_MAX_CONNECTIONS', 50)
+        params = cls._connection_params()
+
+        if mode == 'cluster':
+            cluster_class = AsyncInstrumentedRedisCluster if asyncio_client else InstrumentedRedisCluster
+            return cluster_class(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                max_connections=max_connections,
+                **params,
+            )
+
+        if mode == 'sentinel':
+            sentinel_class = redis.asyncio.sentinel.Sentinel if asyncio_client else redis.sentinel.Sentinel
+            sentinel = sentinel_class(
+                cls._sentinel_addresses(),
+                socket_timeout=params['socket_timeout'],
+                sentinel_kwargs={'password': getattr(settings, 'REDIS_SENTINEL_PASSWORD', None)},
+            )
+            return sentinel.master_for(
+                settings.REDIS_SENTINEL_SERVICE,
+                redis_class=redis_class,
+                db=settings.REDIS_DB,
+                max_connections=max_connections,
+                **params,
+            )
+
+        pool = lib.BlockingConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            max_connections=max_connections,
+            # seconds a caller waits for a free connection before ConnectionError
+            timeout=getattr(settings, 'REDIS_POOL_TIMEOUT', 5),
+            **params,
+        )
+        return redis_class(connection_pool=pool)
 
     @classmethod
     def get_client(cls):
         if cls._instance is None:
-            connection_params = {
-                'host': settings.REDIS_HOST,
-                'port': settings.REDIS_PORT,
-                'db': settings.REDIS_DB,
-                'password': settings.REDIS_PASSWORD,
-                'decode_responses': True,
-                'socket_connect_timeout': 5,
-                'socket_timeout': 5,
-            }
-            
-            cls._instance = redis.Redis(**connection_params)
-            
-            try:
-                cls._instance.ping()
-                logger.info("Successfully connected to Redis")
-            except redis.AuthenticationError as e:
-                logger.error(f"Redis authentication failed: {e}")
-                raise Exception(f"Redis authentication failed: {e}")
-            except redis.ConnectionError as e:
-                logger.error(f"Could not connect to Redis server: {e}")
-                raise Exception(f"Could not connect to Redis server: {e}")
-                
+            cls._instance = cls._build_client(asyncio_client=False)
+            logger.info(f"Created Redis client in {getattr(settings, 'REDIS_MODE', 'standalone')} mode")
         return cls._instance
 
+    @classmethod
+    def get_async_client(cls):
+        """
+        asyncio client of the running event loop.
+        Its connections belong to one loop, so every loop gets its own client
+        (e.g. async views served under WSGI run each request in a fresh loop).
+        A client goes away with its loop, clients of closed loops are dropped.
+        """
+        loop = asyncio.get_running_loop()
+        with cls._async_lock:
+            client = cls._async_instances.get(loop)
+            if client is None:
+                for other in [other for other in list(cls._async_instances) if other.is_closed()]:
+                    cls._async_instances.pop(other, None)
+                client = cls._async_instances[loop] = cls._build_client(asyncio_client=True)
+        return client
+
 def get_redis_client():
-    return RedisClient.get_client()
\ No newline at end of file
+    return RedisClient.get_client()
+
+def get_async_redis_client():
+    return RedisClient.get_async_client()
+
+def get_pipeline(client=None, transaction: bool = True):
+    """
+    Pipeline of a sync or async client.
+    Cluster pipelines can't be transactional, their commands are only batched.
+    Each execute() is counted as one Redis call of the current request.
+    """
+    client = client or get_redis_client()
+    if getattr(settings, 'REDIS_MODE', 'standalone') == 'cluster':
+        pipeline = client.pipeline()
+    else:
+        pipeline = client.pipeline(transaction=transaction)
+
+    execute = pipeline.execute
+    if asyncio.iscoroutinefunction(execute):
+        async def instrumented_execute(*args, **kwargs):
+            with record_call('redis'):
+                return await execute(*args, **kwargs)
+    else:
+        def instrumented_execute(*args, **kwargs):
+            with record_call('redis'):
+                return execute(*args, **kwargs)
+    pipeline.execute = instrumented_execute
+    return pipeline
+
+def mget(keys: Sequence[str], client=None) -> list:
+    """
+    Values of many string keys in one round trip, None for missing keys.
+    Pipelined rather than MGET so keys may live on different cluster nodes.
+    """
+    pipeline = get_pipeline(client, transaction=False)
+    for key in keys:
+        pipeline.get(key)
+    return pipeline.execute()
+
+def mset(mapping: Dict[str, str], ttl: int = None, client=None):
+    """Set many string keys in one round trip, each expiring after `ttl` seconds if given"""
+    pipeline = get_pipeline(client, transaction=False)
+    for key, value in mapping.items():
+        pipeline.set(key, value, ex=ttl)
+    pipeline.execute()
+
+def hmget_many(requests: Iterable[Tuple[str, Sequence[str]]], client=None) -> list:
+    """
+    HMGET of many (hash key, fields) in one round trip.
+    Returns one list of values per request, in order.
+    """
+    pipeline = get_pipeline(client, transaction=False)
+    for key, fields in requests:
+        pipeline.hmget(key, fields)
+    return pipeline.execute()
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+def _encode_rows(rows, fmt: str):
+    encoder = JSONEncoder()
+    if fmt == 'ndjson':
+        for row in rows:
+            yield encoder.encode(row) + '\n'
+        return
+    
+    yield '['
+    first = True
+    for row in rows:
+        yield encoder.encode(row) if first else ',' + encoder.encode(row)
+        first = False
+    yield ']'
+
+def _keyset_chunks(queryset, keyset, chunk_size: int):
+    """
+    Rows of a values_list queryset ordered by the two `keyset` fields, one short query per chunk.
+    Without a server-side cursor iterator() would fetch the whole result at once.
+    """
+    first, second = keyset
+    positions = [list(queryset.query.values_select).index(field) for field in keyset]
+    queryset = queryset.order_by(first, second)
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = [chunk[-1][position] for position in positions]
+        chunk = list(
+            queryset.filter(**{f'{first}__gte': after[0]}).filter(
+                Q(**{f'{first}__gt': after[0]}) | Q(**{first: after[0], f'{second}__gt': after[1]})
+            )[:chunk_size]
+        )
+
+def stream_queryset(queryset, to_representation, fmt: str, keyset=None) -> StreamingHttpResponse:
+    """
+    Stream a queryset as a JSON array or NDJSON without loading it into memory.
+    Rows are read in chunks of STREAM_CHUNK_SIZE through a server-side cursor, or, where those are
+    disabled (e.g. behind PgBouncer in transaction mode), by keyset pages over `keyset`: the
+    (field, unique tiebreaker) ordering of a values_list queryset.
+    """
+    chunk_size = getattr(settings, 'STREAM_CHUNK_SIZE', 2000)
+    if keyset and connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        objects = _keyset_chunks(queryset, keyset, chunk_size)
+    else:
+        objects = queryset.iterator(chunk_size=chunk_size)
+    rows = (to_representation(obj) for obj in objects)
+    return StreamingHttpResponse(_encode_rows(rows, fmt), content_type=STREAM_CONTENT_TYPES[fmt])
@@ -1,167 +1,312 @@
+from decimal import Decimal
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count
-from ..models import Invoice
-from ..services.currency_converter import convert_currency
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
+from invoices.db_router import read_replica
+from invoices.services.currency_converter import convert_many
+from ..services.analytics_cache import AnalyticsResultCache
+from ..services.analytics_engine import get_analytics_engine
 
-class InvoiceRevenueSummaryAPIView(APIView):
+class CachedAnalyticsMixin:
+    """
+    Shared flow of the analytics endpoints: validate the query parameters, then serve the result
+    through AnalyticsResultCache, answering a matching If-None-Match with 304.
+    Both cache checks only read Redis, the database is queried on a cache miss.
+    
+    Views provide `endpoint`, `failure_message` and:
+    - parse_params(request) -> (params, error)
+    - get_rate_currency(params): target of the current rates used, None if no rates are used
+    - get_rows(account_id, params) / aget_rows: rows the result is built from, read from the ANALYTICS_ENGINE
+    - get_conversion(params, rows): (amounts, from_currencies, to_currency) to convert, or None
+    - build_result(params, rows, converted_amounts) -> data
+    The database and rate reads stay outside build_result so the async views can await them.
+    Rows are read from a replica unless the account wrote recently, see invoices.db_router.
+    """
+    endpoint = None
+    failure_message = None
+    
+    def get_rate_currency(self, params):
+        return None
+    
+    def get_conversion(self, params, rows):
+        return None
+    
+    def get_cache(self, request, params) -> AnalyticsResultCache:
+        return AnalyticsResultCache(
+            request.user.account_id, self.endpoint, list(params.values()),
+            rate_currency=self.get_rate_currency(params),
+        )
+    
+    def is_not_modified(self, request, etag) -> bool:
+        return bool(etag) and etag in parse_etags(request.headers.get('If-None-Match', ''))
+    
+    def compute(self, account_id, params):
+        """Returns (success, data, error)"""
+        try:
+            rows = self.get_rows(account_id, params)
+            conversion = self.get_conversion(params, rows)
+            converted_amounts = convert_many(*conversion)[0] if conversion else None
+            return True, self.build_result(params, rows, converted_amounts), None
+        except Exception as e:
+            return False, None, f"{self.failure_message}: {str(e)}"
+    
+    def get(self, request):
+        params, error = self.parse_params(request)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        cache = self.get_cache(request, params)
+        etag = cache.etag
+        headers = {'ETag': etag} if etag else None
+        
+        if self.is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        data = cache.get()
+        if data is None:
+            with read_replica(request.user.account_id):
+                success, data, error = self.compute(request.user.account_id, params)
+            if not success:
+                return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+            cache.set(data)
+        
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+
+class InvoiceRevenueSummaryAPIView(CachedAnalyticsMixin, APIView):
     """
     Get total revenue summary for invoices with exchange rate options.
     Returned total revenue always in USD.
     """
     permission_classes = [IsAuthenticated]
+    endpoint = 'summary'
+    failure_message = 'Currency conversion failed'
     
     def get(self, request):
-        """
-        Get total revenue summary
-        Query parameters:
-        - rate: 'historic' (default) or 'current'
-        """
         try:
-            rate_type = request.GET.get('rate', 'historic').lower()
-            
-            if rate_type not in ['historic', 'current']:
-                return Response(
-                    {"error": "rate must be either 'historic' or 'current'"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            success, data, error = self._get_revenue(request.user.account, rate_type)
-            
-            if not success:
-                return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
-            
-            return Response(data, status=status.HTTP_200_OK)
-            
+            return super().get(request)
         except Exception as e:
             return Response(
                 {"error": f"Unexpected error: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def parse_params(self, request):
+        """
+        Query parameters:
+        - rate: 'historic' (default) or 'current'
+        """
+        rate_type = request.GET.get('rate', 'historic').lower()
+        
+        if rate_type not in ['historic', 'current']:
+            return None, "rate must be either 'historic' or 'current'"
         
-    def _get_revenue(self, account, rate_type):
+        return {'rate_type': rate_type}, None
+    
+    def get_rate_currency(self, params):
+        return 'USD' if params['rate_type'] == 'current' else None
+    
+    def get_rows(self, account_id, params):
         """
-        Calculate revenue using historic exchange rates from database or currency exchange rates. 
+        Revenue per original_currency. Historic revenue sums the converted amounts, the rate is already applied;
+        current revenue converts the original amounts programatically.
         """
+        return get_analytics_engine().revenue_by_currency(account_id)
+    
+    async def aget_rows(self, account_id, params):
+        return await get_analytics_engine().arevenue_by_currency(account_id)
+    
+    def get_conversion(self, params, rows):
+        if params['rate_type'] == 'historic':
+            return None
+        # one rate lookup for every currency of the account
+        return (
+            [row['total_original_amount'] for row in rows],
+            [row['original_currency'] for row in rows],
+            'USD',
+        )
+    
+    def build_result(self, params, rows, converted_amounts):
+        if params['rate_type'] == 'historic':
+            total_revenue = sum(row['total_converted_amount'] for row in rows)
+        else:
+            total_revenue = sum(converted_amounts)
         
-        try:
-            
-            total_revenue = 0
-            
-            #  if rate_type is historic, sum converted amount and the rate is already applied
-            if rate_type == 'historic':
-                total_revenue = Invoice.objects.filter(account=account).aggregate(
-                    total_revenue=Sum('converted_amount')
-                )['total_revenue'] or 0
-
-            # if the rate_type is current, group by the original_currency, sum(original_amount) and compute it programatically.
-            else:
-                currency_groups = Invoice.objects.filter(account=account).values(
-                    'original_currency'
-                ).annotate(total_original_amount=Sum('original_amount'))
-                
-                for group in currency_groups:
-                    currency = group['original_currency']
-                    amount = group['total_original_amount']
-                    
-                    converted_amount, _ = convert_currency(float(amount), currency, 'USD')    
-                    total_revenue += converted_amount
-
-            return True, {
-                'total_revenue': str(total_revenue),
-                'currency': 'USD',
-                'rate_type': rate_type
-            }, None
-                
-        except Exception as e:
-            return False, None, f"Currency conversion failed: {str(e)}"
+        return {
+            'total_revenue': str(total_revenue),
+            'currency': 'USD',
+            'rate_type': params['rate_type']
+        }
         
 
-class InvoiceRevenueAverageSizeAPIView(APIView):
-    def get(self, request):
+class InvoiceRevenueAverageSizeAPIView(CachedAnalyticsMixin, APIView):
+    """
+    Get average invoice size.
+    Fees is applied only if the invoice currency and target currency are different.
+    Only Current exchange rates are applied. 
+    """
+    endpoint = 'average-size'
+    failure_message = 'Average calculation failed'
+    
+    def parse_params(self, request):
         """
-        Get average invoice size.
-        Fees is applied only if the invoice currency and target currency are different.
-        Only Current exchange rates are applied. 
-        
         Query parameters:
         - currency: target currency (default: USD)
         """
         target_currency = request.GET.get('currency', 'USD').upper()
         
         if len(target_currency) != 3:
-            return Response(
-                {"error": "Currency must be a 3-letter code"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            return None, "Currency must be a 3-letter code"
         
-        success, data, error = self._calculate_average_invoice_size(
-            request.user.account, 
-            target_currency
+        return {'target_currency': target_currency}, None
+    
+    def get_rate_currency(self, params):
+        return params['target_currency']
+    
+    def get_rows(self, account_id, params):
+        return get_analytics_engine().revenue_by_currency(account_id)
+    
+    async def aget_rows(self, account_id, params):
+        return await get_analytics_engine().arevenue_by_currency(account_id)
+    
+    def get_conversion(self, params, rows):
+        if not rows:
+            return None
+        return (
+            [group['total_original_amount'] for group in rows],
+            [group['original_currency'] for group in rows],
+            params['target_currency'],
         )
+    
+    def build_result(self, params, currency_stats, converted_amounts):
+        """
+        Calculate average invoice size of specified account in the specified currency.
+        """
+        target_currency = params['target_currency']
         
-        if not success:
-            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        if not currency_stats:
+            return {
+                'average_amount': '0.00',
+                'currency': target_currency,
+                'invoice_count': 0
+            }
+        
+        total_revenue = 0
+        total_fees = 0
+        number_of_invoices = 0
         
-        return Response(data, status=status.HTTP_200_OK)
+        conversion_fee_percent = Decimal(str(getattr(settings, 'CONVERSION_FEE_PERCENT', 2)))
+        
+        for group, converted_amount in zip(currency_stats, converted_amounts):
+            currency = group['original_currency']
+            count = group['invoice_count']
+            
+            total_revenue += converted_amount
+            number_of_invoices += count
+            
+            if currency != target_currency:
+                total_fees += ( converted_amount * conversion_fee_percent ) / 100
+        
+        average_amount = total_revenue / number_of_invoices
+        average_amount_after_fees = ( total_revenue - total_fees ) / number_of_invoices
+        
+        return {
+            'average_size_before_fees': str(round(average_amount, 2)),
+            'average_size_after_fees': str(round(average_amount_after_fees, 2)),
+            'gross_revenue': str(round(total_revenue, 2)),
+            'net_revenue': str(round(total_revenue-total_fees, 2)),
+            'currency': target_currency,
+            'invoice_count': number_of_invoices,
+        }
+
 
+class InvoiceRevenueSeriesAPIView(CachedAnalyticsMixin, APIView):
+    """
+    Get revenue per day or month, split by currency and status.
+    Returned revenue always in USD.
+    """
+    permission_classes = [IsAuthenticated]
+    endpoint = 'revenue-series'
+    failure_message = 'Revenue series failed'
+    
+    def parse_params(self, request):
+        """
+        Query parameters:
+        - granularity: 'day' (default) or 'month'
+        - rate: 'historic' (default) or 'current'
+        - from / to: inclusive ISO 8601 dates bounding the series
+        """
+        granularity = request.GET.get('granularity', 'day').lower()
+        rate_type = request.GET.get('rate', 'historic').lower()
+        
+        if granularity not in ['day', 'month']:
+            return None, "granularity must be either 'day' or 'month'"
+        
+        if rate_type not in ['historic', 'current']:
+            return None, "rate must be either 'historic' or 'current'"
+        
+        params = {'granularity': granularity, 'rate_type': rate_type, 'from': None, 'to': None}
+        for param in ['from', 'to']:
+            if request.GET.get(param):
+                try:
+                    params[param] = parse_date(request.GET[param])
+                except ValueError:
+                    pass
+                if params[param] is None:
+                    return None, f"{param} must be an ISO 8601 date"
         
-    def _calculate_average_invoice_size(self,account, target_currency):
+        return params, None
+    
+    def get_rate_currency(self, params):
+        return 'USD' if params['rate_type'] == 'current' else None
+    
+    def get_rows(self, account_id, params):
         """
-        Calculate average invoice size of specified account in the specified currency.
+        Revenue buckets of the requested granularity.
         """
-        try:
-            currency_stats = Invoice.objects.filter(account=account).values(
-                'original_currency'
-            ).annotate(
-                total_amount=Sum('original_amount'),
-                invoice_count=Count('id')
-            )
-            
-            if not currency_stats:
-                return True, {
-                    'average_amount': '0.00',
-                    'currency': target_currency,
-                    'invoice_count': 0
-                }, None
-            
-            total_revenue = 0
-            total_fees = 0
-            number_of_invoices = 0
-            
-            conversion_fee_percent = getattr(settings, 'CONVERSION_FEE_PERCENT', 2)
-            
-            for group in currency_stats:
-                currency = group['original_currency']
-                amount = group['total_amount']
-                count = group['invoice_count']
-                
-                converted_amount, _ = convert_currency(
-                    float(amount), currency, target_currency
-                )
-                
-                total_revenue += converted_amount
-                number_of_invoices += count
-                
-                if currency != target_currency:
-                    total_fees += ( converted_amount * conversion_fee_percent ) / 100
-            
-            average_amount = total_revenue / number_of_invoices
-            average_amount_after_fees = ( total_revenue - total_fees ) / number_of_invoices
-            
-            
-            return True, {
-                'average_size_before_fees': str(round(average_amount, 2)),
-                'average_size_after_fees': str(round(average_amount_after_fees, 2)),
-                'gross_revenue': str(round(total_revenue, 2)),
-                'net_revenue': str(round(total_revenue-total_fees, 2)),
-                'currency': target_currency,
-                'invoice_count': number_of_invoices,
-            }, None
-            
-        except Exception as e:
-            return False, None, f"Average calculation failed: {str(e)}"
\ No newline at end of file
+        return get_analytics_engine().revenue_series(
+            account_id, params['granularity'], params['from'], params['to']
+        )
+    
+    async def aget_rows(self, account_id, params):
+        return await get_analytics_engine().arevenue_series(
+            account_id, params['granularity'], params['from'], params['to']
+        )
+    
+    def get_conversion(self, params, buckets):
+        # historic buckets already hold converted amounts, current ones need one rate lookup per currency
+        if params['rate_type'] == 'historic':
+            return None
+        return (
+            [bucket['total_original_amount'] for bucket in buckets],
+            [bucket['original_currency'] for bucket in buckets],
+            'USD',
+        )
+    
+    def build_result(self, params, buckets, converted_amounts):
+        if params['rate_type'] == 'historic':
+            revenues = [bucket['total_converted_amount'] for bucket in buckets]
+        else:
+            revenues = converted_amounts
+        
+        series = []
+        for bucket, revenue in zip(buckets, revenues):
+            series.append({
+                'period': bucket['period'].isoformat(),
+                'original_currency': bucket['original_currency'],
+                'status': bucket['status'],
+                'total_original_amount': str(bucket['total_original_amount']),
+                'total_revenue': str(revenue),
+                'invoice_count': bucket['invoice_count'],
+            })
+        
+        return {
+            'granularity': params['granularity'],
+            'currency': 'USD',
+            'rate_type': params['rate_type'],
+            'series': series,
+        }
@@ -0,0 +1,96 @@
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from rest_framework.response import Response
+from rest_framework import status
+from invoices.db_router import choose_read_database, use_database
+from invoices.integrations.async_exchange_rate import aget_rate_snapshot_to
+from invoices.integrations.exchange_rate import ProviderRequestError
+from invoices.services.currency_converter import aconvert_many
+from invoices.services.partitioning import aget_account_invoice
+from ..models import Invoice
+from .analytics import (
+    InvoiceRevenueAverageSizeAPIView,
+    InvoiceRevenueSeriesAPIView,
+    InvoiceRevenueSummaryAPIView,
+)
+from .exchange_rate import InvoiceExchangeRateAPIView
+
+class AsyncAnalyticsMixin(APIView):
+    """
+    Async CachedAnalyticsMixin.get for ASGI workers.
+    Rows are read with the engine's aget_rows and rates with AsyncExchangeRateAPI, so a request
+    waiting on the database, Redis or the provider doesn't hold the worker.
+    The result cache keeps its sync Redis client and runs in a thread.
+    """
+
+    async def compute(self, account_id, params):
+        """Returns (success, data, error)"""
+        try:
+            rows = await self.aget_rows(account_id, params)
+            conversion = self.get_conversion(params, rows)
+            converted_amounts = (await aconvert_many(*conversion))[0] if conversion else None
+            return True, self.build_result(params, rows, converted_amounts), None
+        except Exception as e:
+            return False, None, f"{self.failure_message}: {str(e)}"
+
+    async def get(self, request):
+        params, error = self.parse_params(request)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache = await sync_to_async(self.get_cache, thread_sensitive=False)(request, params)
+        etag = cache.etag
+        headers = {'ETag': etag} if etag else None
+
+        if self.is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = await sync_to_async(cache.get, thread_sensitive=False)()
+        if data is None:
+            database = await sync_to_async(choose_read_database, thread_sensitive=False)(request.user.account_id)
+            with use_database(database):
+                success, data, error = await self.compute(request.user.account_id, params)
+            if not success:
+                return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+            await sync_to_async(cache.set, thread_sensitive=False)(data)
+
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+
+class AsyncInvoiceRevenueSummaryAPIView(AsyncAnalyticsMixin, InvoiceRevenueSummaryAPIView):
+    async def get(self, request):
+        try:
+            return await super().get(request)
+        except Exception as e:
+            return Response(
+                {"error": f"Unexpected error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncInvoiceRevenueAverageSizeAPIView(AsyncAnalyticsMixin, InvoiceRevenueAverageSizeAPIView):
+    pass
+
+
+class AsyncInvoiceRevenueSeriesAPIView(AsyncAnalyticsMixin, InvoiceRevenueSeriesAPIView):
+    pass
+
+
+class AsyncInvoiceExchangeRateAPIView(APIView, InvoiceExchangeRateAPIView):
+    """
+    Async InvoiceExchangeRateAPIView
+    """
+
+    async def get(self, request, pk):
+        invoice = await aget_account_invoice(Invoice.objects.all(), pk, request.user.account_id)
+        if invoice.account_id != request.user.account_id:
+            return Response(
+                {"error": "You don't have permission to access this invoice"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            snapshot = await aget_rate_snapshot_to([invoice.original_currency], 'USD')
+        except ProviderRequestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.build_response(invoice, snapshot))
@@ -1,22 +1,58 @@
 
+import json
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 
+from invoices.db_router import choose_read_database
+from invoices.pagination import KeysetPagination
 from invoices.permissions import IsInvoiceAccountOwner
+from invoices.utils.streaming import STREAM_CONTENT_TYPES, stream_queryset
 from ..models import Invoice
-from ..serializers import InvoiceSerializer, InvoiceCreateSerializer, InvoiceUpdateSerializer
+from ..serializers import InvoiceSerializer, InvoiceCreateSerializer, InvoiceUpdateSerializer, InvoiceRowEncoder
+from ..services.bulk_import import BulkInvoiceImporter
+from ..services.partitioning import get_account_invoice, invoice_key
+from ..services.revenue_rollup import apply_invoice_change
 
 class InvoiceListCreateAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """Get all invoices for the user's account"""
-        invoices = Invoice.objects.filter(account_id=request.user.account_id)
-        serializer = InvoiceSerializer(invoices, many=True)
-        return Response(serializer.data)
+        """
+        Get all invoices for the user's account
+        Query parameters:
+        - stream: 'json' or 'ndjson' to stream every invoice with flat memory
+        - cursor / limit: return one page ordered by (created_at, id) with a next_cursor
+        Read from a replica unless the account wrote recently.
+        """
+        # bound to the database up front, streamed rows are read after the view returns
+        database = choose_read_database(request.user.account_id)
+        invoices = Invoice.objects.using(database).filter(account_id=request.user.account_id)
+        encoder = InvoiceRowEncoder()
+        
+        stream_format = request.GET.get('stream')
+        if stream_format:
+            if stream_format not in STREAM_CONTENT_TYPES:
+                return Response(
+                    {"error": "stream must be either 'json' or 'ndjson'"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return stream_queryset(
+                invoices.order_by('created_at', 'id').values_list(*encoder.columns),
+                encoder.encode,
+                stream_format,
+                keyset=('created_at', 'id'),
+            )
+        
+        if 'cursor' in request.GET or 'limit' in request.GET:
+            page, next_cursor = KeysetPagination().paginate_queryset(
+                invoices.values_list(*encoder.columns, named=True), request
+            )
+            return Response({'results': encoder.encode_many(page), 'next_cursor': next_cursor})
+        
+        return Response(encoder.encode_many(invoices.values_list(*encoder.columns)))
     
     def post(self, request):
         """Create a new invoice for the user's account"""
@@ -37,16 +73,19 @@ class InvoiceDetailAPIView(APIView):
     
     def _get_invoice(self, pk):
         """Get invoice object"""
-        invoice = get_object_or_404(Invoice, pk=pk)
+        invoice = get_account_invoice(Invoice.objects.all(), pk, self.request.user.account_id)
         self.check_object_permissions(self.request, invoice)
         return invoice
     
     def get(self, request, pk):
         """Retrieve a specific invoice"""
-        invoice = self._get_invoice(pk)
+        encoder = InvoiceRowEncoder()
+        row = get_account_invoice(
+            Invoice.objects.values_list(*encoder.columns, named=True), pk, request.user.account_id
+        )
+        self.check_object_permissions(request, row)
         
-        serializer = InvoiceSerializer(invoice)
-        return Response(serializer.data)
+        return Response(encoder.encode(row))
     
     def put(self, request, pk):
         """Update a specific invoice"""
@@ -66,9 +105,55 @@ class InvoiceDetailAPIView(APIView):
         """Delete a specific invoice"""
         invoice = self._get_invoice(pk)
         
-        invoice.delete()
+        with transaction.atomic():
+            stored = Invoice.objects.select_for_update().filter(**invoice_key(invoice)).first()
+            if stored is not None:
+                apply_invoice_change(before=stored)
+                Invoice.objects.filter(**invoice_key(stored)).delete()
         
         return Response(
             {"message": "Invoice deleted successfully"}, 
             status=status.HTTP_204_NO_CONTENT
-        )
\ No newline at end of file
+        )
+
+class InvoiceBulkCreateAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def _ndjson_rows(self, request):
+        """One invoice per line, unparsable lines are yielded as None"""
+        # DRF has no stream without a Content-Length, e.g. for a chunked upload
+        for line in request.stream or []:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    
+    def post(self, request):
+        """
+        Create many invoices for the user's account
+        Body: a JSON array of invoices, or one invoice per line with Content-Type application/x-ndjson
+        """
+        is_ndjson = request.content_type.split(';')[0].strip() == 'application/x-ndjson'
+        if is_ndjson:
+            rows = self._ndjson_rows(request)
+        else:
+            rows = request.data
+            if not isinstance(rows, list):
+                return Response(
+                    {"error": "Expected a list of invoices"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        result = BulkInvoiceImporter(request.user.account).import_rows(rows)
+        if is_ndjson and not result['created'] and not result['failed']:
+            # an empty or unread body must not look like a successful upload
+            return Response(
+                {"error": "NDJSON uploads need a Content-Length header and at least one invoice"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        response_status = status.HTTP_201_CREATED if not result['failed'] else status.HTTP_207_MULTI_STATUS
+        return Response(result, status=response_status)
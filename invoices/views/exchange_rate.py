@@ -2,9 +2,12 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from ..models import Invoice
-from invoices.integrations.exchange_rate import get_exchange_rate
+from ..services.partitioning import get_account_invoice
+from invoices.integrations.exchange_rate import ProviderRequestError, get_rate_snapshot_to
+from invoices.services.rate_history import get_rate_at
 
 
 class InvoiceExchangeRateAPIView(APIView):
@@ -17,8 +20,8 @@ class InvoiceExchangeRateAPIView(APIView):
         """
         Get invoice and verify it belongs to user's account
         """
-        invoice = get_object_or_404(Invoice, pk=pk)
-        if invoice.account != user_account:
+        invoice = get_account_invoice(Invoice.objects.all(), pk, user_account.id)
+        if invoice.account_id != user_account.id:
             return None, "You don't have permission to access this invoice"
         return invoice, None
     
@@ -30,12 +33,69 @@ class InvoiceExchangeRateAPIView(APIView):
         if error:
             return Response({"error": error}, status=status.HTTP_403_FORBIDDEN)
         
-        exchange_rate = get_exchange_rate(invoice.original_currency,"USD")
-        
-        response_data = {
+        try:
+            # the USD table, like the conversions that set used_exchange_rate
+            snapshot = get_rate_snapshot_to([invoice.original_currency], 'USD')
+        except ProviderRequestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.build_response(invoice, snapshot))
+    
+    def build_response(self, invoice, snapshot):
+        return {
             'invoice_id': invoice.id,
             'original_currency': str(invoice.original_currency),
             'used_exchange_rate': str(invoice.exchange_rate),
-            'current_exchange_rate': str(exchange_rate),
+            'current_exchange_rate': str(snapshot.rates[invoice.original_currency.upper()]),
+            'current_exchange_rate_is_stale': snapshot.is_stale,
         }
-        return Response(response_data)
\ No newline at end of file
+
+class ExchangeRateHistoryAPIView(APIView):
+    """
+    Get the exchange rate of a currency pair as known at a point in time
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        """
+        Query parameters:
+        - from: source currency
+        - to: target currency (default: USD)
+        - at: ISO 8601 datetime (default: now)
+        """
+        from_currency = request.GET.get('from', '').upper()
+        to_currency = request.GET.get('to', 'USD').upper()
+        
+        if len(from_currency) != 3 or len(to_currency) != 3:
+            return Response(
+                {"error": "Currency must be a 3-letter code"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        at = None
+        if request.GET.get('at'):
+            try:
+                at = parse_datetime(request.GET['at'])
+                if at is not None and timezone.is_naive(at):
+                    at = timezone.make_aware(at)
+            except Exception:
+                # well-formed but out of range (e.g. month 13), or a local time skipped or repeated by DST
+                at = None
+            if at is None:
+                return Response(
+                    {"error": "at must be an ISO 8601 datetime"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        exchange_rate, fetched_at = get_rate_at(from_currency, to_currency, at)
+        if exchange_rate is None:
+            return Response(
+                {"error": f"No {from_currency}->{to_currency} rate recorded at that time"}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response({
+            'from_currency': from_currency,
+            'to_currency': to_currency,
+            'exchange_rate': str(exchange_rate),
+            'fetched_at': fetched_at.isoformat(),
+        })
@@ -0,0 +1,27 @@
+import hmac
+import logging
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from invoices.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@require_GET
+def metrics_view(request):
+    """
+    Metrics of every worker in the Prometheus text format.
+    A plain Django view so scrapers need no JWT; guarded by METRICS_TOKEN when it is set.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    try:
+        body = registry.render()
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return HttpResponse(status=503)
+    return HttpResponse(body, content_type=PROMETHEUS_CONTENT_TYPE)